@@ -1,10 +1,8 @@
 import argparse
-import io
 import json
 import os
 import sys
 import time
-import uuid
 
 import requests
 
@@ -16,61 +14,39 @@ PRINT_UNIT_FROM_NANO_RATIO = 1_000_000
 POLLING_INTERVAL_IN_SECONDS = 0.5
 
 
-def parse_fasta(fasta_file_path):
-    with open(fasta_file_path, "r") as file:
-        fasta_data = file.read()
-
-    sequences = []
-    entries = fasta_data.split(">")[1:]
-
-    for entry in entries:
-        lines = entry.strip().split("\n")
-        seq_id = lines[0].split()[0]
-        seq_data = "".join(lines[1:])
-        id_ = str(uuid.uuid4())
-        descr_map[id_] = seq_id
-        sequences.append((id_, seq_data))
-
-    return sequences
-
-
-def send_to_server(query_files, target_files, server_url, match_score, mismatch_penalty, gap_penalty):
-    content = {
-        "queries": [],
-    }
-    for q_name, q_seq in query_files:
-        for t_name, t_seq in target_files:
-            content["queries"].append(
-                {
-                    "query": q_name,
-                    "target": t_name,
-                }
-            )
-
-    content["match_score"] = match_score
-    content["mismatch_penalty"] = mismatch_penalty
-    content["gap_penalty"] = gap_penalty
-
-    body_content = json.dumps(content)
-
-    sequences = query_files + target_files
-    sequence_files = []
-    for seq_name, seq_content in sequences:
-        seq_file = io.BytesIO(seq_content.encode())
-        sequence_files.append(("sequences", (seq_name, seq_file, "application/octet-stream")))
-
-    multipart_data = {
-        "body": body_content,
-    }
-    files = sequence_files
-
-    # print(len(files))
-    # print(body_content)
-
-    response = requests.post(server_url, data=multipart_data, files=files)
+def send_to_server(
+    query_file_path,
+    database_file_path,
+    server_url,
+    match_score,
+    mismatch_penalty,
+    gap_penalty,
+    top_k=None,
+    weight=None,
+):
+    # Both FASTA files are uploaded as they are, the server parses them and assigns the sequence ids
+    with open(query_file_path, "rb") as query_file, open(database_file_path, "rb") as database_file:
+        response = requests.post(
+            server_url,
+            data={
+                "match_score": match_score,
+                "mismatch_penalty": mismatch_penalty,
+                "gap_penalty": gap_penalty,
+                # The master only keeps the k best targets of every query
+                **({"top_k": top_k} if top_k is not None else {}),
+                # Share of the workers relative to other jobs on the master
+                **({"weight": weight} if weight is not None else {}),
+            },
+            files={
+                "query": (os.path.basename(query_file_path), query_file, "application/octet-stream"),
+                "database": (os.path.basename(database_file_path), database_file, "application/octet-stream"),
+            },
+        )
 
-    for _, (_, file_obj, _) in sequence_files:
-        file_obj.close()
+    if response.status_code == 200:
+        for record_ids in (response.json()["query_ids"], response.json()["database_ids"]):
+            for name, id_ in record_ids.items():
+                descr_map[id_] = name
 
     return response
 
@@ -90,6 +66,73 @@ def update_progress(progress):
     sys.stdout.flush()
 
 
+def show_status(status):
+    if status["state"] == "IN_QUEUE":
+        sys.stdout.write("Job in queue, waiting for it to start\r")
+        sys.stdout.flush()
+    elif status["state"] == "IN_PROGRESS":
+        update_progress(status["progress"])
+    else:
+        update_progress(1.0)
+
+
+def wait_for_job_by_events(server_url, job_id):
+    # The master pushes a status event whenever results arrive and closes the stream once the job is done
+    with requests.get(f"{server_url}/job/{job_id}/status/stream", stream=True) as response:
+        for line in response.iter_lines(decode_unicode=True):
+            if line and line.startswith("data:"):
+                status = json.loads(line[len("data:") :])
+                show_status(status)
+                if status["state"] == "DONE":
+                    return
+
+
+def wait_for_job_by_polling(server_url, job_id):
+    response = requests.get(f"{server_url}/job/{job_id}/status")
+    while response.status_code == 200:
+        show_status(response.json())
+        if response.json()["state"] == "DONE":
+            break
+        time.sleep(POLLING_INTERVAL_IN_SECONDS)
+        response = requests.get(f"{server_url}/job/{job_id}/status")
+
+
+def write_results(lines, results_dir, top_k):
+    current_query = None
+    file = None
+    written_for_query = 0
+
+    try:
+        for line in lines:
+            if not line:
+                continue
+            result = json.loads(line)
+            query = descr_map[result["combination"]["query"]]
+
+            if query != current_query:
+                if file is not None:
+                    file.close()
+                current_query = query
+                written_for_query = 0
+                file_path = os.path.join(results_dir, f"{query}.txt")
+                file = open(file_path, "a" if os.path.exists(file_path) else "w")
+
+            if top_k is not None and written_for_query >= top_k:
+                continue
+            written_for_query += 1
+
+            target = descr_map[result["combination"]["target"]]
+            alignment = result["alignments"][0]
+            file.write(f">{target}\n")
+            file.write(f"Alignment: {alignment['alignment']}\n")
+            file.write(f"Length: {alignment['length']}\n")
+            file.write(f"Score: {alignment['score']}\n")
+            file.write("\n")
+    finally:
+        if file is not None:
+            file.close()
+
+
 def main():
     cli_invocation_time = time.time_ns()
 
@@ -104,42 +147,35 @@ def main():
     parser.add_argument("--mismatch-penalty", type=str, required=False, help="Mismatch penalty", default=1)
     parser.add_argument("--gap-penalty", type=str, required=False, help="Gap penalty", default=1)
     parser.add_argument("--top-k", type=int, required=False, help="Top k query matches", default=None)
+    parser.add_argument(
+        "--weight", type=float, required=False, help="Share of the workers relative to other jobs", default=None
+    )
+    parser.add_argument(
+        "--poll", action="store_true", help="Poll the job status instead of listening for status events"
+    )
 
     args = parser.parse_args()
 
-    sequences_query = parse_fasta(args.query)
-    sequences_database = parse_fasta(args.database)
-
     response = send_to_server(
-        sequences_query,
-        sequences_database,
-        f"{args.server_url}/job/format/multipart",
+        args.query,
+        args.database,
+        f"{args.server_url}/job/format/fasta",
         args.match_score,
         args.mismatch_penalty,
         args.gap_penalty,
+        args.top_k,
+        args.weight,
     )
 
     job_id = response.json()["id"]
 
     # if response is successful, poll for results
     if response.status_code == 200:
-        response = requests.get(f"{args.server_url}/job/{job_id}/status")
         print(f"Job Successfully submitted, job ID: {job_id}")
-        while response.status_code == 200:
-            if response.json()["state"] == "IN_QUEUE":
-                sys.stdout.write("Job in queue, waiting for it to start\r")
-                sys.stdout.flush()
-                time.sleep(POLLING_INTERVAL_IN_SECONDS)
-                response = requests.get(f"{args.server_url}/job/{job_id}/status")
-                continue
-            elif response.json()["state"] == "IN_PROGRESS":
-                progress = response.json()["progress"]
-                update_progress(progress)
-                time.sleep(POLLING_INTERVAL_IN_SECONDS)
-                response = requests.get(f"{args.server_url}/job/{job_id}/status")
-            else:
-                update_progress(1.0)
-                break
+        if args.poll:
+            wait_for_job_by_polling(args.server_url, job_id)
+        else:
+            wait_for_job_by_events(args.server_url, job_id)
 
         # The result has been returned, printing time since the submission of the job using this CLI.
         total_elapsed_time = time.time_ns() - cli_invocation_time
@@ -149,49 +185,20 @@ def main():
             )
         )
 
-        # Process and store results to disk.
-        top_k_map = {}
-
-        response = requests.get(f"{args.server_url}/job/{job_id}/result")
-        print(f"Computation time: {int(response.json()['computation_time'] / PRINT_UNIT_FROM_NANO_RATIO):,} {PRINT_UNIT}".replace(
-                ",", "."
-            ))
-        for result in response.json()["alignments"]:
-            query = descr_map[result["combination"]["query"]]
-            target = descr_map[result["combination"]["target"]]
-            score = result["alignments"][0]["score"]
-            length = result["alignments"][0]["length"]
-            alignment = result["alignments"][0]["alignment"]
-            if query not in top_k_map:
-                top_k_map[query] = []
-                top_k_map[query].append((target, score, length, alignment))
-            else:
-                top_k_map[query].append((target, score, length, alignment))
-
-        top_k_map = {k: sorted(v, key=lambda x: x[1], reverse=True) for k, v in top_k_map.items()}
-        if args.top_k is not None:
-            top_k_map = {k: v[: args.top_k] for k, v in top_k_map.items()}
-
-        for query, results in top_k_map.items():
-            if args.output_path is not None:
-                results_dir = args.output_path
-            else:
-                results_dir = "../results"
-            os.makedirs(results_dir, exist_ok=True)
-
-            file_path = os.path.join(results_dir, f"{query}.txt")
-            if os.path.exists(file_path):
-                mode = "a"
-            else:
-                mode = "w"
-
-            with open(file_path, mode) as file:
-                for target, score, length, alignment in results:
-                    file.write(f">{target}\n")
-                    file.write(f"Alignment: {alignment}\n")
-                    file.write(f"Length: {length}\n")
-                    file.write(f"Score: {score}\n")
-                    file.write("\n")
+        # Stream the results to disk, they arrive grouped by query with the best score first.
+        if args.output_path is not None:
+            results_dir = args.output_path
+        else:
+            results_dir = "../results"
+        os.makedirs(results_dir, exist_ok=True)
+
+        with requests.get(f"{args.server_url}/job/{job_id}/result/stream", stream=True) as response:
+            response.raise_for_status()
+            computation_time = float(response.headers["X-Computation-Time"])
+            print(f"Computation time: {int(computation_time / PRINT_UNIT_FROM_NANO_RATIO):,} {PRINT_UNIT}".replace(
+                    ",", "."
+                ))
+            write_results(response.iter_lines(), results_dir, args.top_k)
 
         print(f"Result can be found in: {results_dir}")
 
@@ -65,9 +65,8 @@ func main() {
 			continue
 		}
 
-		// If there is no work available, we wait for a bit and try again
+		// If there is no work available, we ask again right away, the master already waited for work to arrive
 		if work == nil {
-			time.Sleep(retryDelayGetWorkInMilliseconds * time.Millisecond)
 			continue
 		}
 
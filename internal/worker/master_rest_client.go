@@ -67,6 +67,9 @@ type AlignmentDetail struct {
 	Alignment              Alignment              `json:"alignment"`
 }
 
+// How long the master may hold a work request open when there is no work (below the client timeout)
+const workRequestWaitInSeconds = 5
+
 type RestClient struct {
 	baseURL string
 	client  *http.Client
@@ -108,7 +111,8 @@ func (c *RestClient) RequestWork(workerId string) (*WorkPackage, error) {
 		return nil, err
 	}
 
-	resp, err := c.client.Post(c.baseURL+"/work/raw", "application/json", bytes.NewReader(jsonData))
+	url := fmt.Sprintf("%s/work/raw?wait=%d", c.baseURL, workRequestWaitInSeconds)
+	resp, err := c.client.Post(url, "application/json", bytes.NewReader(jsonData))
 	if err != nil {
 		return nil, err
 	}
@@ -0,0 +1,57 @@
+package worker
+
+import "container/list"
+
+// Amount of sequences kept between work packages, the master assumes the same size when it forms packages
+const sequenceCacheSize = 64
+
+type sequenceCacheKey struct {
+	jobId      string
+	sequenceId SequenceId
+}
+
+type sequenceCacheEntry struct {
+	key      sequenceCacheKey
+	sequence Sequence
+}
+
+// SequenceCache keeps the most recently used sequences, so a target shared by consecutive work packages of a job is
+// only fetched from the master once
+type SequenceCache struct {
+	capacity int
+	entries  map[sequenceCacheKey]*list.Element
+	order    *list.List // Most recently used at the front
+}
+
+func NewSequenceCache(capacity int) *SequenceCache {
+	return &SequenceCache{
+		capacity: capacity,
+		entries:  make(map[sequenceCacheKey]*list.Element),
+		order:    list.New(),
+	}
+}
+
+func (c *SequenceCache) Get(jobId string, sequenceId SequenceId) (Sequence, bool) {
+	element, ok := c.entries[sequenceCacheKey{jobId, sequenceId}]
+	if !ok {
+		return "", false
+	}
+	c.order.MoveToFront(element)
+	return element.Value.(*sequenceCacheEntry).sequence, true
+}
+
+func (c *SequenceCache) Put(jobId string, sequenceId SequenceId, sequence Sequence) {
+	key := sequenceCacheKey{jobId, sequenceId}
+	if element, ok := c.entries[key]; ok {
+		element.Value.(*sequenceCacheEntry).sequence = sequence
+		c.order.MoveToFront(element)
+		return
+	}
+
+	c.entries[key] = c.order.PushFront(&sequenceCacheEntry{key: key, sequence: sequence})
+	for c.order.Len() > c.capacity {
+		oldest := c.order.Back()
+		c.order.Remove(oldest)
+		delete(c.entries, oldest.Value.(*sequenceCacheEntry).key)
+	}
+}
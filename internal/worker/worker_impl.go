@@ -16,10 +16,11 @@ import (
 // The worker also contains its benchmark result
 
 type Worker struct {
-	specs    *MachineSpecs // Machine specs of the worker
-	workerId *string       // Unique ID of the worker
-	client   *RestClient   // Client to communicate with the master
-	status   Status
+	specs     *MachineSpecs  // Machine specs of the worker
+	workerId  *string        // Unique ID of the worker
+	sequences *SequenceCache // Sequences of recent work packages
+	client    *RestClient    // Client to communicate with the master
+	status    Status
 }
 
 type Status byte
@@ -35,9 +36,10 @@ const heartbeatIntervalInSeconds = 8
 func InitWorker(client *RestClient, benchmark float32) *Worker {
 	machineSpecs := GetMachineSpecs(benchmark)
 	return &Worker{
-		specs:  machineSpecs,
-		client: client,
-		status: Waiting,
+		specs:     machineSpecs,
+		client:    client,
+		status:    Waiting,
+		sequences: NewSequenceCache(sequenceCacheSize),
 	}
 }
 
@@ -75,11 +77,16 @@ func (w *Worker) GetSequencesForWork(workPackage *WorkPackage) (*CompleteWorkPac
 	var addIfNotPresent = func(id SequenceId) error {
 		_, ok := sequences[id]
 		if !ok {
+			if sequence, cached := w.sequences.Get(*workPackage.JobID, id); cached {
+				sequences[id] = sequence
+				return nil
+			}
 			sequence, err := w.client.RequestSequence(*workPackage.ID, id, w.workerId)
 			if err != nil {
 				return err
 			}
 			sequences[id] = *sequence
+			w.sequences.Put(*workPackage.JobID, id, *sequence)
 		}
 		return nil
 
@@ -1,3 +1,4 @@
 from .job import *
 from .work import *
 from .worker import *
+from .shard import *
@@ -5,7 +5,7 @@ from typing import Literal, Annotated
 from uuid import UUID
 
 from fastapi import HTTPException
-from pydantic import BaseModel, model_validator
+from pydantic import BaseModel, model_validator, field_validator
 from pydantic import Field
 
 Sequence = str
@@ -21,12 +21,30 @@ class TargetQueryCombination(BaseModel):
         return hash((self.target, self.query))
 
 
+class CrossProduct(BaseModel):
+    # every query is aligned with every target, None stands for all sequences of the job
+    queries: list[SequenceId] | None = None
+    targets: list[SequenceId] | None = None
+
+
 # noinspection PyNestedDecorators
 class MultipartJobRequest(BaseModel):
-    queries: set[TargetQueryCombination]
+    # unique combinations, kept in submission order (which is also the order of the result)
+    queries: list[TargetQueryCombination] = []
+    # compact alternative to listing every combination in queries
+    cross_product: CrossProduct | None = None
     match_score: int
     mismatch_penalty: int
     gap_penalty: int
+    # only keep (and return) the k best scoring targets of every query
+    top_k: Annotated[int | None, Field(gt=0)] = None
+    # share of the workers relative to the other running jobs, weight 2 is served twice as much as weight 1
+    weight: Annotated[float, Field(gt=0)] = 1
+
+    @field_validator("queries")
+    @classmethod
+    def deduplicate_queries(cls, value: list[TargetQueryCombination]) -> list[TargetQueryCombination]:
+        return list(dict.fromkeys(value))
 
     @model_validator(mode="before")
     @classmethod
@@ -35,6 +53,14 @@ class MultipartJobRequest(BaseModel):
             return cls(**json.loads(value))
         return value
 
+    @model_validator(mode="after")
+    def validate_pair_specification(self) -> MultipartJobRequest:
+        if self.cross_product is not None and self.queries:
+            raise ValueError("Specify either queries or cross_product, not both")
+        if self.cross_product is None and not self.queries:
+            raise ValueError("A job needs queries or a cross_product")
+        return self
+
 
 # noinspection PyNestedDecorators
 class JobRequest(MultipartJobRequest, BaseModel):
@@ -47,6 +73,16 @@ class JobRequest(MultipartJobRequest, BaseModel):
             if combi.query not in self.sequences:
                 raise HTTPException(400, f"Missing sequence for query {combi.query}")
 
+        if self.cross_product is not None:
+            for query in self.cross_product.queries or ():
+                if query not in self.sequences:
+                    raise HTTPException(400, f"Missing sequence for query {query}")
+            for target in self.cross_product.targets or ():
+                if target not in self.sequences:
+                    raise HTTPException(400, f"Missing sequence for target {target}")
+            if not self.sequences or self.cross_product.queries == [] or self.cross_product.targets == []:
+                raise HTTPException(400, "The cross product of the job is empty")
+
         return self
 
 
@@ -54,6 +90,12 @@ class JobId(BaseModel):
     id: UUID
 
 
+class FastaJobId(JobId, BaseModel):
+    # maps the record names of the uploaded FASTA files to the ids of their sequences
+    query_ids: dict[str, SequenceId]
+    database_ids: dict[str, SequenceId]
+
+
 class JobStatus(BaseModel):
     state: JobState
     # the progress as percentage [0-1]
@@ -76,3 +118,11 @@ class JobResultCombination(BaseModel):
 class JobResult(BaseModel):
     alignments: list[JobResultCombination]
     computation_time: float
+
+
+# one page of the result, grouped by query with the best score first
+class JobResultPage(BaseModel):
+    alignments: list[JobResultCombination]
+    computation_time: float
+    # pass as cursor to get the next page, None if this is the last page
+    next_cursor: str | None
@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+
+class ShardStatus(BaseModel):
+    shard_index: int
+    shard_count: int
+    # units of the jobs of the shard that are waiting to be scheduled
+    pending_units: int
+    unfinished_jobs: int
+    # work packages of the shard that are being computed, in the tail of a job they get speculative copies
+    in_flight_packages: int
+    workers: int
+    idle_workers: int
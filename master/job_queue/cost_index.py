@@ -0,0 +1,153 @@
+import bisect
+from array import array
+from typing import Callable, Iterable
+
+from master.api_models import SequenceId
+from master.job_queue.cost_order import units_by_cost
+from master.job_queue.pair_pool import PairIndex, PairPool
+from master.job_queue.pair_space import PairSpace
+
+# Pairs a budget that already holds a pair may rank to fill the rest of it, the rest is left empty otherwise
+RANKED_TO_FILL_A_BUDGET = 4096
+
+
+class CostIndex:
+    """
+    The pairs of a job ranked by their cost, to fill a budget of cells with the pairs that fit it best.
+    Pairs are ranked as they come out of the rows of the job, most expensive first (see units_by_cost), and only as
+    far as a budget needs it. Once a budget holds a pair, at most RANKED_TO_FILL_A_BUDGET more pairs are ranked to
+    fill the rest of it, the cheap pairs at the end of the order are not ranked just to fill a small remainder.
+    A pair that is taken is unlinked from its rank through union-find, so filling a budget with k pairs costs
+    O(k log n) besides ranking.
+    Pairs that are given back (aborted work) are kept in a small sorted list next to the ranks.
+    """
+
+    def __init__(self, pairs: PairSpace, length_of: Callable[[SequenceId], int]):
+        rows = pairs.rows_by_target_length(length_of)
+        self._unranked = units_by_cost(rows)
+        # (cost, pair) that was taken from the unranked pairs but not ranked yet, as a budget ranked enough
+        self._held: tuple[int, PairIndex] | None = None
+        # No pair is cheaper, budgets below it do not need to rank the rest of the pairs
+        self._min_cost = min((row.query_length * row.target_lengths[-1] for row in rows if row.pairs), default=0)
+        # The ranked pairs and their costs, most expensive first
+        self._pairs = array("q")
+        self._costs = array("q")
+        # Union-find links to the nearest rank that is still linked: _cheaper[rank] towards cheaper pairs (with
+        # len(ranks) standing for none, or the pairs that are not ranked yet), _dearer[rank + 1] towards more
+        # expensive pairs (with 0 standing for none)
+        self._cheaper = array("q", [0])
+        self._dearer = array("q", [0])
+        # (cost, pair), sorted
+        self._returned: list[tuple[int, PairIndex]] = []
+
+    def take(self, pool: PairPool, cells: int, at_least_one: bool = True) -> list[PairIndex]:
+        """
+        Repeatedly takes the most expensive pending pair that still fits the remaining cells, until none fits.
+        If no pair fits at all, the cheapest pending pair is taken unless at_least_one is False.
+        """
+        taken: list[PairIndex] = []
+        remaining = cells
+        rank_limit = None
+        while (head := self._pop_fitting(pool, remaining, rank_limit)) is not None:
+            cost, pair = head
+            pool.take_pairs((pair,))
+            taken.append(pair)
+            remaining -= cost
+            if rank_limit is None:
+                rank_limit = len(self._pairs) + RANKED_TO_FILL_A_BUDGET
+
+        if not taken and at_least_one:
+            cheapest = self._pop_cheapest(pool)
+            if cheapest is not None:
+                taken.extend(pool.take_pairs((cheapest,)))
+        return taken
+
+    def give_back(self, pool: PairPool, pairs: Iterable[PairIndex], cost_of: Callable[[PairIndex], int]) -> None:
+        for pair in pairs:
+            # A pair may end up in the list twice, or still be ranked as well, the copy that is found first wins
+            if pool.is_pending(pair):
+                bisect.insort(self._returned, (cost_of(pair), pair))
+
+    def _pop_fitting(self, pool: PairPool, max_cost: int, rank_limit: int | None) -> tuple[int, PairIndex] | None:
+        """
+        Removes and returns the most expensive pending pair that costs at most max_cost, ranking pairs until there
+        are rank_limit ranks (None for no limit)
+        """
+        while True:
+            rank = self._find_cheaper(bisect.bisect_left(self._costs, -max_cost, key=_negated))
+            if rank == len(self._pairs) and max_cost >= self._min_cost:
+                rank = self._rank_until(max_cost, rank_limit)
+            returned = bisect.bisect_right(self._returned, (max_cost, len(pool))) - 1
+            if rank == len(self._pairs) and returned < 0:
+                return None
+
+            if returned >= 0 and (rank == len(self._pairs) or self._returned[returned][0] >= self._costs[rank]):
+                cost, pair = self._returned.pop(returned)
+            else:
+                cost, pair = self._costs[rank], self._pairs[rank]
+                self._unlink(rank)
+
+            # Pairs that were completed (or taken otherwise) in the meantime are dropped
+            if pool.is_pending(pair):
+                return cost, pair
+
+    def _pop_cheapest(self, pool: PairPool) -> PairIndex | None:
+        # Only asked for when no pair fits, so all pairs are ranked already
+        self._rank_until(-1, None)
+        while True:
+            rank = self._find_dearer(len(self._pairs) - 1)
+            if rank < 0 and not self._returned:
+                return None
+
+            if self._returned and (rank < 0 or self._returned[0][0] <= self._costs[rank]):
+                _, pair = self._returned.pop(0)
+            else:
+                pair = self._pairs[rank]
+                self._unlink(rank)
+
+            if pool.is_pending(pair):
+                return pair
+
+    def _rank_until(self, max_cost: int, rank_limit: int | None) -> int:
+        """Ranks more pairs until one costs at most max_cost, returns its rank (len(ranks) if there is none)"""
+        while rank_limit is None or len(self._pairs) < rank_limit:
+            if self._held is None:
+                self._held = next(self._unranked, None)
+                if self._held is None:
+                    break
+            (cost, pair), self._held = self._held, None
+            rank = len(self._pairs)
+            self._pairs.append(pair)
+            self._costs.append(cost)
+            # The link of the new rank already exists, it was the one for the pairs that were not ranked yet
+            self._cheaper.append(rank + 1)
+            self._dearer.append(rank + 1)
+            if cost <= max_cost:
+                return rank
+        return len(self._pairs)
+
+    def _unlink(self, rank: int) -> None:
+        self._cheaper[rank] = rank + 1
+        self._dearer[rank + 1] = rank
+
+    def _find_cheaper(self, rank: int) -> int:
+        """The first rank at or after the given one that is still linked, len(ranks) if there is none"""
+        return _find(self._cheaper, rank)
+
+    def _find_dearer(self, rank: int) -> int:
+        """The last rank at or before the given one that is still linked, -1 if there is none"""
+        return _find(self._dearer, rank + 1) - 1
+
+
+def _find(links: array, index: int) -> int:
+    root = index
+    while links[root] != root:
+        root = links[root]
+    # Path compression
+    while links[index] != root:
+        links[index], index = root, links[index]
+    return root
+
+
+def _negated(cost: int) -> int:
+    return -cost
@@ -0,0 +1,105 @@
+import heapq
+from typing import Callable, Iterable, Iterator
+
+from master.api_models import SequenceId
+from master.job_queue.pair_pool import PairIndex, PairPool
+from master.job_queue.pair_space import PairSpace, QueryRow
+
+
+class CostOrder:
+    """
+    Hands out the pending pairs of a job by estimated cost (cells = len(query) * len(target)), most expensive first.
+    The rows of every query are merged lazily through a heap, so the pairs of a job are never sorted as a whole.
+    Pairs that are given back (aborted work) are handed out again in the same order.
+    """
+
+    def __init__(self, pairs: PairSpace, length_of: Callable[[SequenceId], int]):
+        self._rows = pairs.rows_by_target_length(length_of)
+        # (-cost, row, position in the row)
+        self._heap = [
+            (-row.query_length * row.target_lengths[0], index, 0)
+            for index, row in enumerate(self._rows)
+            if row.target_lengths
+        ]
+        heapq.heapify(self._heap)
+        # (-cost, pair)
+        self._returned: list[tuple[int, PairIndex]] = []
+        self._cost_of_returned: dict[PairIndex, int] = {}
+        # Cells of the pairs that are still in the order
+        self.pending_cells = sum(row.query_length * row.total_target_length for row in self._rows)
+
+    def take(self, pool: PairPool, cells: int) -> list[PairIndex]:
+        """
+        Takes the most expensive pending pairs until the next one would exceed the given amount of cells.
+        At least one pair is taken, even if it alone is more expensive.
+        """
+        taken: list[PairIndex] = []
+        taken_cells = 0
+        while (head := self._pop_pending(pool, cells - taken_cells if taken else None)) is not None:
+            cost, pair = head
+            pool.take_pairs((pair,))
+            taken.append(pair)
+            taken_cells += cost
+        return taken
+
+    def give_back(self, pool: PairPool, pairs: Iterable[PairIndex], cost_of: Callable[[PairIndex], int]) -> None:
+        for pair in pairs:
+            if pool.is_pending(pair) and pair not in self._cost_of_returned:
+                cost = cost_of(pair)
+                self._cost_of_returned[pair] = cost
+                self.pending_cells += cost
+                heapq.heappush(self._returned, (-cost, pair))
+
+    def _pop_pending(self, pool: PairPool, max_cost: int | None) -> tuple[int, PairIndex] | None:
+        """Removes and returns the most expensive pending pair if its cost is at most max_cost (None for any cost)"""
+        while True:
+            stream_cost = -self._heap[0][0] if self._heap else -1
+            returned_cost = -self._returned[0][0] if self._returned else -1
+            if stream_cost < 0 and returned_cost < 0:
+                return None
+
+            if returned_cost >= stream_cost:
+                cost, pair = returned_cost, self._returned[0][1]
+                if pool.is_pending(pair) and max_cost is not None and cost > max_cost:
+                    return None
+                heapq.heappop(self._returned)
+                del self._cost_of_returned[pair]
+            else:
+                cost, pair = stream_cost, self._next_of_stream()
+                if pool.is_pending(pair) and max_cost is not None and cost > max_cost:
+                    return None
+                self._advance_stream()
+
+            self.pending_cells -= cost
+            # Pairs that were completed (or taken) in the meantime are dropped from the order
+            if pool.is_pending(pair):
+                return cost, pair
+
+    def _next_of_stream(self) -> PairIndex:
+        _, row_index, position = self._heap[0]
+        row = self._rows[row_index]
+        return row.offset + row.pairs[position]
+
+    def _advance_stream(self) -> None:
+        _, row_index, position = self._heap[0]
+        row = self._rows[row_index]
+        position += 1
+        if position < len(row.pairs):
+            heapq.heapreplace(self._heap, (-row.query_length * row.target_lengths[position], row_index, position))
+        else:
+            heapq.heappop(self._heap)
+
+
+def units_by_cost(rows: list[QueryRow]) -> Iterator[tuple[int, PairIndex]]:
+    """Yields (cost, pair) of the pairs of the rows, most expensive first, merging the rows lazily"""
+    heap = [(-row.query_length * row.target_lengths[0], index, 0) for index, row in enumerate(rows) if row.pairs]
+    heapq.heapify(heap)
+    while heap:
+        cost, index, position = heap[0]
+        row = rows[index]
+        yield -cost, row.offset + row.pairs[position]
+        position += 1
+        if position < len(row.pairs):
+            heapq.heapreplace(heap, (-row.query_length * row.target_lengths[position], index, position))
+        else:
+            heapq.heappop(heap)
@@ -0,0 +1,347 @@
+import asyncio
+import itertools
+import logging
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
+from uuid import UUID
+
+from master.api_models import Alignment, JobRequest, WorkAlignment
+from master.job_queue.pair_pool import PairIndex
+from master.job_queue.queued_job import QueuedJob
+from master.settings import SETTINGS
+
+logger = logging.getLogger(__name__)
+
+JOB_LOG_FILE = "jobs.log"
+
+SUBMITTED = 1
+RESULTS_ADDED = 2
+UNITS_SETTLED = 3
+RESULTS_STORED = 4
+JOB_DONE = 5
+RESULTS_RESET = 6
+JOB_DELETED = 7
+
+# crc32 of the kind and the payload, kind, size of the payload
+_HEADER = struct.Struct("<IBI")
+_JOB_ID = struct.Struct("<16s")
+# job id, start time (ns), virtual start, amount of units, followed by the request as JSON
+_SUBMISSION = struct.Struct("<16sqdq")
+# unit, score, length, maxX, maxY, size of the query alignment, size of the target alignment, followed by both
+_ADDED_RESULT = struct.Struct("<qiiiiII")
+# pair, score, length, size of the alignment, followed by the alignment
+_STORED_RESULT = struct.Struct("<qiiI")
+_DONE = struct.Struct("<16sd")
+# Amount of results per record when the stored results of a job are written during a compaction
+_STORED_RESULTS_PER_RECORD = 4096
+# Amount of units whose state is looked at in one step of a compaction
+_UNITS_PER_STEP = 65536
+# A compaction syncs what it wrote whenever this many bytes came together, so the final sync is short
+_SYNC_BYTES = 16 * 1024 * 1024
+# Records appended during a compaction are copied over in steps of this size, only the last step is not interrupted
+_TAIL_BYTES_PER_STEP = 1024 * 1024
+# Buffer of the reads when the log is replayed
+_READ_BUFFER_BYTES = 1024 * 1024
+
+
+@dataclass
+class Submitted:
+    job_id: UUID
+    start_time: int
+    virtual_start: float
+    unit_count: int
+    request: JobRequest
+
+
+@dataclass
+class ResultsAdded:
+    job_id: UUID
+    results: list[tuple[PairIndex, WorkAlignment]]
+
+
+@dataclass
+class UnitsSettled:
+    """The units of a job that were completed when the log was compacted"""
+
+    job_id: UUID
+    units: list[PairIndex]
+
+
+@dataclass
+class ResultsStored:
+    """Results of a job by pair number, as they were stored when the log was compacted"""
+
+    job_id: UUID
+    results: list[tuple[PairIndex, Alignment]]
+
+
+@dataclass
+class JobDone:
+    job_id: UUID
+    computation_time: float
+
+
+@dataclass
+class ResultsReset:
+    job_id: UUID
+
+
+@dataclass
+class JobDeleted:
+    job_id: UUID
+
+
+LogEntry = Submitted | ResultsAdded | UnitsSettled | ResultsStored | JobDone | ResultsReset | JobDeleted
+
+
+class JobLog:
+    """
+    Append-only log of the jobs of the master and their results, from which the jobs are restored after a restart.
+    Every record is framed by a header with its size and a checksum, so a record that was cut short by a crash ends
+    the log instead of corrupting it. Results are appended in one record per result upload and written to the OS
+    right away, submissions are synced to disk as well.
+    Results that are no longer needed (deleted jobs, results that dropped out of the top k) stay in the log until it
+    is compacted: the log is then rewritten with the submissions and the current results of the remaining jobs.
+    While the master runs, the compacted log is written step by step next to the event loop (see compact_concurrently)
+    and records appended in the meantime are copied over at the end. Replaying such a record on top of the compacted
+    state does not change it, results that were recorded twice are only kept once.
+    """
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._file: BinaryIO = open(path, "ab")
+        # Offset and size of the submission record of every job in the log, copied as they are when compacting
+        self._submissions: dict[UUID, tuple[int, int]] = {}
+        self._compacted_size = self._file.tell()
+
+    @property
+    def size(self) -> int:
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def replay(self) -> Iterator[LogEntry]:
+        """Yields the entries of the log, up to the first damaged record"""
+        offset = 0
+        with open(self._path, "rb", buffering=_READ_BUFFER_BYTES) as file:
+            length = os.fstat(file.fileno()).st_size
+            while offset + _HEADER.size <= length:
+                checksum, kind, size = _HEADER.unpack(file.read(_HEADER.size))
+                end = offset + _HEADER.size + size
+                if end > length:
+                    break
+                payload = memoryview(file.read(size))
+                if zlib.crc32(payload, zlib.crc32(bytes((kind,)))) != checksum:
+                    break
+
+                entry = _decode(kind, payload)
+                if isinstance(entry, Submitted):
+                    self._submissions[entry.job_id] = (offset, end - offset)
+                if entry is not None:
+                    yield entry
+                offset = end
+
+        if offset != length:
+            logger.warning(f"Job log {self._path} ends with {length - offset} bytes of a damaged record, dropped")
+
+    def submitted(self, job: QueuedJob, request: JobRequest) -> None:
+        offset = self.size
+        self._append(SUBMITTED, _encode_submission(job) + request.model_dump_json().encode(), sync=True)
+        self._submissions[job.id] = (offset, self.size - offset)
+
+    def results_added(self, job: QueuedJob, results: list[tuple[PairIndex, WorkAlignment]]) -> None:
+        pack = _ADDED_RESULT.pack
+        parts = [job.id.bytes]
+        for unit, alignment in results:
+            query_alignment = alignment.query_alignment.encode()
+            target_alignment = alignment.target_alignment.encode()
+            header = pack(
+                unit,
+                alignment.score,
+                alignment.length,
+                alignment.maxX,
+                alignment.maxY,
+                len(query_alignment),
+                len(target_alignment),
+            )
+            parts += (header, query_alignment, target_alignment)
+        self._append(RESULTS_ADDED, b"".join(parts))
+
+    def job_done(self, job: QueuedJob) -> None:
+        self._append(JOB_DONE, _DONE.pack(job.id.bytes, job.computation_time))
+
+    def results_reset(self, job: QueuedJob) -> None:
+        self._append(RESULTS_RESET, job.id.bytes)
+
+    def job_deleted(self, job_id: UUID) -> None:
+        self._append(JOB_DELETED, job_id.bytes)
+        self._submissions.pop(job_id, None)
+
+    def needs_compaction(self) -> bool:
+        return self.size > max(SETTINGS.job_log_compaction_bytes, 2 * self._compacted_size)
+
+    def compact(self, jobs: Iterable[QueuedJob]) -> None:
+        """Replaces the log by one with only the submissions and the current results of the given jobs"""
+        for _ in self._compaction(jobs):
+            pass
+
+    async def compact_concurrently(self, jobs: Iterable[QueuedJob]) -> None:
+        """Like compact, but lets the event loop go on between the steps of the compaction"""
+        for _ in self._compaction(jobs):
+            await asyncio.sleep(0)
+
+    def _compaction(self, jobs: Iterable[QueuedJob]) -> Iterator[None]:
+        """Compacts the log, pausing after every step. Records appended during a pause end up in the new log too"""
+        self._file.flush()
+        start = self.size
+        compacted = self._path.with_suffix(".compacting")
+        submissions: dict[UUID, tuple[int, int]] = {}
+        with open(self._path, "rb") as source, open(compacted, "wb") as target:
+            synced = 0
+            for job in jobs:
+                if job.id not in self._submissions:
+                    # Deleted in the meantime
+                    continue
+                yield from self._write_job(job, source, target, submissions)
+                if target.tell() - synced > _SYNC_BYTES:
+                    target.flush()
+                    os.fsync(target.fileno())
+                    synced = target.tell()
+                yield
+
+            # Records appended in the meantime follow the compacted ones, the last of them without a pause
+            tail = target.tell()
+            copied = start
+            source.seek(start)
+            while self.size - copied > _TAIL_BYTES_PER_STEP:
+                target.write(source.read(_TAIL_BYTES_PER_STEP))
+                copied += _TAIL_BYTES_PER_STEP
+                yield
+            target.write(source.read(self.size - copied))
+            target.flush()
+            os.fsync(target.fileno())
+
+        logger.info(f"Compacting job log {self._path}: {self.size} -> {compacted.stat().st_size} bytes")
+        self._file.close()
+        os.replace(compacted, self._path)
+        self._file = open(self._path, "ab")
+        self._submissions = {
+            job_id: submissions[job_id] if job_id in submissions else (offset - start + tail, size)
+            for job_id, (offset, size) in self._submissions.items()
+            if job_id in submissions or offset >= start
+        }
+        self._compacted_size = self.size
+
+    def _write_job(
+        self, job: QueuedJob, source: BinaryIO, target: BinaryIO, submissions: dict[UUID, tuple[int, int]]
+    ) -> Iterator[None]:
+        # The request is copied as it is, the rest of the submission is written anew
+        offset, size = self._submissions[job.id]
+        source.seek(offset + _HEADER.size + _SUBMISSION.size)
+        request = source.read(size - _HEADER.size - _SUBMISSION.size)
+        submissions[job.id] = (target.tell(), size)
+        _write_record(target, SUBMITTED, _encode_submission(job) + request)
+
+        settled = bytearray()
+        for start in range(0, len(job.pool), _UNITS_PER_STEP):
+            _set_bits(settled, job.settled_units(start, start + _UNITS_PER_STEP))
+            yield
+        _write_record(target, UNITS_SETTLED, job.id.bytes + settled)
+
+        results = job.results.items()
+        while chunk := list(itertools.islice(results, _STORED_RESULTS_PER_RECORD)):
+            _write_record(target, RESULTS_STORED, _encode_stored_results(job.id, chunk))
+            yield
+        if job.computation_time is not None:
+            _write_record(target, JOB_DONE, _DONE.pack(job.id.bytes, job.computation_time))
+
+    def _append(self, kind: int, payload: bytes, sync: bool = False) -> None:
+        _write_record(self._file, kind, payload)
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+
+def _write_record(file: BinaryIO, kind: int, payload: bytes) -> None:
+    file.write(_HEADER.pack(zlib.crc32(payload, zlib.crc32(bytes((kind,)))), kind, len(payload)))
+    file.write(payload)
+
+
+def _encode_submission(job: QueuedJob) -> bytes:
+    return _SUBMISSION.pack(job.id.bytes, job.start_time, job.virtual_start, len(job.units))
+
+
+def _set_bits(settled: bytearray, units: Iterable[PairIndex]) -> None:
+    for unit in units:
+        byte, bit = divmod(unit, 8)
+        if byte >= len(settled):
+            settled.extend(bytes(byte + 1 - len(settled)))
+        settled[byte] |= 1 << bit
+
+
+def _encode_stored_results(job_id: UUID, results: list[tuple[PairIndex, Alignment]]) -> bytes:
+    parts = [job_id.bytes]
+    for pair, alignment in results:
+        encoded = alignment.alignment.encode()
+        parts.append(_STORED_RESULT.pack(pair, alignment.score, alignment.length, len(encoded)))
+        parts.append(encoded)
+    return b"".join(parts)
+
+
+def _decode(kind: int, payload: memoryview) -> LogEntry | None:
+    if kind == SUBMITTED:
+        job_id, start_time, virtual_start, unit_count = _SUBMISSION.unpack_from(payload)
+        request = JobRequest.model_validate_json(bytes(payload[_SUBMISSION.size :]))
+        return Submitted(UUID(bytes=job_id), start_time, virtual_start, unit_count, request)
+
+    job_id = UUID(bytes=_JOB_ID.unpack_from(payload)[0])
+    offset = _JOB_ID.size
+    if kind == RESULTS_ADDED:
+        added: list[tuple[PairIndex, WorkAlignment]] = []
+        while offset < len(payload):
+            unit, score, length, max_x, max_y, query_size, target_size = _ADDED_RESULT.unpack_from(payload, offset)
+            offset += _ADDED_RESULT.size
+            query_alignment = str(payload[offset : offset + query_size], "utf-8")
+            offset += query_size
+            target_alignment = str(payload[offset : offset + target_size], "utf-8")
+            offset += target_size
+            alignment = WorkAlignment.model_construct(
+                query_alignment=query_alignment,
+                target_alignment=target_alignment,
+                length=length,
+                score=score,
+                maxX=max_x,
+                maxY=max_y,
+            )
+            added.append((unit, alignment))
+        return ResultsAdded(job_id, added)
+    if kind == UNITS_SETTLED:
+        settled = payload[offset:]
+        return UnitsSettled(
+            job_id, [byte * 8 + bit for byte, bits in enumerate(settled) if bits for bit in range(8) if bits >> bit & 1]
+        )
+    if kind == RESULTS_STORED:
+        stored: list[tuple[PairIndex, Alignment]] = []
+        while offset < len(payload):
+            pair, score, length, size = _STORED_RESULT.unpack_from(payload, offset)
+            offset += _STORED_RESULT.size
+            alignment = Alignment.model_construct(
+                alignment=str(payload[offset : offset + size], "utf-8"), length=length, score=score
+            )
+            offset += size
+            stored.append((pair, alignment))
+        return ResultsStored(job_id, stored)
+    if kind == JOB_DONE:
+        return JobDone(job_id, _DONE.unpack_from(payload)[1])
+    if kind == RESULTS_RESET:
+        return ResultsReset(job_id)
+    if kind == JOB_DELETED:
+        return JobDeleted(job_id)
+
+    logger.warning(f"Skipping job log record of unknown kind {kind}")
+    return None
@@ -1,12 +1,34 @@
+import asyncio
 import logging
-from uuid import UUID, uuid4
+from pathlib import Path
+from typing import Callable
+from uuid import UUID
 
 from fastapi import HTTPException
 
-from master.api_models import JobRequest
+from master.api_models import JobRequest, WorkAlignment
+from master.job_queue.job_log import (
+    JOB_LOG_FILE,
+    JobDeleted,
+    JobDone,
+    JobLog,
+    ResultsAdded,
+    ResultsReset,
+    ResultsStored,
+    Submitted,
+    UnitsSettled,
+)
+from master.job_queue.pair_pool import PairIndex, PairPool
+from master.job_queue.pair_space import pair_space_of
 from master.job_queue.queued_job import QueuedJob
+from master.job_queue.result_store import ResultStore
+from master.job_queue.tiling import tile_long_pairs
+from master.job_queue.top_k import TopKTracker
+from master.sequence_store.sequence_store import SequenceStore
+from master.utils.notifier import Notifier
+from master.utils.shard import new_shard_id
 from master.utils.singleton import Singleton
-import time
+from master.utils.time import current_ns
 
 logger = logging.getLogger(__name__)
 
@@ -20,20 +42,47 @@ class JobQueue(Singleton):
     def __init__(self):
         super().__init__()
         self._jobs: dict[UUID, QueuedJob] = {}
+        self._sequence_store = SequenceStore()
+        # Notified whenever pairs become available for scheduling, idle workers wait on this
+        self.work_available = Notifier()
+        # Virtual time of the job served last, new jobs start here so they cannot claim the past of the queue
+        self._virtual_time = 0.0
+        # Set once the jobs are recovered from a log, see recover
+        self._log: JobLog | None = None
+        # Compaction of the log that runs next to the event loop, see _compact_log_if_needed
+        self._compaction: asyncio.Task | None = None
 
     def add_job_to_queue(self, request: JobRequest) -> QueuedJob:
-        job_id = uuid4()
-        logger.info(f"Adding job to queue. Job has {len(request.queries)} queries")
+        job = self._create_job(request, new_shard_id(), current_ns(), self._virtual_time)
+        if self._log is not None:
+            self._log.submitted(job, request)
+            self._compact_log_if_needed()
+        self.work_available.notify()
+        return job
+
+    def _create_job(self, request: JobRequest, job_id: UUID, start_time: int, virtual_start: float) -> QueuedJob:
+        pairs = pair_space_of(request)
+        logger.info(f"Adding job to queue. Job has {len(pairs)} queries")
+        units, sequences = tile_long_pairs(
+            pairs, self._sequence_store.add_all(request.sequences), request.match_score, request.gap_penalty
+        )
+        if units is not pairs:
+            logger.info(f"Long targets are split into tiles, {len(units)} units are scheduled")
         self._jobs[job_id] = QueuedJob(
-            request=request,
-            completed_sequences={},
-            sequences_in_progress=set(),
+            sequences=sequences,
+            pairs=pairs,
+            units=units,
+            pool=PairPool(len(units)),
+            results=ResultStore(),
+            top_k=TopKTracker(request.top_k) if request.top_k else None,
             id=job_id,
             match_score=request.match_score,
             mismatch_penalty=request.mismatch_penalty,
             gap_penalty=request.gap_penalty,
-            start_time=time.time_ns(),
-            computation_time=None
+            start_time=start_time,
+            computation_time=None,
+            weight=request.weight,
+            virtual_start=virtual_start,
         )
         return self._jobs[job_id]
 
@@ -44,10 +93,26 @@ class JobQueue(Singleton):
         jobs: list[QueuedJob] = []
 
         for job in self._jobs.values():
-            if not job.done() and job.missing_sequences():
+            if not job.done() and job.has_unassigned_pairs():
                 jobs.append(job)
         return jobs
 
+    def pending_unit_count(self) -> int:
+        return sum(job.pool.pending_count for job in self._jobs.values())
+
+    def next_job_to_schedule(self, eligible: Callable[[QueuedJob], bool] | None = None) -> QueuedJob | None:
+        """
+        The job with unassigned pairs that received the least work relative to its weight, the oldest on a tie.
+        Jobs for which eligible returns False are passed over.
+        """
+        jobs = self.jobs_with_unassigned_sequences()
+        if eligible is not None:
+            jobs = [job for job in jobs if eligible(job)]
+        job = min(jobs, key=lambda queued_job: queued_job.virtual_time, default=None)
+        if job is not None:
+            self._virtual_time = max(self._virtual_time, job.virtual_time)
+        return job
+
     def get_job_by_id(self, job_id: UUID) -> QueuedJob:
         job = self._jobs.get(job_id)
         if not job:
@@ -56,5 +121,89 @@ class JobQueue(Singleton):
 
     def delete_job_by_id(self, job_id: UUID):
         logger.info(f"Deleting job from queue")
-        self.get_job_by_id(job_id)
+        job = self.get_job_by_id(job_id)
+        job.sequences.release()
+        job.results.clear()
         del self._jobs[job_id]
+        job.progress.notify()
+        if self._log is not None:
+            self._log.job_deleted(job_id)
+
+    def record_results(self, job: QueuedJob, results: list[tuple[PairIndex, WorkAlignment]]) -> None:
+        """Logs results that were added to a job, so they are not computed again after a restart"""
+        if self._log is not None and results:
+            self._log.results_added(job, results)
+            if job.done() and job.computation_time is not None:
+                self._log.job_done(job)
+            self._compact_log_if_needed()
+
+    def record_reset(self, job: QueuedJob) -> None:
+        if self._log is not None:
+            self._log.results_reset(job)
+
+    def recover(self, directory: str) -> None:
+        """
+        Restores the jobs (and their results) from the job log in the directory, and logs every change to the jobs
+        from now on. Only the units without a result are scheduled again.
+        """
+        path = Path(directory) / JOB_LOG_FILE
+        path.parent.mkdir(parents=True, exist_ok=True)
+        log = JobLog(path)
+        # Jobs whose units are numbered differently than before (e.g. the tiling settings changed) start from scratch
+        renumbered: set[UUID] = set()
+        for entry in log.replay():
+            if isinstance(entry, Submitted):
+                job = self._create_job(entry.request, entry.job_id, entry.start_time, entry.virtual_start)
+                self._virtual_time = max(self._virtual_time, entry.virtual_start)
+                if len(job.units) != entry.unit_count:
+                    logger.warning(f"Units of job {job.id} changed, its results are computed again")
+                    renumbered.add(job.id)
+                continue
+
+            job = self._jobs.get(entry.job_id)
+            if job is None:
+                continue
+            if isinstance(entry, JobDeleted):
+                self.delete_job_by_id(job.id)
+            elif job.id in renumbered:
+                continue
+            elif isinstance(entry, ResultsAdded):
+                for unit, alignment in entry.results:
+                    job.add_result(unit, alignment)
+            elif isinstance(entry, UnitsSettled):
+                job.restore(entry.units, ())
+            elif isinstance(entry, ResultsStored):
+                job.restore((), entry.results)
+            elif isinstance(entry, JobDone):
+                job.computation_time = entry.computation_time
+            elif isinstance(entry, ResultsReset):
+                job.reset_results()
+
+        for job in self._jobs.values():
+            if job.done() and job.computation_time is None:
+                job.computation_time = current_ns() - job.start_time
+        logger.info(
+            f"Recovered {len(self._jobs)} jobs from {path}, {self.pending_unit_count()} units are left to compute"
+        )
+        # Drops what is no longer needed, and a damaged record at the end that new records would follow
+        log.compact(self._jobs.values())
+        self._log = log
+        self.work_available.notify()
+
+    def _compact_log_if_needed(self) -> None:
+        if (self._compaction is not None and not self._compaction.done()) or not self._log.needs_compaction():
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Without an event loop (e.g. in a simulation) nothing waits for the compaction
+            self._log.compact(self._jobs.values())
+            return
+        self._compaction = loop.create_task(self._log.compact_concurrently(list(self._jobs.values())))
+        self._compaction.add_done_callback(_log_compaction_failure)
+
+
+def _log_compaction_failure(compaction: asyncio.Task) -> None:
+    if not compaction.cancelled() and compaction.exception() is not None:
+        logger.error(f"Compacting the job log failed: {compaction.exception()}")
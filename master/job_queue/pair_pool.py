@@ -0,0 +1,133 @@
+from typing import Iterable, Iterator
+
+PairIndex = int
+
+PENDING = 0
+IN_PROGRESS = 1
+COMPLETED = 2
+
+_UNFINISHED_AS_PENDING = bytes.maketrans(bytes([PENDING, IN_PROGRESS]), bytes([PENDING, PENDING]))
+
+
+class PairPool:
+    """
+    Tracks the state (pending, in progress, completed) of every pair of a job by its index.
+    Fresh pairs are handed out through a cursor and aborted pairs through a stack, so taking k pairs costs O(k)
+    regardless of the size of the job.
+    """
+
+    def __init__(self, size: int):
+        self._states = bytearray(size)
+        self._cursor = 0
+        self._requeued: list[PairIndex] = []
+        # Pairs in progress in more than one package (speculative copies) and how many extra packages hold them
+        self._extra_holders: dict[PairIndex, int] = {}
+        self.pending_count = size
+        self.in_progress_count = 0
+        self.completed_count = 0
+
+    def snapshot(self) -> "PairPool":
+        """An independent copy in which every pair that is not completed is pending"""
+        copy = PairPool(0)
+        copy._states = self._states.translate(_UNFINISHED_AS_PENDING)
+        copy.completed_count = self.completed_count
+        copy.pending_count = len(self) - self.completed_count
+        return copy
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def is_pending(self, pair: PairIndex) -> bool:
+        return self._states[pair] == PENDING
+
+    def is_in_progress(self, pair: PairIndex) -> bool:
+        return self._states[pair] == IN_PROGRESS
+
+    def is_completed(self, pair: PairIndex) -> bool:
+        return self._states[pair] == COMPLETED
+
+    def iter_pending(self) -> Iterator[PairIndex]:
+        """Yields pending pairs without taking them, re-queued pairs first"""
+        for pair in reversed(self._requeued):
+            if self._states[pair] == PENDING:
+                yield pair
+        for pair in range(self._cursor, len(self._states)):
+            if self._states[pair] == PENDING:
+                yield pair
+
+    def take(self, amount: int) -> list[PairIndex]:
+        taken: list[PairIndex] = []
+        while len(taken) < amount and self._requeued:
+            pair = self._requeued.pop()
+            if self._states[pair] == PENDING:
+                self._mark_in_progress(pair)
+                taken.append(pair)
+
+        while len(taken) < amount and self._cursor < len(self._states):
+            pair = self._cursor
+            self._cursor += 1
+            if self._states[pair] == PENDING:
+                self._mark_in_progress(pair)
+                taken.append(pair)
+
+        return taken
+
+    def take_pairs(self, pairs: Iterable[PairIndex]) -> list[PairIndex]:
+        taken: list[PairIndex] = []
+        for pair in pairs:
+            if self._states[pair] == PENDING:
+                self._mark_in_progress(pair)
+                taken.append(pair)
+        return taken
+
+    def hold(self, pairs: Iterable[PairIndex]) -> list[PairIndex]:
+        """Adds a holder to pairs that are already in progress, for a copy of the work, and returns those pairs"""
+        held: list[PairIndex] = []
+        for pair in pairs:
+            if self._states[pair] == IN_PROGRESS:
+                self._extra_holders[pair] = self._extra_holders.get(pair, 0) + 1
+                held.append(pair)
+        return held
+
+    def requeue(self, pairs: Iterable[PairIndex]) -> None:
+        """Releases pairs of aborted work, they become pending again once no other package holds them"""
+        for pair in pairs:
+            if self._states[pair] != IN_PROGRESS:
+                continue
+            extra_holders = self._extra_holders.pop(pair, 0)
+            if extra_holders:
+                if extra_holders > 1:
+                    self._extra_holders[pair] = extra_holders - 1
+                continue
+            self._states[pair] = PENDING
+            self.in_progress_count -= 1
+            self.pending_count += 1
+            self._requeued.append(pair)
+
+    def complete(self, pair: PairIndex) -> bool:
+        """Marks a pair as completed, returns False if it already was"""
+        state = self._states[pair]
+        if state == COMPLETED:
+            return False
+
+        if state == PENDING:
+            self.pending_count -= 1
+        else:
+            self.in_progress_count -= 1
+            self._extra_holders.pop(pair, None)
+        self.completed_count += 1
+        self._states[pair] = COMPLETED
+        return True
+
+    def requeue_completed(self) -> None:
+        for pair, state in enumerate(self._states):
+            if state == COMPLETED:
+                self._states[pair] = PENDING
+                self._requeued.append(pair)
+        self.pending_count += self.completed_count
+        self.completed_count = 0
+
+    def _mark_in_progress(self, pair: PairIndex) -> None:
+        self._states[pair] = IN_PROGRESS
+        self.pending_count -= 1
+        self.in_progress_count += 1
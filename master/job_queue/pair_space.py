@@ -0,0 +1,203 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Iterable, Sequence
+
+from master.api_models import JobRequest, SequenceId, TargetQueryCombination
+from master.job_queue.pair_pool import PairIndex
+
+
+@dataclass(frozen=True)
+class QueryRow:
+    """The pairs of one query ordered by the length of their target, longest first"""
+
+    query_length: int
+    # Pair number of the n-th entry is offset + pairs[n]
+    offset: int
+    target_lengths: Sequence[int]
+    pairs: Sequence[PairIndex]
+    total_target_length: int
+
+
+@dataclass(frozen=True)
+class Tile:
+    """A part of the target of a pair, starting at start, that is aligned on its own"""
+
+    pair: PairIndex
+    start: int
+    # Amount of tiles the target of the pair is split into
+    count: int
+
+
+class PairSpace(ABC):
+    """Numbers the (query, target) pairs of a job, so that the rest of the master can refer to pairs by index"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abstractmethod
+    def __getitem__(self, pair: PairIndex) -> TargetQueryCombination:
+        pass
+
+    @abstractmethod
+    def index_of(self, combination: TargetQueryCombination) -> PairIndex | None:
+        pass
+
+    @abstractmethod
+    def query_group_count(self) -> int:
+        """The pairs are grouped by their query, this returns the amount of groups"""
+
+    @abstractmethod
+    def query_group(self, group: int) -> Sequence[PairIndex]:
+        """All pairs of the n-th query, in pair order"""
+
+    @abstractmethod
+    def target_group(self, target: SequenceId) -> Sequence[PairIndex]:
+        """All pairs with the given target, in pair order"""
+
+    @abstractmethod
+    def targets(self) -> Sequence[SequenceId]:
+        """The distinct targets of the pairs"""
+
+    @abstractmethod
+    def rows_by_target_length(self, length_of: Callable[[SequenceId], int]) -> list[QueryRow]:
+        """Rows of the pairs of every query group ordered by target length, one row per group unless tiled"""
+
+    # noinspection PyMethodMayBeStatic
+    def pair_of(self, unit: PairIndex) -> PairIndex:
+        """The pair a scheduled unit belongs to, only differs from the unit if long pairs are split into tiles"""
+        return unit
+
+    # noinspection PyMethodMayBeStatic
+    def tile_of(self, unit: PairIndex) -> Tile | None:
+        return None
+
+
+class ExplicitPairs(PairSpace):
+    """An explicitly listed set of pairs, numbered in submission order"""
+
+    def __init__(self, combinations: Iterable[TargetQueryCombination]):
+        self._combinations = list(combinations)
+        self._index = {combination: pair for pair, combination in enumerate(self._combinations)}
+        self._query_groups: list[list[PairIndex]] | None = None
+        self._target_groups: dict[SequenceId, list[PairIndex]] | None = None
+
+    def __len__(self) -> int:
+        return len(self._combinations)
+
+    def __getitem__(self, pair: PairIndex) -> TargetQueryCombination:
+        return self._combinations[pair]
+
+    def index_of(self, combination: TargetQueryCombination) -> PairIndex | None:
+        return self._index.get(combination)
+
+    def query_group_count(self) -> int:
+        return len(self._get_query_groups())
+
+    def query_group(self, group: int) -> Sequence[PairIndex]:
+        return self._get_query_groups()[group]
+
+    def target_group(self, target: SequenceId) -> Sequence[PairIndex]:
+        return self._get_target_groups().get(target, ())
+
+    def targets(self) -> Sequence[SequenceId]:
+        return list(self._get_target_groups())
+
+    def rows_by_target_length(self, length_of: Callable[[SequenceId], int]) -> list[QueryRow]:
+        rows: list[QueryRow] = []
+        for group in self._get_query_groups():
+            by_length = sorted(((length_of(self._combinations[pair].target), pair) for pair in group), reverse=True)
+            target_lengths = [length for length, _ in by_length]
+            rows.append(
+                QueryRow(
+                    query_length=length_of(self._combinations[group[0]].query),
+                    offset=0,
+                    target_lengths=target_lengths,
+                    pairs=[pair for _, pair in by_length],
+                    total_target_length=sum(target_lengths),
+                )
+            )
+        return rows
+
+    def _get_query_groups(self) -> list[list[PairIndex]]:
+        # Only built once someone asks for the grouped results
+        if self._query_groups is None:
+            groups: dict[SequenceId, list[PairIndex]] = {}
+            for pair, combination in enumerate(self._combinations):
+                groups.setdefault(combination.query, []).append(pair)
+            self._query_groups = list(groups.values())
+        return self._query_groups
+
+    def _get_target_groups(self) -> dict[SequenceId, list[PairIndex]]:
+        if self._target_groups is None:
+            self._target_groups = {}
+            for pair, combination in enumerate(self._combinations):
+                self._target_groups.setdefault(combination.target, []).append(pair)
+        return self._target_groups
+
+
+class CrossProductPairs(PairSpace):
+    """Every query with every target, pairs are enumerated lazily as query_index * len(targets) + target_index"""
+
+    def __init__(self, queries: Iterable[SequenceId], targets: Iterable[SequenceId]):
+        self._queries = list(dict.fromkeys(queries))
+        self._targets = list(dict.fromkeys(targets))
+        self._query_index = {query: index for index, query in enumerate(self._queries)}
+        self._target_index = {target: index for index, target in enumerate(self._targets)}
+
+    def __len__(self) -> int:
+        return len(self._queries) * len(self._targets)
+
+    def __getitem__(self, pair: PairIndex) -> TargetQueryCombination:
+        query_index, target_index = divmod(pair, len(self._targets))
+        return TargetQueryCombination(query=self._queries[query_index], target=self._targets[target_index])
+
+    def index_of(self, combination: TargetQueryCombination) -> PairIndex | None:
+        query_index = self._query_index.get(combination.query)
+        target_index = self._target_index.get(combination.target)
+        if query_index is None or target_index is None:
+            return None
+        return query_index * len(self._targets) + target_index
+
+    def query_group_count(self) -> int:
+        return len(self._queries)
+
+    def query_group(self, group: int) -> Sequence[PairIndex]:
+        return range(group * len(self._targets), (group + 1) * len(self._targets))
+
+    def target_group(self, target: SequenceId) -> Sequence[PairIndex]:
+        target_index = self._target_index.get(target)
+        if target_index is None:
+            return ()
+        return range(target_index, len(self), len(self._targets))
+
+    def targets(self) -> Sequence[SequenceId]:
+        return self._targets
+
+    def rows_by_target_length(self, length_of: Callable[[SequenceId], int]) -> list[QueryRow]:
+        # Every query sees the same targets, so all rows share a single ordering of them
+        lengths = [length_of(target) for target in self._targets]
+        order = sorted(range(len(lengths)), key=lengths.__getitem__, reverse=True)
+        target_lengths = [lengths[target] for target in order]
+        total_target_length = sum(lengths)
+        return [
+            QueryRow(
+                query_length=length_of(query),
+                offset=group * len(self._targets),
+                target_lengths=target_lengths,
+                pairs=order,
+                total_target_length=total_target_length,
+            )
+            for group, query in enumerate(self._queries)
+        ]
+
+
+def pair_space_of(request: JobRequest) -> PairSpace:
+    if request.cross_product is None:
+        return ExplicitPairs(request.queries)
+
+    sequence_ids = list(request.sequences)
+    return CrossProductPairs(
+        queries=sequence_ids if request.cross_product.queries is None else request.cross_product.queries,
+        targets=sequence_ids if request.cross_product.targets is None else request.cross_product.targets,
+    )
@@ -0,0 +1,70 @@
+from array import array
+from bisect import bisect_right
+from itertools import chain
+from typing import Callable, Iterable
+
+from master.api_models import SequenceId
+from master.job_queue.cost_order import CostOrder
+from master.job_queue.pair_pool import PairIndex, PairPool
+from master.job_queue.pair_space import PairSpace
+
+
+class PartitionPlan:
+    """
+    The pairs of a job cut into chunks of at most chunk_cells (or a single more expensive pair), most expensive first.
+    Prefix sums over the chunk costs let a scheduler take any amount of work with one binary search.
+    """
+
+    def __init__(self, chunks: list[list[PairIndex]], costs: Iterable[int]):
+        self._chunks = chunks
+        self._prefix_cells = array("q", [0])
+        for cost in costs:
+            self._prefix_cells.append(self._prefix_cells[-1] + cost)
+        self._cursor = 0
+        # Chunks of aborted work, handed out before the rest of the plan
+        self._returned: list[list[PairIndex]] = []
+
+    @staticmethod
+    def build(
+        pairs: PairSpace, length_of: Callable[[SequenceId], int], chunk_cells: int, pool: PairPool | None = None
+    ) -> "PartitionPlan":
+        """Plans the pairs that are pending in the pool, which is a snapshot the plan may use up (all pairs if None)"""
+        order = CostOrder(pairs, length_of)
+        # Only used to walk the order once, the pool of the job is not touched while planning
+        pool = PairPool(len(pairs)) if pool is None else pool
+        chunks: list[list[PairIndex]] = []
+        costs: list[int] = []
+        while True:
+            cells_before = order.pending_cells
+            chunk = order.take(pool, chunk_cells)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            costs.append(cells_before - order.pending_cells)
+        return PartitionPlan(chunks, costs)
+
+    def __len__(self) -> int:
+        """Amount of chunks that have not been handed out"""
+        return len(self._chunks) - self._cursor + len(self._returned)
+
+    def take(self, pool: PairPool, cells: float) -> list[PairIndex]:
+        """Takes the next chunks up to the given amount of cells (at least one chunk), skipping pairs that are done"""
+        while self._returned:
+            taken = pool.take_pairs(self._returned.pop())
+            if taken:
+                return taken
+
+        while self._cursor < len(self._chunks):
+            start = self._cursor
+            end = bisect_right(self._prefix_cells, self._prefix_cells[start] + cells) - 1
+            self._cursor = min(max(end, start + 1), len(self._chunks))
+            taken = pool.take_pairs(chain.from_iterable(self._chunks[start : self._cursor]))
+            if taken:
+                return taken
+
+        return []
+
+    def give_back(self, pool: PairPool, pairs: Iterable[PairIndex]) -> None:
+        returned = [pair for pair in pairs if pool.is_pending(pair)]
+        if returned:
+            self._returned.append(returned)
@@ -1,44 +1,214 @@
-from dataclasses import dataclass
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator
 from uuid import UUID
 
-from master.api_models import JobRequest, TargetQueryCombination, JobState, Alignment
-from master.utils.log_time import log_time
-from master.utils.try_until_succeeds import try_until_succeeds
+from master.api_models import (
+    Alignment,
+    JobState,
+    JobResult,
+    JobResultCombination,
+    SequenceId,
+    WorkAlignment,
+)
+from master.job_queue.cost_index import CostIndex
+from master.job_queue.cost_order import CostOrder
+from master.job_queue.pair_pool import PairPool, PairIndex
+from master.job_queue.pair_space import PairSpace
+from master.job_queue.partition_plan import PartitionPlan
+from master.job_queue.result_store import ResultStore
+from master.job_queue.tiling import TileMerger
+from master.job_queue.top_k import TopKTracker
+from master.sequence_store.sequence_store import SequenceHandles
+from master.utils.notifier import Notifier
+
+# How many query groups keep their ranked pairs for the result pages that follow
+RANKED_GROUPS_CACHED = 8
 
 
 @dataclass
 class QueuedJob:
-    request: JobRequest
-    completed_sequences: dict[TargetQueryCombination, list[Alignment]]
-    sequences_in_progress: set[TargetQueryCombination]
+    # The sequences of the job, held in the master-wide sequence store
+    sequences: SequenceHandles
+    # Numbers all pairs of the job, results are stored by pair number
+    pairs: PairSpace
+    # What the pool schedules: the pairs themselves, or tiles of the pairs with long targets
+    # (the numbers in the pool and in work packages are unit numbers)
+    units: PairSpace
+    pool: PairPool
+    results: ResultStore
+    # Only the best k results per query are kept if set
+    top_k: TopKTracker | None
     id: UUID
     match_score: int
     mismatch_penalty: int
     gap_penalty: int
     start_time: float
     computation_time: float | None
+    # Notified whenever results of the job arrive (or the job goes away)
+    progress: Notifier = field(default_factory=Notifier)
+    # Built on first use by the schedulers that hand out the most expensive pairs first
+    _cost_order: CostOrder | None = field(default=None, repr=False)
+    # Built on first use by the time scheduler
+    _cost_index: CostIndex | None = field(default=None, repr=False)
+    # Built in the background by the planned scheduler
+    partition_plan: Future[PartitionPlan] | None = field(default=None, repr=False)
+    # Weighted fair queuing: jobs are served by the least work assigned relative to their weight, starting from the
+    # virtual time of the queue when they were submitted
+    weight: float = 1
+    virtual_start: float = 0
+    assigned_cells: int = 0
+    _tile_merger: TileMerger = field(default_factory=TileMerger, repr=False)
+    # Ranked pairs of the query groups that were paged through last, dropped whenever the stored results change
+    _ranked_groups: dict[int, list[PairIndex]] = field(default_factory=dict, repr=False)
 
     @property
     def state(self) -> JobState:
         if self.done():
             return "DONE"
-        elif len(self.completed_sequences):
+        elif self.pool.completed_count:
             return "IN_PROGRESS"
         else:
             return "IN_QUEUE"
 
     @property
     def percentage_done(self) -> float:
-        return len(self.completed_sequences) / len(self.request.queries)
+        return self.pool.completed_count / len(self.pool)
+
+    @property
+    def virtual_time(self) -> float:
+        return self.virtual_start + self.assigned_cells / self.weight
 
     def done(self) -> bool:
-        return len(self.completed_sequences) == len(self.request.queries)
+        return self.pool.completed_count == len(self.pool)
+
+    def has_unassigned_pairs(self) -> bool:
+        return self.pool.pending_count > 0
+
+    def pending_pairs_with_targets(self, targets: Iterable[SequenceId]) -> Iterator[PairIndex]:
+        """Yields the pending pairs whose target is one of the given sequences, target by target"""
+        for target in targets:
+            for unit in self.units.target_group(target):
+                if self.pool.is_pending(unit):
+                    yield unit
+
+    def pair_cost(self, unit: PairIndex) -> int:
+        combination = self.units[unit]
+        return self.sequences.length(combination.query) * self.sequences.length(combination.target)
+
+    def cost_order(self) -> CostOrder:
+        if self._cost_order is None:
+            self._cost_order = CostOrder(self.units, self.sequences.length)
+        return self._cost_order
+
+    def cost_index(self) -> CostIndex:
+        if self._cost_index is None:
+            self._cost_index = CostIndex(self.units, self.sequences.length)
+        return self._cost_index
+
+    def requeue(self, pairs: list[PairIndex]) -> None:
+        """Makes pairs of aborted work available for scheduling again"""
+        self.pool.requeue(pairs)
+        if self._cost_order is not None:
+            self._cost_order.give_back(self.pool, pairs, self.pair_cost)
+        if self._cost_index is not None:
+            self._cost_index.give_back(self.pool, pairs, self.pair_cost)
+        if self.partition_plan is not None and self.partition_plan.done() and self.partition_plan.exception() is None:
+            self.partition_plan.result().give_back(self.pool, pairs)
+
+    def add_result(self, unit: PairIndex, alignment: WorkAlignment) -> bool:
+        """
+        Records the result of a unit, the first result of a unit wins and duplicates are dropped.
+        The results of the tiles of a pair are merged into the best one once all of them arrived.
+        Returns whether the result was the first one of the unit.
+        """
+        if not self.pool.complete(unit):
+            return False
+
+        tile = self.units.tile_of(unit)
+        if tile is not None:
+            alignment = self._tile_merger.add(tile, alignment)
+            if alignment is None:
+                return True
+
+        pair = self.units.pair_of(unit)
+        if self.results.has(pair):
+            # Only when the job is restored from a log that was compacted while the result came in
+            return True
+        self._store_result(pair, alignment.query_alignment, alignment.length, alignment.score)
+        return True
+
+    def settled_units(self, start: PairIndex = 0, stop: PairIndex | None = None) -> Iterator[PairIndex]:
+        """
+        Yields the completed units (between start and stop) whose results are stored (or dropped for good), that is
+        all completed units but the tiles of pairs that still miss the results of other tiles
+        """
+        merging = self._tile_merger.pairs()
+        for unit in range(start, len(self.pool) if stop is None else min(stop, len(self.pool))):
+            if self.pool.is_completed(unit) and (not merging or self.units.pair_of(unit) not in merging):
+                yield unit
+
+    def restore(self, settled_units: Iterable[PairIndex], results: Iterable[tuple[PairIndex, Alignment]]) -> None:
+        """Restores completed units and the stored results of their pairs, as they were before a restart"""
+        for unit in settled_units:
+            self.pool.complete(unit)
+        for pair, alignment in results:
+            self._store_result(pair, alignment.alignment, alignment.length, alignment.score)
+
+    def _store_result(self, pair: PairIndex, alignment: str, length: int, score: int) -> None:
+        self._ranked_groups.clear()
+        if self.top_k is not None:
+            keep, evicted = self.top_k.offer(self.pairs[pair].query, pair, score)
+            if evicted is not None:
+                self.results.discard(evicted)
+            if not keep:
+                return
+
+        self.results.put(pair, alignment=alignment, length=length, score=score)
+
+    def reset_results(self) -> None:
+        self.pool.requeue_completed()
+        # Every pair is pending again, the order, the index and the plan are rebuilt when they are needed next
+        self._cost_order = None
+        self._cost_index = None
+        self.partition_plan = None
+        self.results.clear()
+        self._ranked_groups.clear()
+        self._tile_merger.clear()
+        if self.top_k is not None:
+            self.top_k.clear()
+
+    def result(self) -> JobResult:
+        return JobResult(
+            computation_time=self.computation_time,
+            alignments=[
+                JobResultCombination(combination=self.pairs[pair], alignments=[alignment])
+                for pair, alignment in self.results.items()
+            ],
+        )
 
-    @log_time
-    def missing_sequences(self) -> set[TargetQueryCombination]:
-        completed_set = self.completed_sequences.keys()
-        in_progress_set = self.sequences_in_progress
+    def ranked_results(self, group: int = 0, offset: int = 0) -> Iterator[tuple[int, int, JobResultCombination]]:
+        """
+        Yields the results grouped by query with the best score first, starting at the given position.
+        Every result comes with the position (group, offset) of the result that follows it.
+        Groups are sorted one at a time and the last RANKED_GROUPS_CACHED of them are kept, so paging through a group
+        sorts it only once.
+        """
+        for group in range(group, self.pairs.query_group_count()):
+            ranked = self._ranked_pairs_of_group(group)
+            for offset in range(offset, len(ranked)):
+                yield group, offset + 1, self._result_combination(ranked[offset])
+            offset = 0
 
-        missing = try_until_succeeds(lambda: self.request.queries - (completed_set | in_progress_set))
+    def _ranked_pairs_of_group(self, group: int) -> list[PairIndex]:
+        ranked = self._ranked_groups.get(group)
+        if ranked is None:
+            ranked = [pair for pair in self.pairs.query_group(group) if self.results.has(pair)]
+            ranked.sort(key=lambda pair: -self.results.score(pair))
+            if len(self._ranked_groups) >= RANKED_GROUPS_CACHED:
+                del self._ranked_groups[next(iter(self._ranked_groups))]
+            self._ranked_groups[group] = ranked
+        return ranked
 
-        return missing
+    def _result_combination(self, pair: PairIndex) -> JobResultCombination:
+        return JobResultCombination(combination=self.pairs[pair], alignments=[self.results.get(pair)])
@@ -0,0 +1,307 @@
+import mmap
+import tempfile
+from array import array
+from collections import OrderedDict
+from typing import BinaryIO, Iterator
+
+from master.api_models import Alignment
+from master.job_queue.pair_pool import PairIndex
+from master.settings import SETTINGS
+
+# Amount of pairs whose results are kept together in one segment
+SEGMENT_SIZE = 4096
+
+_MISSING = -1
+# Bytes of the per-pair arrays of a segment: scores, lengths and sizes (4 bytes each) and offsets (8 bytes)
+_ARRAY_BYTES = 20 * SEGMENT_SIZE
+
+
+class _ResultSegment:
+    """Results of SEGMENT_SIZE consecutive pairs, kept in flat arrays plus one arena for the alignment strings"""
+
+    def __init__(self):
+        self.scores = array("i", bytes(4 * SEGMENT_SIZE))
+        self.lengths = array("i", bytes(4 * SEGMENT_SIZE))
+        self.offsets = array("q", [_MISSING]) * SEGMENT_SIZE
+        self.sizes = array("i", bytes(4 * SEGMENT_SIZE))
+        self.arena = bytearray()
+        self.count = 0
+        # bytes of the arena that belong to discarded results
+        self.dead_bytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        return _ARRAY_BYTES + len(self.arena)
+
+    def put(self, slot: int, alignment: str, length: int, score: int) -> None:
+        encoded = alignment.encode()
+        if self.offsets[slot] == _MISSING:
+            self.count += 1
+        self.scores[slot] = score
+        self.lengths[slot] = length
+        self.offsets[slot] = len(self.arena)
+        self.sizes[slot] = len(encoded)
+        self.arena += encoded
+
+    def has(self, slot: int) -> bool:
+        return self.offsets[slot] != _MISSING
+
+    def score(self, slot: int) -> int:
+        return self.scores[slot]
+
+    def discard(self, slot: int) -> None:
+        if self.offsets[slot] == _MISSING:
+            return
+
+        self.offsets[slot] = _MISSING
+        self.count -= 1
+        self.dead_bytes += self.sizes[slot]
+        if self.dead_bytes > len(self.arena) // 2:
+            self._compact()
+
+    def _compact(self) -> None:
+        arena = bytearray()
+        for slot in range(SEGMENT_SIZE):
+            offset = self.offsets[slot]
+            if offset == _MISSING:
+                continue
+            self.offsets[slot] = len(arena)
+            arena += self.arena[offset : offset + self.sizes[slot]]
+        self.arena = arena
+        self.dead_bytes = 0
+
+    def get(self, slot: int) -> Alignment:
+        offset = self.offsets[slot]
+        return Alignment(
+            alignment=self.arena[offset : offset + self.sizes[slot]].decode(),
+            length=self.lengths[slot],
+            score=self.scores[slot],
+        )
+
+    def write_to(self, file: BinaryIO) -> int:
+        """Appends the segment to a file at a page boundary (so it can be mapped), returns where it starts"""
+        if self.dead_bytes:
+            self._compact()
+        file.seek(0, 2)
+        offset = -(-file.tell() // mmap.ALLOCATIONGRANULARITY) * mmap.ALLOCATIONGRANULARITY
+        file.truncate(offset)
+        file.seek(offset)
+        for part in (self.scores, self.lengths, self.sizes, self.offsets, self.arena):
+            file.write(part)
+        file.flush()
+        return offset
+
+
+class _SpilledSegment:
+    """
+    A segment that was written to the spill file of its store. It is read through a memory map of the file, which is
+    only opened while the segment is in use.
+    """
+
+    def __init__(self, file: BinaryIO, offset: int, nbytes: int, count: int):
+        self._file = file
+        self._offset = offset
+        self.nbytes = nbytes
+        self.count = count
+        self._map: mmap.mmap | None = None
+        self._scores = self._lengths = self._sizes = self._offsets = self._arena = None
+
+    @property
+    def mapped(self) -> bool:
+        return self._map is not None
+
+    def map(self) -> None:
+        self._map = mmap.mmap(self._file.fileno(), self.nbytes, access=mmap.ACCESS_READ, offset=self._offset)
+        view = memoryview(self._map)
+        self._scores = view[: 4 * SEGMENT_SIZE].cast("i")
+        self._lengths = view[4 * SEGMENT_SIZE : 8 * SEGMENT_SIZE].cast("i")
+        self._sizes = view[8 * SEGMENT_SIZE : 12 * SEGMENT_SIZE].cast("i")
+        self._offsets = view[12 * SEGMENT_SIZE : _ARRAY_BYTES].cast("q")
+        self._arena = view[_ARRAY_BYTES:]
+
+    def unmap(self) -> None:
+        # The map is closed once the views into it are gone
+        self._map = None
+        self._scores = self._lengths = self._sizes = self._offsets = self._arena = None
+
+    def has(self, slot: int) -> bool:
+        return self._offsets[slot] != _MISSING
+
+    def score(self, slot: int) -> int:
+        return self._scores[slot]
+
+    def get(self, slot: int) -> Alignment:
+        offset = self._offsets[slot]
+        return Alignment(
+            alignment=str(self._arena[offset : offset + self._sizes[slot]], "utf-8"),
+            length=self._lengths[slot],
+            score=self._scores[slot],
+        )
+
+    def load(self) -> _ResultSegment:
+        """Reads the segment back into memory, to change it"""
+        segment = _ResultSegment()
+        segment.scores = array("i", self._scores)
+        segment.lengths = array("i", self._lengths)
+        segment.sizes = array("i", self._sizes)
+        segment.offsets = array("q", self._offsets)
+        segment.arena = bytearray(self._arena)
+        segment.count = self.count
+        return segment
+
+
+class ResultMemory:
+    """
+    Keeps the segments of all result stores within a memory budget. Segments in memory and mapped spilled segments
+    are ordered by their last use. Once they take more than the budget, the least recently used ones are let go of:
+    a segment in memory is spilled to the file of its store, a spilled segment is unmapped again. So results that
+    are waiting to be fetched take disk space instead of memory, no matter how many there are.
+    """
+
+    def __init__(self, budget: int | None = None):
+        # In bytes, 0 keeps all segments in memory, None follows the settings
+        self._budget = budget
+        self._segments: OrderedDict[_ResultSegment | _SpilledSegment, tuple["ResultStore", int]] = OrderedDict()
+        self.used_bytes = 0
+
+    @property
+    def budget(self) -> int:
+        return SETTINGS.result_memory_budget_bytes if self._budget is None else self._budget
+
+    def touch(self, segment: _ResultSegment | _SpilledSegment, store: "ResultStore", segment_index: int) -> None:
+        if segment in self._segments:
+            self._segments.move_to_end(segment)
+            return
+
+        self._segments[segment] = (store, segment_index)
+        self.used_bytes += segment.nbytes
+        self._keep_budget()
+
+    def resize(self, segment: _ResultSegment, delta: int) -> None:
+        if segment in self._segments:
+            self.used_bytes += delta
+            self._keep_budget()
+
+    def forget(self, segment: _ResultSegment | _SpilledSegment) -> None:
+        if self._segments.pop(segment, None) is not None:
+            self.used_bytes -= segment.nbytes
+
+    def _keep_budget(self) -> None:
+        # The segment used last is never let go of, it is being worked with
+        while self.budget and self.used_bytes > self.budget and len(self._segments) > 1:
+            segment, (store, segment_index) = self._segments.popitem(last=False)
+            self.used_bytes -= segment.nbytes
+            if isinstance(segment, _ResultSegment):
+                store.spill(segment_index)
+            else:
+                segment.unmap()
+
+
+_memory = ResultMemory()
+
+
+class ResultStore:
+    """
+    Array-backed store of the result of every pair of a job, indexed by pair number.
+    Segments are only allocated once a result for one of their pairs arrives. Segments that are not in use are
+    spilled to a temporary file when the results of all jobs exceed their memory budget (see ResultMemory).
+    """
+
+    def __init__(self, memory: ResultMemory | None = None):
+        self._segments: dict[int, _ResultSegment | _SpilledSegment] = {}
+        self._memory = memory or _memory
+        # Created with the first spilled segment, segments that are read back leave their copy behind until the store
+        # is cleared
+        self._spill_file: BinaryIO | None = None
+
+    def __len__(self) -> int:
+        return sum(segment.count for segment in self._segments.values())
+
+    @property
+    def spilled_segment_count(self) -> int:
+        return sum(isinstance(segment, _SpilledSegment) for segment in self._segments.values())
+
+    def put(self, pair: PairIndex, alignment: str, length: int, score: int) -> None:
+        segment_index, slot = divmod(pair, SEGMENT_SIZE)
+        segment = self._in_memory(segment_index)
+        if segment is None:
+            segment = self._segments[segment_index] = _ResultSegment()
+            self._memory.touch(segment, self, segment_index)
+        size = len(segment.arena)
+        segment.put(slot, alignment, length, score)
+        self._memory.resize(segment, len(segment.arena) - size)
+
+    def discard(self, pair: PairIndex) -> None:
+        segment_index, slot = divmod(pair, SEGMENT_SIZE)
+        segment = self._in_memory(segment_index)
+        if segment is None:
+            return
+
+        size = len(segment.arena)
+        segment.discard(slot)
+        self._memory.resize(segment, len(segment.arena) - size)
+        if not segment.count:
+            self._memory.forget(segment)
+            del self._segments[segment_index]
+
+    def has(self, pair: PairIndex) -> bool:
+        segment_index, slot = divmod(pair, SEGMENT_SIZE)
+        segment = self._readable(segment_index)
+        return segment is not None and segment.has(slot)
+
+    def score(self, pair: PairIndex) -> int:
+        segment_index, slot = divmod(pair, SEGMENT_SIZE)
+        return self._readable(segment_index).score(slot)
+
+    def get(self, pair: PairIndex) -> Alignment | None:
+        segment_index, slot = divmod(pair, SEGMENT_SIZE)
+        segment = self._readable(segment_index)
+        if segment is None or not segment.has(slot):
+            return None
+        self._memory.touch(segment, self, segment_index)
+        return segment.get(slot)
+
+    def items(self) -> Iterator[tuple[PairIndex, Alignment]]:
+        """Yields the stored results ordered by pair number"""
+        for segment_index in sorted(self._segments):
+            for slot in range(SEGMENT_SIZE):
+                # Looked up for every result, the segment may be spilled or unmapped in between
+                segment = self._readable(segment_index)
+                if segment is None:
+                    break
+                if segment.has(slot):
+                    yield segment_index * SEGMENT_SIZE + slot, segment.get(slot)
+
+    def clear(self) -> None:
+        for segment in self._segments.values():
+            self._memory.forget(segment)
+        self._segments.clear()
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def spill(self, segment_index: int) -> None:
+        """Moves a segment to the spill file, called by the memory budget"""
+        segment = self._segments[segment_index]
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(dir=SETTINGS.result_spill_dir, prefix="results-")
+        offset = segment.write_to(self._spill_file)
+        self._segments[segment_index] = _SpilledSegment(self._spill_file, offset, segment.nbytes, segment.count)
+
+    def _readable(self, segment_index: int) -> _ResultSegment | _SpilledSegment | None:
+        segment = self._segments.get(segment_index)
+        if isinstance(segment, _SpilledSegment) and not segment.mapped:
+            segment.map()
+            self._memory.touch(segment, self, segment_index)
+        return segment
+
+    def _in_memory(self, segment_index: int) -> _ResultSegment | None:
+        """The segment to change, read back into memory if it was spilled"""
+        segment = self._readable(segment_index)
+        if isinstance(segment, _SpilledSegment):
+            loaded = segment.load()
+            self._memory.forget(segment)
+            segment.unmap()
+            segment = self._segments[segment_index] = loaded
+            self._memory.touch(segment, self, segment_index)
+        return segment
@@ -0,0 +1,312 @@
+import math
+import uuid
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Callable, Sequence
+
+from master.api_models import SequenceId, TargetQueryCombination, WorkAlignment
+from master.job_queue.pair_pool import PairIndex
+from master.job_queue.pair_space import PairSpace, QueryRow, Tile
+from master.sequence_store.sequence_store import SequenceHandles
+from master.settings import SETTINGS
+
+
+@dataclass(frozen=True)
+class _TileSpec:
+    id: SequenceId
+    start: int
+    end: int
+
+
+def tile_overlap(query_length: int, match_score: int, gap_penalty: int) -> int | None:
+    """
+    The longest stretch of a target a local alignment of the query can span. Every gap in the query costs the gap
+    penalty and the score of the alignment is positive, so there are less than match * len(query) / gap of them.
+    Returns None if that is unbounded.
+    """
+    match_score, gap_penalty = abs(match_score), abs(gap_penalty)
+    if gap_penalty == 0:
+        return None
+    return query_length + math.ceil(match_score * query_length / gap_penalty)
+
+
+def tile_target(target: SequenceId, target_length: int, overlap: int) -> list[_TileSpec] | None:
+    """
+    Splits a target into tiles that overlap by the longest span of an alignment, so every alignment lies completely
+    within at least one tile. Returns None if the target is not long enough to be split.
+    """
+    tile_length = max(SETTINGS.tile_target_length, 2 * overlap)
+    if not SETTINGS.tile_target_length or target_length <= tile_length:
+        return None
+
+    step = tile_length - overlap
+    specs: list[_TileSpec] = []
+    for number, start in enumerate(range(0, target_length - overlap + 1, step)):
+        end = min(start + tile_length, target_length)
+        # Tiles of different queries only share an id if they are the same tile at the same position
+        specs.append(_TileSpec(id=uuid.uuid5(target, f"{number}:{start}-{end}"), start=start, end=end))
+    return specs
+
+
+@dataclass
+class _TiledTarget:
+    """The pairs with a long target and the tiles of each of them, None if the target is not split for its query"""
+
+    pairs: Sequence[PairIndex]
+    specs: list[list[_TileSpec] | None]
+    # Unit of the second tile of every pair, and the unit after the tiles of the last pair as the last entry
+    unit_start: array
+
+    def position_of(self, pair: PairIndex) -> int | None:
+        position = bisect_left(self.pairs, pair)
+        if position == len(self.pairs) or self.pairs[position] != pair:
+            return None
+        return position
+
+
+class TiledPairs(PairSpace):
+    """
+    The units the pool of a job schedules when long targets are split into tiles: every pair with a long target is
+    replaced by one unit per tile (whose target is the id of the tile), all other pairs are a single unit.
+    Units are numbered like the pairs, the first tile of a pair taking its number, and the other tiles follow after
+    the last pair, target by target. So only the pairs of the long targets are looked at, never all pairs.
+    """
+
+    def __init__(self, pairs: PairSpace, tiled_targets: dict[SequenceId, _TiledTarget]):
+        self._pairs = pairs
+        self._tiled_targets = tiled_targets
+        self._tiled_in_order = list(tiled_targets.values())
+        # First unit of the other tiles of every tiled target, in the order of _tiled_targets
+        self._target_unit_start = array("q", [tiled.unit_start[0] for tiled in self._tiled_in_order])
+        # Tile id -> (target, tile number)
+        self._tile_index: dict[SequenceId, tuple[SequenceId, int]] = {}
+        for target, tiled in tiled_targets.items():
+            for specs in tiled.specs:
+                for number, spec in enumerate(specs or ()):
+                    self._tile_index[spec.id] = (target, number)
+        # Length of the shortest tiled target (where its last tile ends), pairs of targets at least as long are
+        # looked at one by one
+        self._min_tiled_length = min(specs[-1].end for tiled in self._tiled_in_order for specs in tiled.specs if specs)
+
+    def __len__(self) -> int:
+        return self._tiled_in_order[-1].unit_start[-1]
+
+    def __getitem__(self, unit: PairIndex) -> TargetQueryCombination:
+        if unit < len(self._pairs):
+            combination = self._pairs[unit]
+            tiles = self._tiles_of(unit, combination.target)
+            if tiles is None:
+                return combination
+            tiled, position = tiles
+            return TargetQueryCombination(query=combination.query, target=tiled.specs[position][0].id)
+
+        pair, specs, number = self._locate(unit)
+        return TargetQueryCombination(query=self._pairs[pair].query, target=specs[number].id)
+
+    def index_of(self, combination: TargetQueryCombination) -> PairIndex | None:
+        tile = self._tile_index.get(combination.target)
+        if tile is None:
+            pair = self._pairs.index_of(combination)
+            if pair is None or self._tiles_of(pair, combination.target) is not None:
+                return None
+            return pair
+
+        target, number = tile
+        pair = self._pairs.index_of(TargetQueryCombination(query=combination.query, target=target))
+        if pair is None:
+            return None
+        tiled = self._tiled_targets[target]
+        position = tiled.position_of(pair)
+        specs = tiled.specs[position]
+        # The tiles of a target depend on the length of the query
+        if specs is None or number >= len(specs) or specs[number].id != combination.target:
+            return None
+        return _unit_of(tiled, position, number)
+
+    def query_group_count(self) -> int:
+        return self._pairs.query_group_count()
+
+    def query_group(self, group: int) -> Sequence[PairIndex]:
+        units: list[PairIndex] = []
+        for pair in self._pairs.query_group(group):
+            units.append(pair)
+            tiles = self._tiles_of(pair)
+            if tiles is not None:
+                tiled, position = tiles
+                units.extend(range(tiled.unit_start[position], tiled.unit_start[position + 1]))
+        return units
+
+    def target_group(self, target: SequenceId) -> Sequence[PairIndex]:
+        tile = self._tile_index.get(target)
+        if tile is None:
+            tiled = self._tiled_targets.get(target)
+            if tiled is None:
+                return self._pairs.target_group(target)
+            # Pairs whose query is too long for the target to be split
+            return [pair for pair, specs in zip(tiled.pairs, tiled.specs) if specs is None]
+
+        tiled_target, number = tile
+        tiled = self._tiled_targets[tiled_target]
+        return [
+            _unit_of(tiled, position, number)
+            for position, specs in enumerate(tiled.specs)
+            if specs is not None and number < len(specs) and specs[number].id == target
+        ]
+
+    def targets(self) -> Sequence[SequenceId]:
+        return [target for target in self._pairs.targets() if self.target_group(target)] + list(self._tile_index)
+
+    def rows_by_target_length(self, length_of: Callable[[SequenceId], int]) -> list[QueryRow]:
+        # The rows of the pairs lose the pairs of long targets (the longest ones, so they come first), those of every
+        # query get a row of their own with their tiles
+        rows: list[QueryRow] = []
+        # Rows of a cross product share their ordering, it is only cut once: id of the ordering -> amount of long
+        # pairs, the rest of the ordering, the lengths of its targets and their sum
+        cut_orderings: dict[int, tuple[int, Sequence[PairIndex], Sequence[int], int]] = {}
+        for row in self._pairs.rows_by_target_length(length_of):
+            if id(row.pairs) not in cut_orderings:
+                long_count = bisect_right(row.target_lengths, -self._min_tiled_length, key=lambda length: -length)
+                short_lengths = row.target_lengths[long_count:]
+                cut_orderings[id(row.pairs)] = (long_count, row.pairs[long_count:], short_lengths, sum(short_lengths))
+            long_count, short_pairs, short_lengths, short_total = cut_orderings[id(row.pairs)]
+            if short_pairs:
+                rows.append(
+                    QueryRow(
+                        query_length=row.query_length,
+                        offset=row.offset,
+                        target_lengths=short_lengths,
+                        pairs=short_pairs,
+                        total_target_length=short_total,
+                    )
+                )
+
+            long_units: list[tuple[int, PairIndex]] = []
+            for length, pair in zip(row.target_lengths[:long_count], row.pairs[:long_count]):
+                tiles = self._tiles_of(row.offset + pair)
+                if tiles is None:
+                    long_units.append((length, row.offset + pair))
+                    continue
+                tiled, position = tiles
+                for number, spec in enumerate(tiled.specs[position]):
+                    long_units.append((length_of(spec.id), _unit_of(tiled, position, number)))
+            if long_units:
+                long_units.sort(reverse=True)
+                target_lengths = [length for length, _ in long_units]
+                rows.append(
+                    QueryRow(
+                        query_length=row.query_length,
+                        offset=0,
+                        target_lengths=target_lengths,
+                        pairs=[unit for _, unit in long_units],
+                        total_target_length=sum(target_lengths),
+                    )
+                )
+        return rows
+
+    def pair_of(self, unit: PairIndex) -> PairIndex:
+        return self._locate(unit)[0]
+
+    def tile_of(self, unit: PairIndex) -> Tile | None:
+        pair, specs, number = self._locate(unit)
+        if specs is None:
+            return None
+        return Tile(pair=pair, start=specs[number].start, count=len(specs))
+
+    def _tiles_of(self, pair: PairIndex, target: SequenceId | None = None) -> tuple[_TiledTarget, int] | None:
+        """The tiled target of a pair and the position of the pair in it, None if the pair is not split"""
+        tiled = self._tiled_targets.get(self._pairs[pair].target if target is None else target)
+        if tiled is None:
+            return None
+        position = tiled.position_of(pair)
+        if position is None or tiled.specs[position] is None:
+            return None
+        return tiled, position
+
+    def _locate(self, unit: PairIndex) -> tuple[PairIndex, list[_TileSpec] | None, int]:
+        """The pair of a unit, the tiles of the pair (None if it is not split) and the number of the tile"""
+        if unit < len(self._pairs):
+            tiles = self._tiles_of(unit)
+            return unit, None if tiles is None else tiles[0].specs[tiles[1]], 0
+
+        tiled = self._tiled_in_order[bisect_right(self._target_unit_start, unit) - 1]
+        position = bisect_right(tiled.unit_start, unit) - 1
+        return tiled.pairs[position], tiled.specs[position], unit - tiled.unit_start[position] + 1
+
+
+def _unit_of(tiled: _TiledTarget, position: int, number: int) -> PairIndex:
+    return tiled.pairs[position] if number == 0 else tiled.unit_start[position] + number - 1
+
+
+def tile_long_pairs(
+    pairs: PairSpace, sequences: SequenceHandles, match_score: int, gap_penalty: int
+) -> tuple[PairSpace, SequenceHandles]:
+    """
+    Returns the units to schedule for the pairs of a job, and the sequences extended by the tiles.
+    Only the pairs of the targets that are long enough to be tiled are looked at. If there are none, the pairs
+    themselves are the units.
+    """
+    if not SETTINGS.tile_target_length:
+        return pairs, sequences
+    long_targets = [target for target in pairs.targets() if sequences.length(target) > SETTINGS.tile_target_length]
+    if not long_targets:
+        return pairs, sequences
+
+    tiled_targets: dict[SequenceId, _TiledTarget] = {}
+    slices: dict[SequenceId, tuple[SequenceId, int, int]] = {}
+    next_unit = len(pairs)
+    for target in long_targets:
+        target_length = sequences.length(target)
+        group = pairs.target_group(target)
+        # Pairs with the same target and query length share their tiles
+        tiles_by_query_length: dict[int, list[_TileSpec] | None] = {}
+        specs: list[list[_TileSpec] | None] = []
+        unit_start = array("q", [next_unit])
+        for pair in group:
+            query_length = sequences.length(pairs[pair].query)
+            if query_length not in tiles_by_query_length:
+                overlap = tile_overlap(query_length, match_score, gap_penalty)
+                tiles_by_query_length[query_length] = (
+                    None if overlap is None else tile_target(target, target_length, overlap)
+                )
+            specs.append(tiles_by_query_length[query_length])
+            next_unit += len(specs[-1]) - 1 if specs[-1] else 0
+            unit_start.append(next_unit)
+
+        if any(tiles_by_query_length.values()):
+            tiled_targets[target] = _TiledTarget(group, specs, unit_start)
+            for tiles in filter(None, tiles_by_query_length.values()):
+                slices.update((spec.id, (target, spec.start, spec.end)) for spec in tiles)
+
+    if not tiled_targets:
+        return pairs, sequences
+    return TiledPairs(pairs, tiled_targets), sequences.with_slices(slices)
+
+
+class TileMerger:
+    """Collects the results of the tiles of a pair until all of them arrived, and keeps the best one"""
+
+    def __init__(self):
+        # pair -> (best alignment so far with coordinates in the whole target, tiles still missing)
+        self._partial: dict[PairIndex, tuple[WorkAlignment, int]] = {}
+
+    def add(self, tile: Tile, alignment: WorkAlignment) -> WorkAlignment | None:
+        """Returns the merged alignment once the result of the last tile of the pair is added"""
+        alignment = alignment.model_copy(update={"maxY": alignment.maxY + tile.start})
+        best, missing = self._partial.get(tile.pair, (None, tile.count))
+        # The same alignment can be found in two overlapping tiles, on a tie the one that ends first wins
+        if best is None or (alignment.score, -alignment.maxY, -alignment.maxX) > (best.score, -best.maxY, -best.maxX):
+            best = alignment
+
+        if missing == 1:
+            self._partial.pop(tile.pair, None)
+            return best
+        self._partial[tile.pair] = (best, missing - 1)
+        return None
+
+    def pairs(self) -> set[PairIndex]:
+        """The pairs with results of some but not all of their tiles"""
+        return set(self._partial)
+
+    def clear(self) -> None:
+        self._partial.clear()
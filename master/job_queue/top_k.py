@@ -0,0 +1,28 @@
+import heapq
+
+from master.api_models import SequenceId
+from master.job_queue.pair_pool import PairIndex
+
+
+class TopKTracker:
+    """Keeps the k best scoring pairs of every query in a bounded min-heap"""
+
+    def __init__(self, k: int):
+        self._k = k
+        self._heaps: dict[SequenceId, list[tuple[int, PairIndex]]] = {}
+
+    def offer(self, query: SequenceId, pair: PairIndex, score: int) -> tuple[bool, PairIndex | None]:
+        """Returns whether the pair made it into the top k and which pair it pushed out (if any)"""
+        heap = self._heaps.setdefault(query, [])
+        if len(heap) < self._k:
+            heapq.heappush(heap, (score, pair))
+            return True, None
+
+        if score <= heap[0][0]:
+            return False, None
+
+        _, evicted = heapq.heapreplace(heap, (score, pair))
+        return True, evicted
+
+    def clear(self) -> None:
+        self._heaps.clear()
@@ -2,14 +2,22 @@ import logging
 
 from fastapi import FastAPI
 
-from master.routers import worker_router, job_router
+from master.job_queue.job_queue import JobQueue
+from master.routers import worker_router, job_router, shard_router
+from master.settings import SETTINGS
 from master.trace_time import TraceTimeMiddleware
 
 logging.basicConfig(level=logging.INFO)
 uvicorn_access = logging.getLogger("uvicorn.access")
 uvicorn_access.disabled = True
 
+# The state of the master is owned by the event loop: it is only touched by the request handlers, which are all async
+# and therefore run on the loop, and by the timers they schedule on it (e.g. the expiry of workers)
 app = FastAPI(title="DLSA Master")
 app.add_middleware(TraceTimeMiddleware)
 app.include_router(job_router)
 app.include_router(worker_router)
+app.include_router(shard_router)
+
+if SETTINGS.state_dir:
+    JobQueue().recover(SETTINGS.state_dir)
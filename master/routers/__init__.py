@@ -1,2 +1,3 @@
 from .job import job_router
+from .shard import shard_router
 from .worker import worker_router
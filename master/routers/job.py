@@ -1,23 +1,40 @@
+import asyncio
+import itertools
 import logging
-from typing import Annotated, Any
-from uuid import UUID
+from typing import Annotated, Any, AsyncIterator
+from uuid import UUID, uuid4
 
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Query
+from fastapi.responses import StreamingResponse
 
 from master.api_models import (
     JobRequest,
     JobId,
+    FastaJobId,
+    SequenceId,
+    Sequence,
+    CrossProduct,
     JobStatus,
     JobResult,
-    JobResultCombination,
+    JobResultPage,
     MultipartJobRequest,
 )
-from master.job_queue.job_queue import JobQueue
+from master.job_queue.job_queue import JobQueue, JobNotFoundException
+from master.job_queue.queued_job import QueuedJob
 from master.settings import SETTINGS
+from master.utils.fasta import parse_fasta_upload
+from master.work_package.work_package_collector import WorkPackageCollector
 
 logger = logging.getLogger(__name__)
 job_router = APIRouter(tags=["external"])
 _job_queue = JobQueue()
+_work_collector = WorkPackageCollector()
+
+# amount of results that are serialized before control is handed back to the event loop
+RESULT_STREAM_BATCH_SIZE = 1000
+MAX_RESULT_PAGE_SIZE = 10_000
+# a comment is sent on idle status streams, so proxies and clients do not time out
+STATUS_STREAM_KEEP_ALIVE_IN_SECONDS = 15
 
 
 # submit a job to the job job_queue, returns a job id (for client)
@@ -44,6 +61,47 @@ async def submit_multipart_job(body: MultipartJobRequest, sequences: Annotated[l
     return JobId(id=job.id)
 
 
+# submit a job comparing every record of the query FASTA file with every record of the database FASTA file
+@job_router.post("/job/format/fasta")
+async def submit_fasta_job(
+    query: Annotated[UploadFile, File()],
+    database: Annotated[UploadFile, File()],
+    match_score: Annotated[int, Form()],
+    mismatch_penalty: Annotated[int, Form()],
+    gap_penalty: Annotated[int, Form()],
+    top_k: Annotated[int | None, Form(gt=0)] = None,
+    weight: Annotated[float, Form(gt=0)] = 1,
+) -> FastaJobId:
+    sequences: dict[SequenceId, Sequence] = {}
+    query_ids = await _read_fasta_records(query, sequences)
+    database_ids = await _read_fasta_records(database, sequences)
+
+    job_request = JobRequest(
+        sequences=sequences,
+        cross_product=CrossProduct(queries=[*query_ids.values()], targets=[*database_ids.values()]),
+        match_score=match_score,
+        mismatch_penalty=mismatch_penalty,
+        gap_penalty=gap_penalty,
+        top_k=top_k,
+        weight=weight,
+    )
+    job = _job_queue.add_job_to_queue(job_request)
+    return FastaJobId(id=job.id, query_ids=query_ids, database_ids=database_ids)
+
+
+async def _read_fasta_records(file: UploadFile, sequences: dict[SequenceId, Sequence]) -> dict[str, SequenceId]:
+    record_ids: dict[str, SequenceId] = {}
+    async for name, sequence in parse_fasta_upload(file):
+        if name in record_ids:
+            raise HTTPException(status_code=400, detail=f"Duplicate record {name} in {file.filename}")
+        record_ids[name] = uuid4()
+        sequences[record_ids[name]] = sequence
+
+    if not record_ids:
+        raise HTTPException(status_code=400, detail=f"No sequences found in {file.filename}")
+    return record_ids
+
+
 # returns the state of a job (for a client)
 @job_router.get("/job/{job_id}/status")
 async def get_job(job_id: UUID) -> JobStatus:
@@ -51,34 +109,120 @@ async def get_job(job_id: UUID) -> JobStatus:
     return JobStatus(state=job.state, progress=job.percentage_done)
 
 
+# server-sent events with the state of a job, an event is sent whenever results arrive, the stream ends once the job is
+# done (for a client)
+@job_router.get("/job/{job_id}/status/stream")
+async def stream_job_status(job_id: UUID) -> StreamingResponse:
+    _job_queue.get_job_by_id(job_id)
+    return StreamingResponse(
+        _status_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
 # returns the state of a job (for a client)
 @job_router.get("/job/{job_id}/result")
 async def get_job(job_id: UUID) -> JobResult:
-    job = _job_queue.get_job_by_id(job_id)
+    return _get_done_job(job_id).result()
+
+
+# streams the result as newline delimited JSON (one JobResultCombination per line), grouped by query with the best
+# score first, the computation time is sent in the X-Computation-Time header
+@job_router.get("/job/{job_id}/result/stream")
+async def stream_job_result(job_id: UUID) -> StreamingResponse:
+    job = _get_done_job(job_id)
+    return StreamingResponse(
+        _stream_results(job),
+        media_type="application/x-ndjson",
+        headers={"X-Computation-Time": str(job.computation_time)},
+    )
 
-    if job.state != "DONE":
-        raise HTTPException(status_code=404, detail="Job not done yet")
-    return JobResult(
+
+# returns the result page by page, in the same order as the stream
+@job_router.get("/job/{job_id}/result/page")
+async def get_job_result_page(
+    job_id: UUID, cursor: str | None = None, limit: Annotated[int, Query(gt=0, le=MAX_RESULT_PAGE_SIZE)] = 1000
+) -> JobResultPage:
+    job = _get_done_job(job_id)
+    group, offset = _parse_cursor(cursor)
+
+    page = list(itertools.islice(job.ranked_results(group, offset), limit + 1))
+    next_cursor = None
+    if len(page) > limit:
+        page.pop()
+        next_group, next_offset, _ = page[-1]
+        next_cursor = f"{next_group}:{next_offset}"
+
+    return JobResultPage(
+        alignments=[combination for _, _, combination in page],
         computation_time=job.computation_time,
-        alignments=[
-            JobResultCombination(
-                combination=combination,
-                alignments=alignments,
-            )
-            for combination, alignments in job.completed_sequences.items()
-        ]
+        next_cursor=next_cursor,
     )
 
 
+def _get_done_job(job_id: UUID) -> QueuedJob:
+    job = _job_queue.get_job_by_id(job_id)
+    if job.state != "DONE":
+        raise HTTPException(status_code=404, detail="Job not done yet")
+    return job
+
+
+def _parse_cursor(cursor: str | None) -> tuple[int, int]:
+    if cursor is None:
+        return 0, 0
+    try:
+        group, offset = (int(part) for part in cursor.split(":"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor {cursor}")
+    if group < 0 or offset < 0:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor {cursor}")
+    return group, offset
+
+
+async def _status_events(job_id: UUID) -> AsyncIterator[str]:
+    last_status = None
+    while True:
+        try:
+            job = _job_queue.get_job_by_id(job_id)
+        except JobNotFoundException:
+            return
+
+        version = job.progress.version
+        status = JobStatus(state=job.state, progress=job.percentage_done)
+        if status != last_status:
+            yield f"event: status\ndata: {status.model_dump_json()}\n\n"
+            last_status = status
+        if status.state == "DONE":
+            return
+
+        if not await job.progress.wait(version, STATUS_STREAM_KEEP_ALIVE_IN_SECONDS):
+            yield ": keep-alive\n\n"
+
+
+async def _stream_results(job: QueuedJob) -> AsyncIterator[str]:
+    lines: list[str] = []
+    for _, _, combination in job.ranked_results():
+        lines.append(combination.model_dump_json())
+        if len(lines) == RESULT_STREAM_BATCH_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+            await asyncio.sleep(0)
+
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
 @job_router.delete("/job/{job_id}")
 async def delete_job(job_id: UUID):
     """
     This is only intended for testing purposes.<br>
-    Job deletion might have unwanted side effects, as workers might still be working on the job and work packages are
-    not cleaned up.
+    Job deletion might have unwanted side effects, as workers might still be working on the job. Their work packages
+    are dropped, so results sent for them afterwards are rejected.
     """
     logger.info(f"Deleting job")
     if not SETTINGS.enable_job_deletion:
         raise HTTPException(status_code=403, detail="Job deletion is disabled")
 
     _job_queue.delete_job_by_id(job_id)
+    _work_collector.remove_packages_of_job(job_id)
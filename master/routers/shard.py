@@ -0,0 +1,47 @@
+import logging
+from uuid import UUID
+
+from fastapi import APIRouter
+
+from master.api_models import ShardStatus
+from master.job_queue.job_queue import JobQueue
+from master.settings import SETTINGS
+from master.work_package.work_package_collector import WorkPackageCollector
+from master.worker.worker_collector import WorkerCollector
+
+shard_router = APIRouter(tags=["shard"])
+
+logger = logging.getLogger(__name__)
+_worker_collector = WorkerCollector()
+_job_queue = JobQueue()
+_work_collector = WorkPackageCollector()
+
+
+# the load of this master, polled by the router that spreads jobs and workers over the shards
+@shard_router.get("/shard/status")
+async def get_shard_status() -> ShardStatus:
+    return ShardStatus(
+        shard_index=SETTINGS.shard_index,
+        shard_count=SETTINGS.shard_count,
+        pending_units=_job_queue.pending_unit_count(),
+        unfinished_jobs=len(_job_queue.unfinished_jobs()),
+        in_flight_packages=_work_collector.in_flight_count(),
+        workers=len(_worker_collector.workers),
+        idle_workers=len(_worker_collector.idle_workers()),
+    )
+
+
+# tells this shard that a worker got work from another shard, so it is not counted as idle capacity
+@shard_router.post("/shard/worker/{worker_id}/busy")
+async def mark_worker_busy(worker_id: UUID) -> None:
+    worker = _worker_collector.get_worker_by_id(worker_id)
+    if worker.status == "IDLE":
+        worker.status = "WORKING"
+
+
+# tells this shard that a worker asks for work again, it is idle unless it still has packages of this shard
+@shard_router.post("/shard/worker/{worker_id}/idle")
+async def mark_worker_idle(worker_id: UUID) -> None:
+    worker = _worker_collector.get_worker_by_id(worker_id)
+    if worker.status == "WORKING" and not _work_collector.packages_of_worker(worker_id):
+        worker.status = "IDLE"
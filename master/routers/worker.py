@@ -1,7 +1,7 @@
 import logging
 from uuid import UUID
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 
 from master.api_models import WorkerResources, WorkerId, WorkPackage, WorkResult, RawWorkPackage
 from master.job_queue.job_queue import JobQueue
@@ -18,7 +18,7 @@ _job_queue = JobQueue()
 
 # register a worker, returns a worker id (for worker)
 @worker_router.post("/worker/register")
-async def register_worker(resources: WorkerResources) -> WorkerId:
+async def register_worker(resources: WorkerResources, worker_id: UUID | None = None) -> WorkerId:
     """
     ## Worker registration process
     1. worker registers itself (Provides available resources. Is assigned a worker_id.)
@@ -30,8 +30,11 @@ async def register_worker(resources: WorkerResources) -> WorkerId:
     7. worker sends work-result to master
     8. worker exits
     9. master notices that the worker is gone (no update for n seconds)...
+
+    A router in front of several shards passes the id, so the worker has the same id with every shard. An id that is
+    already registered is rejected (409).
     """
-    worker_id = _worker_collector.register(resources)
+    worker_id = _worker_collector.register(resources, worker_id)
     return WorkerId(id=worker_id)
 
 
@@ -50,10 +53,11 @@ async def get_work_for_worker(worker_id: WorkerId) -> WorkPackage | None:
 
 
 # request work returns a piece of work (for worker, called in an interval while not working)
+# with wait > 0 the request is held open until work is available or the wait expires (long polling)
 @worker_router.post("/work/raw")
-async def get_raw_work_for_worker(worker_id: WorkerId) -> RawWorkPackage | None:
+async def get_raw_work_for_worker(worker_id: WorkerId, wait: float = Query(default=0, ge=0)) -> RawWorkPackage | None:
     _worker_collector.add_life_pulse(worker_id.id)
-    package = _work_collector.get_new_raw_work_package(worker_id)
+    package = await _work_collector.wait_for_new_raw_work_package(worker_id, wait)
     if not package:
         return None
     return package[0]
@@ -65,6 +69,7 @@ async def get_sequence_for_work(work_id: UUID, sequence_id: UUID, worker_id: UUI
     work_package = _work_collector.get_package_by_id(work_id)
     if sequence_id not in work_package.package.sequences:
         raise HTTPException(status_code=404, detail="Sequence not found")
+    _worker_collector.get_worker_by_id(worker_id).remember_sequences((sequence_id,))
     return work_package.package.sequences[sequence_id]
 
 
@@ -0,0 +1,125 @@
+import hashlib
+import logging
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+from master.api_models import Sequence, SequenceId
+from master.utils.singleton import Singleton
+
+logger = logging.getLogger(__name__)
+
+# Hex digest of the content of a sequence
+SequenceHandle = str
+
+
+def sequence_handle_of(sequence: Sequence) -> SequenceHandle:
+    return hashlib.blake2b(sequence.encode(), digest_size=16).hexdigest()
+
+
+@dataclass
+class _StoredSequence:
+    sequence: Sequence
+    references: int
+
+
+class SequenceStore(Singleton):
+    """
+    Master-wide, content-addressed store of sequences. Every sequence is held once, no matter how many jobs
+    reference it, and it is dropped as soon as the last job referencing it is gone.
+    """
+
+    def __init__(self):
+        self._sequences: dict[SequenceHandle, _StoredSequence] = {}
+        self._stored_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._sequences)
+
+    @property
+    def stored_bytes(self) -> int:
+        return self._stored_bytes
+
+    def add(self, sequence: Sequence) -> SequenceHandle:
+        handle = sequence_handle_of(sequence)
+        stored = self._sequences.get(handle)
+        if stored:
+            stored.references += 1
+        else:
+            self._sequences[handle] = _StoredSequence(sequence=sequence, references=1)
+            self._stored_bytes += len(sequence)
+        return handle
+
+    def get(self, handle: SequenceHandle) -> Sequence:
+        return self._sequences[handle].sequence
+
+    def release(self, handles: Iterable[SequenceHandle]) -> None:
+        for handle in handles:
+            stored = self._sequences.get(handle)
+            if not stored:
+                logger.warning(f"Releasing unknown sequence {handle}")
+                continue
+
+            stored.references -= 1
+            if stored.references == 0:
+                self._stored_bytes -= len(stored.sequence)
+                del self._sequences[handle]
+
+    def add_all(self, sequences: Mapping[SequenceId, Sequence]) -> "SequenceHandles":
+        return SequenceHandles(self, {sequence_id: self.add(sequence) for sequence_id, sequence in sequences.items()})
+
+
+class SequenceHandles(Mapping[SequenceId, Sequence]):
+    """
+    Read-only view that resolves the sequence ids of a job (or a part of it) through the sequence store.
+    Some ids may refer to a slice of another sequence (the tiles of long targets), those do not hold a reference.
+    """
+
+    def __init__(
+        self,
+        store: SequenceStore,
+        handles: dict[SequenceId, SequenceHandle],
+        slices: dict[SequenceId, tuple[int, int]] | None = None,
+    ):
+        self._store = store
+        self._handles = handles
+        self._slices = slices or {}
+
+    def __getitem__(self, sequence_id: SequenceId) -> Sequence:
+        sequence = self._store.get(self._handles[sequence_id])
+        bounds = self._slices.get(sequence_id)
+        return sequence if bounds is None else sequence[bounds[0] : bounds[1]]
+
+    def __contains__(self, sequence_id: object) -> bool:
+        return sequence_id in self._handles
+
+    def __iter__(self) -> Iterator[SequenceId]:
+        return iter(self._handles)
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+    def handle(self, sequence_id: SequenceId) -> SequenceHandle:
+        return self._handles[sequence_id]
+
+    def length(self, sequence_id: SequenceId) -> int:
+        bounds = self._slices.get(sequence_id)
+        if bounds is None:
+            return len(self[sequence_id])
+        return bounds[1] - bounds[0]
+
+    def subset(self, sequence_ids: Iterable[SequenceId]) -> "SequenceHandles":
+        handles = {sequence_id: self._handles[sequence_id] for sequence_id in sequence_ids}
+        slices = {sequence_id: self._slices[sequence_id] for sequence_id in handles if sequence_id in self._slices}
+        return SequenceHandles(self._store, handles, slices)
+
+    def with_slices(self, slices: Mapping[SequenceId, tuple[SequenceId, int, int]]) -> "SequenceHandles":
+        """Adds ids for slices (sequence id, start, end) of the sequences of these handles"""
+        handles = {**self._handles, **{slice_id: self._handles[of] for slice_id, (of, _, _) in slices.items()}}
+        bounds = {**self._slices, **{slice_id: (start, end) for slice_id, (_, start, end) in slices.items()}}
+        return SequenceHandles(self._store, handles, bounds)
+
+    def release(self) -> None:
+        """Drops the references of these handles, only the owner of the handles (the job) should call this"""
+        self._store.release(handle for sequence_id, handle in self._handles.items() if sequence_id not in self._slices)
+        self._handles = {}
@@ -5,14 +5,11 @@ from pydantic_settings import BaseSettings
 
 logger = logging.getLogger(__name__)
 
-SchedulerType = Literal["primitive", "proportional", "time"]
+SchedulerType = Literal["primitive", "proportional", "time", "lpt", "guided", "planned"]
 
 
 class _Settings(BaseSettings):
-    # Intervals for cleaning up the job queue and the workers
-    work_package_cleaning_interval: int = 5
-    worker_cleaning_interval: int = 5
-    # The amount of seconds a worker can go dark before it is considered dead
+    # The amount of seconds a worker can go dark before it is considered dead (its work is then handed to others)
     worker_timeout: int = 10
 
     # Scheduler settings
@@ -20,6 +17,36 @@ class _Settings(BaseSettings):
 
     # For the time scheduler (how many seconds of work should be assigned to a worker)
     work_package_time_split_in_seconds: int = 60 * 3
+    # For the guided scheduler (a package is this fraction of the worker's share of the remaining work of a job,
+    # but at least the given amount of seconds of work)
+    guided_fraction: float = 0.5
+    guided_min_package_seconds: float = 5
+    # For the planned scheduler (jobs are cut into chunks of about this many cells when they are submitted, packages
+    # are made of work_package_time_split_in_seconds worth of chunks)
+    plan_chunk_cells: int = 10**9
+    # Targets longer than this are split into overlapping tiles that are scheduled on their own (0 disables)
+    tile_target_length: int = 50_000
+    # Upper bound for how long an idle worker may wait for work in a single request
+    max_work_wait_in_seconds: int = 30
+    # Amount of sequences a worker keeps cached between work packages, pairs with cached targets are scheduled first
+    worker_sequence_cache_size: int = 64
+    # How many speculative copies of an unfinished package may run once a job has no pending pairs left (0 disables)
+    max_speculative_copies: int = 1
+    # Weight of the newest measurement in the moving average of the observed worker throughput
+    throughput_smoothing: float = 0.3
+    # A master can be one of several shards behind a router, every shard owns the jobs (and work packages) whose id
+    # modulo the amount of shards is its index
+    shard_index: int = 0
+    shard_count: int = 1
+    # Memory the results of all jobs may take, the least recently used results are spilled to disk beyond it (0 keeps
+    # all results in memory)
+    result_memory_budget_bytes: int = 2 * 1024 * 1024 * 1024
+    # Directory of the spilled results, the temporary directory of the system if None
+    result_spill_dir: str | None = None
+    # Directory of the log of the jobs and their results, so they survive a restart of the master (None disables)
+    state_dir: str | None = None
+    # The job log is compacted once it reaches twice its size after the last compaction, and at least this size
+    job_log_compaction_bytes: int = 64 * 1024 * 1024
     enable_job_deletion: bool = True
     verify_work: bool = False
 
@@ -0,0 +1,32 @@
+"""
+Runs the router in front of several shards of the master. Every shard is a normal master started with the settings
+SHARD_INDEX and SHARD_COUNT, e.g. for two shards:
+SHARD_INDEX=0 SHARD_COUNT=2 uvicorn master.main:app --port 8001
+SHARD_INDEX=1 SHARD_COUNT=2 uvicorn master.main:app --port 8002
+python -m master.sharding --shard http://localhost:8001 --shard http://localhost:8002 --port 8000
+"""
+
+import argparse
+import logging
+
+import httpx
+import uvicorn
+
+from .router import create_router_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Route clients and workers to the shards of the master")
+    parser.add_argument("--shard", action="append", required=True, help="URL of a shard, in the order of their index")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # Requests for work are held open by the shards (long polling), so there is no read timeout
+    shards = [httpx.AsyncClient(base_url=url, timeout=httpx.Timeout(10, read=None)) for url in args.shard]
+    uvicorn.run(create_router_app(shards), host=args.host, port=args.port, access_log=False)
+
+
+if __name__ == "__main__":
+    main()
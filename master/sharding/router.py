@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from uuid import UUID, uuid4
+
+import httpx
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from master.api_models import RawWorkPackage, ShardStatus, WorkerId, WorkerResources, WorkPackage
+from master.settings import SETTINGS
+from master.utils.notifier import Notifier
+from master.utils.shard import shard_of
+
+logger = logging.getLogger(__name__)
+
+# how often the router asks every shard for its load
+SHARD_STATUS_INTERVAL_IN_SECONDS = 1
+# headers that only concern a single connection, they are not passed on
+_HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "upgrade", "host", "content-length"}
+
+
+class ShardRouter:
+    """
+    Spreads the master over several shards (master processes). Every shard owns the jobs and work packages whose id
+    belongs to it (see master.utils.shard), so requests for them are forwarded by id, without any state in the
+    router. New jobs go to the shard with the least pending work.
+    Workers are registered with every shard under the same id and can pull work from any of them: a request for work
+    is passed to the shards with pending work, and the other shards are told that the worker is busy, so every shard
+    sees the idle capacity of the whole cluster.
+    A shard that cannot be reached does not hold up the others. The router remembers the registered workers, so a
+    shard that missed a registration (or lost the worker) gets it registered again once it answers with 404.
+    """
+
+    def __init__(self, shards: list[httpx.AsyncClient]):
+        self._shards = shards
+        self._status: list[ShardStatus | None] = [None] * len(shards)
+        # Notified when the load of a shard changed, workers waiting for work are woken up
+        self.work_available = Notifier()
+        self._next_job_shard = 0
+        # Requests that run next to the request handling, referenced until they are done
+        self._background: set[asyncio.Task] = set()
+        # Resources of the registered workers and when they were last seen (monotonic), to register them again
+        self._workers: dict[UUID, tuple[WorkerResources, float]] = {}
+        # Shards that were told that a worker is busy, told again once the worker asks for work
+        self._busy_at: dict[UUID, list[int]] = {}
+
+    async def refresh_status(self) -> None:
+        responses = await asyncio.gather(
+            *(shard.get("/shard/status") for shard in self._shards), return_exceptions=True
+        )
+        changed = False
+        for index, response in enumerate(responses):
+            if isinstance(response, Exception) or response.status_code != 200:
+                logger.warning(f"Shard {index} did not report its status: {response}")
+                status = None
+            else:
+                status = ShardStatus(**response.json())
+                if status.shard_index != index or status.shard_count != len(self._shards):
+                    logger.error(f"Shard {index} is configured as shard {status.shard_index} of {status.shard_count}")
+            changed |= status != self._status[index]
+            self._status[index] = status
+        if changed:
+            self.work_available.notify()
+
+    async def poll_status(self) -> None:
+        while True:
+            await self.refresh_status()
+            self._forget_expired_workers()
+            await asyncio.sleep(SHARD_STATUS_INTERVAL_IN_SECONDS)
+
+    def shard_for_new_job(self) -> int:
+        """The shard with the least pending units, shards without a known status take turns with the others"""
+        self._next_job_shard = (self._next_job_shard + 1) % len(self._shards)
+        order = [(self._next_job_shard + offset) % len(self._shards) for offset in range(len(self._shards))]
+        return min(order, key=lambda index: self._status[index].pending_units if self._status[index] else 0)
+
+    def in_background(self, coroutine) -> None:
+        task = asyncio.create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def shards_with_work(self) -> list[int]:
+        """
+        Shards that may have work: those with the most pending units first, then those with packages in flight (they
+        hand out speculative copies in the tail of a job), then those without a known status
+        """
+        pending = [index for index, status in enumerate(self._status) if status and status.pending_units]
+        in_flight = [
+            index
+            for index, status in enumerate(self._status)
+            if status and not status.pending_units and status.in_flight_packages
+        ]
+        unknown = [index for index, status in enumerate(self._status) if status is None]
+        return sorted(pending, key=lambda index: -self._status[index].pending_units) + in_flight + unknown
+
+    async def forward(self, shard: int, request: Request) -> Response:
+        """Passes the request on to a shard and streams the response back"""
+        client = self._shards[shard]
+        upstream = client.build_request(
+            request.method,
+            request.url.path,
+            params=request.query_params,
+            headers=_end_to_end_headers(request.headers),
+            content=await request.body(),
+        )
+        response = await client.send(upstream, stream=True)
+        return StreamingResponse(
+            response.aiter_raw(),
+            status_code=response.status_code,
+            headers=_end_to_end_headers(response.headers),
+            background=BackgroundTask(response.aclose),
+        )
+
+    async def fan_out(self, method: str, path: str, **kwargs) -> list[httpx.Response | None]:
+        """Sends the request to every shard, the response of a shard that could not be reached is None"""
+        responses = await asyncio.gather(
+            *(shard.request(method, path, **kwargs) for shard in self._shards), return_exceptions=True
+        )
+        for index, response in enumerate(responses):
+            if isinstance(response, httpx.HTTPError):
+                logger.warning(f"Could not reach shard {index}: {response}")
+            elif isinstance(response, BaseException):
+                raise response
+        return [response if isinstance(response, httpx.Response) else None for response in responses]
+
+    async def register_worker(self, resources: WorkerResources) -> UUID:
+        worker_id = uuid4()
+        responses = await self.fan_out(
+            "POST", "/worker/register", params={"worker_id": str(worker_id)}, json=resources.model_dump(mode="json")
+        )
+        # Shards that missed the registration get it once they answer for the worker with 404
+        if not any(response and response.status_code == 200 for response in responses):
+            raise HTTPException(status_code=502, detail="No shard accepted the worker")
+        self._workers[worker_id] = (resources, time.monotonic())
+        return worker_id
+
+    async def worker_pulse(self, worker_id: UUID) -> None:
+        responses = await self.fan_out("POST", "/worker/pulse", json={"id": str(worker_id)})
+        if not any(responses):
+            raise HTTPException(status_code=502, detail="No shard could be reached")
+        if worker_id in self._workers:
+            self._workers[worker_id] = (self._workers[worker_id][0], time.monotonic())
+        for shard, response in enumerate(responses):
+            if response is None or response.status_code == 200:
+                continue
+            if response.status_code != 404:
+                raise HTTPException(status_code=response.status_code, detail=response.json().get("detail"))
+            # A worker that is unknown to the router as well has to register again
+            try:
+                registered = await self._register_again(shard, worker_id)
+            except httpx.HTTPError as e:
+                # Tried again with the next pulse
+                logger.warning(f"Could not reach shard {shard}: {e}")
+                continue
+            if not registered:
+                raise HTTPException(status_code=404, detail=response.json().get("detail"))
+
+    async def pull_work(self, path: str, worker_id: WorkerId, wait: float) -> dict | None:
+        """Asks the shards with pending work for a package, waiting up to wait seconds for work to appear"""
+        deadline = time.monotonic() + min(wait, SETTINGS.max_work_wait_in_seconds)
+        # The worker asks for work, so it is done with the packages it got before
+        for shard in self._busy_at.pop(worker_id.id, []):
+            self.in_background(_post_quietly(self._shards[shard], f"/shard/worker/{worker_id.id}/idle"))
+        while True:
+            version = self.work_available.version
+            for shard in self.shards_with_work():
+                try:
+                    response = await self._shards[shard].post(path, json=worker_id.model_dump(mode="json"))
+                    if response.status_code == 404 and await self._register_again(shard, worker_id.id):
+                        response = await self._shards[shard].post(path, json=worker_id.model_dump(mode="json"))
+                except httpx.HTTPError as e:
+                    logger.warning(f"Could not reach shard {shard}: {e}")
+                    continue
+                if response.status_code != 200:
+                    raise HTTPException(status_code=response.status_code, detail=response.json().get("detail"))
+                package = response.json()
+                if package:
+                    self._mark_busy_elsewhere(shard, worker_id.id)
+                    return package
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not await self.work_available.wait(version, remaining):
+                return None
+
+    def _mark_busy_elsewhere(self, shard: int, worker_id: UUID) -> None:
+        others = [index for index in range(len(self._shards)) if index != shard]
+        self._busy_at[worker_id] = others
+        for index in others:
+            self.in_background(_post_quietly(self._shards[index], f"/shard/worker/{worker_id}/busy"))
+
+    async def _register_again(self, shard: int, worker_id: UUID) -> bool:
+        """Registers a worker known to the router with a shard that lost it (or never got it)"""
+        if worker_id not in self._workers:
+            return False
+
+        resources, _ = self._workers[worker_id]
+        response = await self._shards[shard].post(
+            "/worker/register", params={"worker_id": str(worker_id)}, json=resources.model_dump(mode="json")
+        )
+        # 409: the worker was registered again in the meantime
+        if response.status_code not in (200, 409):
+            logger.warning(f"Shard {shard} did not take worker {worker_id} back: {response.status_code}")
+            return False
+        logger.info(f"Registered worker {worker_id} with shard {shard} again")
+        return True
+
+    def _forget_expired_workers(self) -> None:
+        expired = time.monotonic() - SETTINGS.worker_timeout
+        for worker_id in [worker_id for worker_id, (_, seen) in self._workers.items() if seen < expired]:
+            del self._workers[worker_id]
+            self._busy_at.pop(worker_id, None)
+
+
+def create_router_app(shards: list[httpx.AsyncClient]) -> FastAPI:
+    router = ShardRouter(shards)
+
+    @asynccontextmanager
+    async def lifespan(_: FastAPI):
+        status_polling = asyncio.create_task(router.poll_status())
+        yield
+        status_polling.cancel()
+        for shard in shards:
+            await shard.aclose()
+
+    app = FastAPI(title="DLSA Master Router", lifespan=lifespan)
+    app.state.shard_router = router
+
+    @app.post("/job/format/{job_format}")
+    async def submit_job(request: Request) -> Response:
+        shard = router.shard_for_new_job()
+        response = await router.forward(shard, request)
+        # The job shows up in the status of the shard with the next poll, waiting workers should not wait for it
+        router.in_background(router.refresh_status())
+        return response
+
+    @app.api_route("/job/{job_id}", methods=["GET", "DELETE"])
+    @app.api_route("/job/{job_id}/{rest:path}", methods=["GET", "POST", "DELETE"])
+    async def job_request(job_id: UUID, request: Request) -> Response:
+        return await router.forward(shard_of(job_id, len(shards)), request)
+
+    @app.post("/worker/register")
+    async def register_worker(resources: WorkerResources) -> WorkerId:
+        return WorkerId(id=await router.register_worker(resources))
+
+    @app.post("/worker/pulse")
+    async def worker_pulse(worker_id: WorkerId) -> None:
+        await router.worker_pulse(worker_id.id)
+
+    @app.post("/work/")
+    async def get_work_for_worker(worker_id: WorkerId) -> WorkPackage | None:
+        return await router.pull_work("/work/", worker_id, 0)
+
+    @app.post("/work/raw")
+    async def get_raw_work_for_worker(
+        worker_id: WorkerId, wait: float = Query(default=0, ge=0)
+    ) -> RawWorkPackage | None:
+        return await router.pull_work("/work/raw", worker_id, wait)
+
+    @app.api_route("/work/{work_id}/{rest:path}", methods=["GET", "POST"])
+    async def work_request(work_id: UUID, request: Request) -> Response:
+        return await router.forward(shard_of(work_id, len(shards)), request)
+
+    return app
+
+
+def _end_to_end_headers(headers: httpx.Headers | dict) -> dict[str, str]:
+    return {name: value for name, value in headers.items() if name.lower() not in _HOP_BY_HOP_HEADERS}
+
+
+async def _post_quietly(client: httpx.AsyncClient, path: str) -> None:
+    try:
+        await client.post(path)
+    except httpx.HTTPError as e:
+        logger.warning(f"Could not reach shard {client.base_url}: {e}")
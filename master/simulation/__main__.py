@@ -0,0 +1,121 @@
+"""
+Compares the schedulers of the master on a simulated cluster, e.g.:
+python -m master.simulation --scheduler proportional time lpt --workers 32 --cups lognormal:1e8:0.5 --failure-rate 0.01
+"""
+
+import argparse
+import dataclasses
+import json
+import logging
+import typing
+
+from master.settings import SchedulerType
+from .distribution import Distribution
+from .simulator import JobMix, Simulation, SimulationConfig
+
+_COLUMNS = [
+    ("scheduler", "{}"),
+    ("completed_jobs", "{}"),
+    ("makespan", "{:.1f}"),
+    ("utilisation", "{:.1%}"),
+    ("efficiency", "{:.1%}"),
+    ("job_latency_p50", "{:.1f}"),
+    ("job_latency_p95", "{:.1f}"),
+    ("job_latency_max", "{:.1f}"),
+    ("scheduler_cpu_seconds", "{:.3f}"),
+    ("work_packages", "{}"),
+    ("failures", "{}"),
+]
+
+
+def main():
+    config, mix = SimulationConfig(), JobMix()
+    parser = argparse.ArgumentParser(description="Simulate the master with the given schedulers on a virtual clock")
+    parser.add_argument(
+        "--scheduler",
+        nargs="+",
+        default=list(typing.get_args(SchedulerType)),
+        choices=typing.get_args(SchedulerType),
+        help="Schedulers to compare (default: all)",
+    )
+    parser.add_argument("--workers", type=int, default=config.workers)
+    parser.add_argument(
+        "--cups",
+        type=Distribution.parse,
+        default=config.cups,
+        help="Processing power of the workers in cells per second, e.g. uniform:5e7:2e8",
+    )
+    parser.add_argument(
+        "--benchmark-error",
+        type=float,
+        default=config.benchmark_error,
+        help="Spread of the reported benchmark around the true processing power",
+    )
+    parser.add_argument(
+        "--latency",
+        type=Distribution.parse,
+        default=config.latency,
+        help="Seconds one message between worker and master takes",
+    )
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=config.failure_rate,
+        help="Probability that a worker crashes during a work package",
+    )
+    parser.add_argument(
+        "--rejoin-after",
+        type=float,
+        default=config.rejoin_after,
+        help="Seconds until a crashed worker registers again (negative for never)",
+    )
+    parser.add_argument("--jobs", type=int, default=mix.jobs)
+    parser.add_argument("--arrival-interval", type=Distribution.parse, default=mix.arrival_interval)
+    parser.add_argument("--queries", type=Distribution.parse, default=mix.queries, help="Queries per job")
+    parser.add_argument("--targets", type=Distribution.parse, default=mix.targets, help="Targets per job")
+    parser.add_argument("--query-length", type=Distribution.parse, default=mix.query_length)
+    parser.add_argument("--target-length", type=Distribution.parse, default=mix.target_length)
+    parser.add_argument("--weight", type=Distribution.parse, default=mix.weight, help="Fair share weight of a job")
+    parser.add_argument("--seed", type=int, default=config.seed)
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON lines")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    mix = JobMix(
+        jobs=args.jobs,
+        arrival_interval=args.arrival_interval,
+        queries=args.queries,
+        targets=args.targets,
+        query_length=args.query_length,
+        target_length=args.target_length,
+        weight=args.weight,
+    )
+
+    rows = []
+    for scheduler in args.scheduler:
+        config = SimulationConfig(
+            scheduler=scheduler,
+            workers=args.workers,
+            cups=args.cups,
+            benchmark_error=args.benchmark_error,
+            latency=args.latency,
+            failure_rate=args.failure_rate,
+            rejoin_after=args.rejoin_after if args.rejoin_after >= 0 else None,
+            jobs=mix,
+            seed=args.seed,
+        )
+        report = Simulation(config).run()
+        if args.json:
+            print(json.dumps(dataclasses.asdict(report)))
+        else:
+            rows.append([template.format(getattr(report, name)) for name, template in _COLUMNS])
+
+    if rows:
+        header = [name for name, _ in _COLUMNS]
+        widths = [max(len(cell) for cell in column) for column in zip(header, *rows)]
+        for row in [header, *rows]:
+            print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
+
+
+if __name__ == "__main__":
+    main()
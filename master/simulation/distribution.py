@@ -0,0 +1,48 @@
+import random
+from dataclasses import dataclass
+from typing import Literal
+
+DistributionKind = Literal["fixed", "uniform", "lognormal", "exponential"]
+
+
+@dataclass(frozen=True)
+class Distribution:
+    """
+    A random quantity of a simulation, written as "kind:parameters":
+    fixed:VALUE, uniform:LOW:HIGH, lognormal:MEDIAN:SIGMA or exponential:MEAN. A plain number is fixed.
+    """
+
+    kind: DistributionKind
+    parameters: tuple[float, ...]
+
+    @staticmethod
+    def parse(spec: str) -> "Distribution":
+        kind, *parameters = spec.split(":")
+        try:
+            if not parameters:
+                return Distribution("fixed", (float(kind),))
+            values = tuple(float(parameter) for parameter in parameters)
+        except ValueError:
+            raise ValueError(f"Invalid distribution {spec!r}") from None
+
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2, "exponential": 1}
+        if expected.get(kind) != len(values):
+            raise ValueError(f"Invalid distribution {spec!r}")
+        return Distribution(kind, values)
+
+    def sample(self, rng: random.Random) -> float:
+        match self.kind:
+            case "fixed":
+                return self.parameters[0]
+            case "uniform":
+                return rng.uniform(*self.parameters)
+            case "lognormal":
+                median, sigma = self.parameters
+                return median * rng.lognormvariate(0, sigma)
+            case "exponential":
+                return rng.expovariate(1 / self.parameters[0]) if self.parameters[0] else 0
+            case _:
+                raise NotImplementedError()
+
+    def __str__(self) -> str:
+        return ":".join([self.kind, *(f"{parameter:g}" for parameter in self.parameters)])
@@ -0,0 +1,353 @@
+import heapq
+import itertools
+import logging
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable
+
+from master.api_models import (
+    CrossProduct,
+    JobRequest,
+    WorkAlignment,
+    WorkerId,
+    WorkerResources,
+    WorkResult,
+    WorkResultCombination,
+    RawWorkPackage,
+)
+from master.job_queue.job_queue import JobQueue
+from master.job_queue.queued_job import QueuedJob
+from master.settings import SETTINGS, SchedulerType
+from master.utils.time import set_clock
+from master.work_package._scheduler.work_scheduler import WorkPackageScheduler
+from master.work_package.work_package_collector import WorkPackageCollector, WorkPackageNotFoundException
+from master.worker.worker_collector import WorkerCollector, WorkerNotFoundException
+from .distribution import Distribution
+
+logger = logging.getLogger(__name__)
+
+# The alignment every simulated worker reports, its content does not matter to the scheduling
+_ALIGNMENT = WorkAlignment(query_alignment="", target_alignment="", length=0, score=0, maxX=0, maxY=0)
+
+
+@dataclass
+class JobMix:
+    """The jobs submitted during a simulation, every job is the cross product of its queries and targets"""
+
+    jobs: int = 3
+    # Seconds between the submission of two jobs, the first job is submitted at 0
+    arrival_interval: Distribution = Distribution("fixed", (0,))
+    queries: Distribution = Distribution("fixed", (20,))
+    targets: Distribution = Distribution("fixed", (200,))
+    query_length: Distribution = Distribution("uniform", (100, 1000))
+    target_length: Distribution = Distribution("lognormal", (3000, 1))
+    weight: Distribution = Distribution("fixed", (1,))
+
+
+@dataclass
+class SimulationConfig:
+    scheduler: SchedulerType = "proportional"
+    workers: int = 8
+    # True processing power of the workers in cells per second
+    cups: Distribution = Distribution("lognormal", (1e8, 0.5))
+    # Spread of the self-reported benchmark around the true processing power (sigma of a lognormal factor)
+    benchmark_error: float = 0
+    # Seconds a message between worker and master takes, every package costs two of them
+    latency: Distribution = Distribution("fixed", (0.05,))
+    # Probability that a worker crashes while it computes a package, and the seconds until it registers again
+    # (None for never)
+    failure_rate: float = 0
+    rejoin_after: float | None = 30
+    # Seconds a worker that got no work waits for new work before it asks again, like the long poll of the real worker
+    work_wait: float = 5
+    jobs: JobMix = field(default_factory=JobMix)
+    seed: int = 0
+    # The simulation gives up after this many simulated seconds
+    time_limit: float = 7 * 24 * 3600
+
+
+@dataclass
+class SimulationReport:
+    scheduler: str
+    jobs: int
+    completed_jobs: int
+    # Seconds from the first submission until the last job is done
+    makespan: float
+    # Fraction of the worker time spent computing, including work that was thrown away
+    utilisation: float
+    # Cells the jobs required relative to what the workers could have computed during the makespan
+    efficiency: float
+    # Seconds from submission until a job is done
+    job_latency_p50: float
+    job_latency_p95: float
+    job_latency_max: float
+    # CPU time the master spent on scheduling, collecting results and expiring workers
+    scheduler_cpu_seconds: float
+    work_packages: int
+    failures: int
+
+
+@dataclass
+class SimulatedWorker:
+    cups: float
+    benchmark: float
+    worker_id: uuid.UUID | None = None
+    # Bumped whenever the worker crashes or registers again, events of an earlier life are dropped
+    life: int = 0
+    # (start, end) of every computation, including the ones that were cut short by a crash
+    computations: list[tuple[float, float]] = field(default_factory=list)
+    # Version of the work notifier the worker waits to change, None if it is not waiting, and the number of its wait
+    waiting_for: int | None = None
+    waits: int = 0
+
+    def busy_seconds(self, until: float) -> float:
+        return sum(max(0.0, min(end, until) - start) for start, end in self.computations)
+
+
+class Simulation:
+    """
+    Discrete-event simulation of a master and its workers on a virtual clock. The real job queue, worker collector,
+    work package collector and scheduler handle the requests of the simulated workers, only the computation of the
+    alignments and the network are simulated.
+    The simulation takes over the singletons of the master, so it must not run in the process of a live master.
+    """
+
+    def __init__(self, config: SimulationConfig):
+        self._config = config
+        self._rng = random.Random(config.seed)
+        self._now = 0.0
+        # (time, sequence number, action)
+        self._events: list[tuple[float, int, Callable[[], None]]] = []
+        self._event_numbers = itertools.count()
+
+        self._workers: list[SimulatedWorker] = []
+        # Submitted jobs with the time of their submission, and the time every finished job was done
+        self._jobs: list[tuple[QueuedJob, float]] = []
+        self._done_at: dict[uuid.UUID, float] = {}
+        self._jobs_left = config.jobs.jobs
+
+        self._scheduler_cpu_seconds = 0.0
+        self._work_packages = 0
+        self._failures = 0
+
+    def run(self) -> SimulationReport:
+        scheduler_type = SETTINGS.scheduler_type
+        set_clock(lambda: self._now)
+        try:
+            SETTINGS.scheduler_type = self._config.scheduler
+            WorkPackageScheduler._created_scheduler = None
+            self._job_queue = JobQueue()
+            self._worker_collector = WorkerCollector()
+            self._collector = WorkPackageCollector()
+            return self._run()
+        finally:
+            set_clock(None)
+            SETTINGS.scheduler_type = scheduler_type
+            WorkPackageScheduler._created_scheduler = None
+            # The results of all jobs share one memory budget, the jobs of a run are gone once it is over
+            for job, _ in self._jobs:
+                job.results.clear()
+
+    def _run(self) -> SimulationReport:
+        mix = self._config.jobs
+        arrival = 0.0
+        for _ in range(mix.jobs):
+            self._at(arrival, self._submit_job)
+            arrival += mix.arrival_interval.sample(self._rng)
+
+        for _ in range(self._config.workers):
+            cups = self._config.cups.sample(self._rng)
+            benchmark = cups * self._rng.lognormvariate(0, self._config.benchmark_error)
+            worker = SimulatedWorker(cups=cups, benchmark=benchmark)
+            self._workers.append(worker)
+            self._at(0, lambda worker=worker: self._join(worker))
+
+        while self._events and not self._finished():
+            moment = self._events[0][0]
+            expiry = self._worker_collector.next_expiry()
+            if expiry is not None and expiry / 1000 <= moment:
+                # Workers that went dark expire at their deadline, like with the timer of a live master
+                self._now = max(self._now, expiry / 1000)
+                self._master(self._worker_collector.expire_workers)
+            else:
+                self._now, _, action = heapq.heappop(self._events)
+                action()
+            if self._now > self._config.time_limit:
+                logger.warning(f"Simulation stopped at the time limit of {self._config.time_limit} seconds")
+                break
+            self._wake_waiting_workers()
+
+        return self._report()
+
+    def _at(self, moment: float, action: Callable[[], None]) -> None:
+        heapq.heappush(self._events, (moment, next(self._event_numbers), action))
+
+    def _in_life(self, worker: SimulatedWorker, delay: float, action: Callable[[], None]) -> None:
+        """Runs the action after the delay, unless the worker crashed or registered again in the meantime"""
+        life = worker.life
+        self._at(self._now + delay, lambda: action() if worker.life == life else None)
+
+    def _master(self, action: Callable, *args):
+        """Runs a request on the master and accounts the CPU time it took"""
+        start = time.process_time()
+        try:
+            return action(*args)
+        finally:
+            self._scheduler_cpu_seconds += time.process_time() - start
+
+    def _finished(self) -> bool:
+        return not self._jobs_left and len(self._done_at) == len(self._jobs)
+
+    def _submit_job(self) -> None:
+        mix = self._config.jobs
+        # Only the lengths of the sequences matter to the scheduling
+        queries = {
+            uuid.uuid4(): "A" * _positive(mix.query_length, self._rng) for _ in range(_positive(mix.queries, self._rng))
+        }
+        targets = {
+            uuid.uuid4(): "A" * _positive(mix.target_length, self._rng)
+            for _ in range(_positive(mix.targets, self._rng))
+        }
+        request = JobRequest(
+            sequences={**queries, **targets},
+            cross_product=CrossProduct(queries=list(queries), targets=list(targets)),
+            match_score=2,
+            mismatch_penalty=1,
+            gap_penalty=1,
+            weight=mix.weight.sample(self._rng),
+        )
+        job = self._master(self._job_queue.add_job_to_queue, request)
+        self._jobs.append((job, self._now))
+        self._jobs_left -= 1
+
+    def _join(self, worker: SimulatedWorker) -> None:
+        resources = WorkerResources(benchmark_result=max(1, round(worker.benchmark)))
+        worker.worker_id = self._master(self._worker_collector.register, resources)
+        worker.life += 1
+        worker.waiting_for = None
+        self._in_life(worker, 0, lambda: self._request_work(worker))
+        self._in_life(worker, SETTINGS.worker_timeout / 2, lambda: self._pulse(worker))
+
+    def _pulse(self, worker: SimulatedWorker) -> None:
+        try:
+            self._master(self._worker_collector.add_life_pulse, worker.worker_id)
+        except WorkerNotFoundException:
+            # Removed by the master, the worker registers again with its next request
+            pass
+        self._in_life(worker, SETTINGS.worker_timeout / 2, lambda: self._pulse(worker))
+
+    def _request_work(self, worker: SimulatedWorker) -> None:
+        version = self._job_queue.work_available.version
+        try:
+            new = self._master(self._collector.get_new_raw_work_package, WorkerId(id=worker.worker_id))
+        except WorkerNotFoundException:
+            self._join(worker)
+            return
+
+        if new is None:
+            # Plans are built in the background in wall clock time, they are ready before virtual time passes
+            self._master(self._wait_for_partition_plans)
+            worker.waiting_for = version
+            worker.waits += 1
+            wait = worker.waits
+            self._in_life(worker, self._config.work_wait, lambda: self._stop_waiting(worker, wait))
+            return
+
+        package, scheduled_package = new
+        self._work_packages += 1
+        job = scheduled_package.package.job
+        compute_seconds = sum(job.pair_cost(unit) for unit in scheduled_package.package.pairs) / worker.cups
+        duration = compute_seconds + self._config.latency.sample(self._rng) + self._config.latency.sample(self._rng)
+
+        if self._rng.random() < self._config.failure_rate:
+            crash_after = self._rng.uniform(0, duration)
+            worker.computations.append((self._now, self._now + min(compute_seconds, crash_after)))
+            self._in_life(worker, crash_after, lambda: self._crash(worker))
+            return
+
+        worker.computations.append((self._now, self._now + compute_seconds))
+        self._in_life(worker, duration, lambda: self._deliver(worker, package))
+
+    def _stop_waiting(self, worker: SimulatedWorker, wait: int) -> None:
+        if worker.waiting_for is not None and worker.waits == wait:
+            worker.waiting_for = None
+            self._request_work(worker)
+
+    def _wake_waiting_workers(self) -> None:
+        version = self._job_queue.work_available.version
+        for worker in self._workers:
+            if worker.waiting_for is not None and worker.waiting_for != version:
+                worker.waiting_for = None
+                self._in_life(worker, 0, lambda worker=worker: self._request_work(worker))
+
+    def _wait_for_partition_plans(self) -> None:
+        for job, _ in self._jobs:
+            if job.partition_plan is not None:
+                # Waits for the plan, a plan that failed is reported by the scheduler
+                job.partition_plan.exception()
+
+    def _deliver(self, worker: SimulatedWorker, package: RawWorkPackage) -> None:
+        result = WorkResult(
+            alignments=[
+                WorkResultCombination(combination=combination, alignment=_ALIGNMENT) for combination in package.queries
+            ]
+        )
+        try:
+            self._master(self._collector.update_work_result, package.id, result)
+        except WorkPackageNotFoundException:
+            # The package was aborted in the meantime
+            pass
+
+        for job, _ in self._jobs:
+            if job.id not in self._done_at and job.done():
+                self._done_at[job.id] = self._now
+        self._request_work(worker)
+
+    def _crash(self, worker: SimulatedWorker) -> None:
+        self._failures += 1
+        worker.life += 1
+        worker.waiting_for = None
+        if self._config.rejoin_after is not None:
+            self._in_life(worker, self._config.rejoin_after, lambda: self._join(worker))
+
+    def _report(self) -> SimulationReport:
+        latencies = sorted(
+            self._done_at[job.id] - submitted for job, submitted in self._jobs if job.id in self._done_at
+        )
+        makespan = max(self._done_at.values(), default=self._now)
+        capacity = sum(worker.cups for worker in self._workers) * makespan
+        required_cells = sum(
+            job.sequences.length(job.pairs[pair].query) * job.sequences.length(job.pairs[pair].target)
+            for job, _ in self._jobs
+            for pair in range(len(job.pairs))
+        )
+        return SimulationReport(
+            scheduler=self._config.scheduler,
+            jobs=self._config.jobs.jobs,
+            completed_jobs=len(latencies),
+            makespan=makespan,
+            utilisation=sum(worker.busy_seconds(makespan) for worker in self._workers) / (len(self._workers) * makespan)
+            if makespan
+            else 0,
+            efficiency=required_cells / capacity if capacity else 0,
+            job_latency_p50=_percentile(latencies, 0.5),
+            job_latency_p95=_percentile(latencies, 0.95),
+            job_latency_max=latencies[-1] if latencies else math.nan,
+            scheduler_cpu_seconds=self._scheduler_cpu_seconds,
+            work_packages=self._work_packages,
+            failures=self._failures,
+        )
+
+
+def _positive(distribution: Distribution, rng: random.Random) -> int:
+    return max(1, round(distribution.sample(rng)))
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return math.nan
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
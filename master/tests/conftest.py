@@ -28,9 +28,9 @@ def f_job(f_client: TestClient) -> JobId:
 
 @pytest.fixture()
 def f_client() -> TestClient:
-    client = TestClient(app)
-    yield client
-    client.close()
+    # Entering the client keeps one event loop running between requests, so the timers of the master can fire
+    with TestClient(app) as client:
+        yield client
 
 
 @pytest.fixture()
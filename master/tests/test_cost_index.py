@@ -0,0 +1,62 @@
+import random
+from uuid import uuid4
+
+from master.job_queue.cost_index import CostIndex
+from master.job_queue.pair_pool import PairPool
+from master.job_queue.pair_space import CrossProductPairs
+
+
+def test_budgets_are_filled_with_the_pairs_that_fit_best():
+    lengths = {}
+    queries = [uuid4() for _ in range(2)]
+    targets = [uuid4() for _ in range(4)]
+    lengths.update(zip(queries, [1, 3]))
+    lengths.update(zip(targets, [2, 5, 7, 10]))
+    pairs = CrossProductPairs(queries, targets)
+    pool = PairPool(len(pairs))
+    index = CostIndex(pairs, lengths.__getitem__)
+
+    def cost(pair: int) -> int:
+        return lengths[pairs[pair].query] * lengths[pairs[pair].target]
+
+    # Costs: 2, 5, 6, 7, 10, 15, 21, 30
+    assert [cost(pair) for pair in index.take(pool, 20)] == [15, 5]
+    # Only the pairs down to the cheapest one taken are ranked so far
+    assert len(index._pairs) == 7
+    assert [cost(pair) for pair in index.take(pool, 20)] == [10, 7, 2]
+    # Nothing fits, the cheapest pair is taken anyway unless that is not wanted
+    assert index.take(pool, 1, at_least_one=False) == []
+    assert [cost(pair) for pair in index.take(pool, 1)] == [6]
+
+    # Aborted pairs fit in again, pairs completed in the meantime are skipped
+    aborted = [pair for pair in range(len(pairs)) if cost(pair) in (5, 10)]
+    pool.requeue(aborted)
+    index.give_back(pool, aborted, cost)
+    pool.complete(aborted[1])
+    assert [cost(pair) for pair in index.take(pool, 100)] == [30, 21, 5]
+    assert pool.pending_count == 0
+    assert index.take(pool, 100) == []
+
+
+def test_budgets_are_filled_like_a_best_fit_over_all_pairs():
+    rng = random.Random(3)
+    queries = [uuid4() for _ in range(5)]
+    targets = [uuid4() for _ in range(30)]
+    lengths = {sequence_id: rng.randint(1, 40) for sequence_id in queries + targets}
+    pairs = CrossProductPairs(queries, targets)
+    pool = PairPool(len(pairs))
+    index = CostIndex(pairs, lengths.__getitem__)
+
+    def cost(pair: int) -> int:
+        return lengths[pairs[pair].query] * lengths[pairs[pair].target]
+
+    while pool.pending_count:
+        budget = rng.randint(1, 3000)
+        pending = sorted((cost(pair) for pair in range(len(pairs)) if pool.is_pending(pair)), reverse=True)
+        expected: list[int] = []
+        remaining = budget
+        for pair_cost in pending:
+            if pair_cost <= remaining:
+                expected.append(pair_cost)
+                remaining -= pair_cost
+        assert [cost(pair) for pair in index.take(pool, budget, at_least_one=False)] == expected
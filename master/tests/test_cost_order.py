@@ -0,0 +1,53 @@
+from uuid import uuid4
+
+from master.api_models import TargetQueryCombination
+from master.job_queue.cost_order import CostOrder
+from master.job_queue.pair_pool import PairPool
+from master.job_queue.pair_space import CrossProductPairs, ExplicitPairs
+
+
+def test_cross_product_pairs_are_handed_out_most_expensive_first():
+    lengths = {}
+    queries = [uuid4() for _ in range(3)]
+    targets = [uuid4() for _ in range(4)]
+    lengths.update(zip(queries, [2, 7, 3]))
+    lengths.update(zip(targets, [5, 1, 11, 4]))
+    pairs = CrossProductPairs(queries, targets)
+    pool = PairPool(len(pairs))
+    order = CostOrder(pairs, lengths.__getitem__)
+
+    def cost(pair: int) -> int:
+        return lengths[pairs[pair].query] * lengths[pairs[pair].target]
+
+    assert order.pending_cells == sum(lengths[query] for query in queries) * sum(lengths[t] for t in targets)
+
+    # A single pair that is more expensive than the budget is still taken
+    first = order.take(pool, 1)
+    assert [cost(pair) for pair in first] == [77]
+
+    taken = order.take(pool, 100)
+    assert [cost(pair) for pair in taken] == [35, 33, 28]
+    assert order.pending_cells == 252 - 77 - 96
+
+    # Aborted pairs come back in cost order, pairs completed in the meantime are skipped
+    pool.requeue(first + taken)
+    order.give_back(pool, first + taken, cost)
+    pool.complete(first[0])
+    rest = order.take(pool, 1000)
+    expected = sorted((cost(pair) for pair in range(len(pairs)) if pair != first[0]), reverse=True)
+    assert [cost(pair) for pair in rest] == expected
+    assert order.pending_cells == 0
+    assert pool.pending_count == 0
+
+
+def test_explicit_pairs_are_ordered_by_cost():
+    sequences = {uuid4(): "A" * length for length in (4, 2, 9)}
+    ids = list(sequences)
+    combinations = [
+        TargetQueryCombination(query=ids[0], target=ids[1]),
+        TargetQueryCombination(query=ids[1], target=ids[2]),
+        TargetQueryCombination(query=ids[0], target=ids[2]),
+    ]
+    order = CostOrder(ExplicitPairs(combinations), lambda sequence_id: len(sequences[sequence_id]))
+
+    assert order.take(PairPool(3), 100) == [2, 1, 0]
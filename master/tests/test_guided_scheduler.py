@@ -0,0 +1,27 @@
+from uuid import uuid4
+
+from master.api_models import CrossProduct, WorkerResources
+from master.job_queue.job_queue import JobQueue
+from master.settings import SETTINGS
+from master.tests.data import JOB_REQUEST
+from master.work_package._scheduler.guided_work_scheduler import _get_guided_pairs
+from master.worker.worker import Worker
+
+
+def test_guided_packages_shrink_towards_the_end_of_a_job():
+    queue = JobQueue()
+    job = queue.add_job_to_queue(JOB_REQUEST.model_copy(update={"queries": [], "cross_product": CrossProduct()}))
+    resources = WorkerResources(ram_mb=100, cpu_resources=1, gpu_resources=0, benchmark_result=10)
+    workers = [Worker(worker_id=uuid4(), resources=resources, last_seen_alive=0, status="IDLE") for _ in range(2)]
+
+    sizes = []
+    while job.has_unassigned_pairs():
+        sizes.append(sum(job.pair_cost(pair) for pair in _get_guided_pairs(job, workers[0], workers)))
+
+    assert sum(sizes) == 100 * 16
+    assert sizes[0] == SETTINGS.guided_fraction * 1600 / 2
+    assert sizes == sorted(sizes, reverse=True)
+    # Every pair costs 16 cells, the packages at the end are filled up to the minimum size as far as pairs fit
+    assert sizes[-2] + 16 > SETTINGS.guided_min_package_seconds * 10
+
+    queue.delete_job_by_id(job.id)
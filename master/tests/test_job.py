@@ -1,8 +1,11 @@
+from uuid import uuid4
+
 from fastapi.testclient import TestClient
 
-from master.api_models import JobId, JobStatus
+from master.api_models import JobId, JobStatus, FastaJobId
 from master.main import app
 from master.tests.data import JOB_REQUEST
+from master.utils.fasta import FastaParser
 
 client = TestClient(app)
 
@@ -25,3 +28,55 @@ def test_json_endpoint():
 
     response = client.delete(f"/job/{job_id.id}")
     assert response.status_code == 200
+
+
+def test_fasta_endpoint():
+    response = client.post(
+        "/job/format/fasta",
+        data={"match_score": 2, "mismatch_penalty": 1, "gap_penalty": 1},
+        files={
+            "query": ("query.fasta", b">query1 description\nACGT\nACGT\n>query2\nTTTT\n"),
+            "database": ("database.fasta", b">target1\r\nGGCC\r\n\r\n>target2\nACGA"),
+        },
+    )
+
+    assert response.status_code == 200
+    job_id = FastaJobId(**response.json())
+    assert [*job_id.query_ids] == ["query1", "query2"]
+    assert [*job_id.database_ids] == ["target1", "target2"]
+
+    response = client.get(f"/job/{job_id.id}/status")
+    assert JobStatus(**response.json()).state == "IN_QUEUE"
+
+    response = client.delete(f"/job/{job_id.id}")
+    assert response.status_code == 200
+
+
+def test_fasta_parser_handles_arbitrary_chunks():
+    text = ">a x\nAC\nGT\n>b\nTT\n"
+    for chunk_size in range(1, len(text) + 1):
+        parser = FastaParser()
+        records = []
+        for start in range(0, len(text), chunk_size):
+            records += parser.feed(text[start : start + chunk_size])
+        records += parser.finish()
+        assert records == [("a", "ACGT"), ("b", "TT")]
+
+
+def test_cross_product_job():
+    request = JOB_REQUEST.model_dump(mode="json", exclude={"queries"})
+    request["cross_product"] = {"queries": [str(next(iter(JOB_REQUEST.sequences)))]}
+    response = client.post("/job/format/json", json=request)
+
+    assert response.status_code == 200
+    job_id = JobId(**response.json())
+
+    response = client.get(f"/job/{job_id.id}/status")
+    assert JobStatus(**response.json()).state == "IN_QUEUE"
+
+    response = client.delete(f"/job/{job_id.id}")
+    assert response.status_code == 200
+
+    request["cross_product"] = {"queries": [str(uuid4())]}
+    response = client.post("/job/format/json", json=request)
+    assert response.status_code == 400
@@ -0,0 +1,140 @@
+import asyncio
+from uuid import uuid4
+
+from master.api_models import CrossProduct, JobRequest, WorkAlignment
+from master.job_queue import job_log
+from master.job_queue.job_log import JOB_LOG_FILE
+from master.job_queue.job_queue import JobQueue
+from master.settings import SETTINGS
+from master.tests.data import JOB_REQUEST
+
+
+def _alignment(score: int) -> WorkAlignment:
+    return WorkAlignment(
+        query_alignment="AC" * score, target_alignment="A-" * score, length=score, score=score, maxX=0, maxY=0
+    )
+
+
+def _restart(queue: JobQueue, monkeypatch) -> None:
+    """Forgets the jobs of the queue like a restart of the master does"""
+    for job in queue.unfinished_jobs():
+        job.sequences.release()
+    queue._log.close()
+    monkeypatch.setattr(queue, "_jobs", {})
+    monkeypatch.setattr(queue, "_log", None)
+
+
+def _state(queue: JobQueue) -> dict:
+    return {
+        job.id: (
+            [unit for unit in range(len(job.pool)) if job.pool.is_completed(unit)],
+            [combination for _, _, combination in job.ranked_results()],
+        )
+        for job in queue.unfinished_jobs()
+    }
+
+
+def _request() -> JobRequest:
+    """Three queries against four targets, the first of them is tiled"""
+    queries, targets = [uuid4() for _ in range(3)], [uuid4() for _ in range(4)]
+    sequences = {sequence_id: "ACGT" for sequence_id in queries + targets[1:]}
+    sequences[targets[0]] = "A" * 100
+    return JobRequest(
+        match_score=1,
+        mismatch_penalty=1,
+        gap_penalty=1,
+        sequences=sequences,
+        cross_product=CrossProduct(queries=queries, targets=targets),
+        top_k=2,
+    )
+
+
+def test_jobs_and_results_survive_a_restart(monkeypatch, tmp_path):
+    monkeypatch.setattr(SETTINGS, "tile_target_length", 40)
+    queue = JobQueue()
+    monkeypatch.setattr(queue, "_jobs", {})
+    monkeypatch.setattr(queue, "_log", None)
+    queue.recover(str(tmp_path))
+
+    job = queue.add_job_to_queue(_request())
+    deleted = queue.add_job_to_queue(JOB_REQUEST)
+    queue.delete_job_by_id(deleted.id)
+
+    # Everything of the first query, and some of the tiles of the long target for the second one
+    units = [*job.units.query_group(0), *job.units.query_group(1)[:2]]
+    results = [(unit, _alignment(unit % 5 + 1)) for unit in units]
+    for unit, alignment in results:
+        assert job.add_result(unit, alignment)
+    queue.record_results(job, results)
+    before = _state(queue)
+
+    _restart(queue, monkeypatch)
+    with open(tmp_path / JOB_LOG_FILE, "ab") as log:
+        log.write(b"\x01\x02\x03")
+    queue.recover(str(tmp_path))
+    assert _state(queue) == before
+
+    # After a compaction the tiles of a pair that is not complete yet are computed again
+    queue._log.compact(queue.unfinished_jobs())
+    _restart(queue, monkeypatch)
+    queue.recover(str(tmp_path))
+    completed, ranked = before[job.id]
+    assert _state(queue) == {job.id: ([unit for unit in completed if unit in job.units.query_group(0)], ranked)}
+
+    job = queue.get_job_by_id(job.id)
+    results = [(unit, _alignment(1)) for unit in range(len(job.units)) if job.pool.is_pending(unit)]
+    for unit, alignment in results:
+        job.add_result(unit, alignment)
+    job.computation_time = 1234.0
+    queue.record_results(job, results)
+
+    _restart(queue, monkeypatch)
+    queue.recover(str(tmp_path))
+    job = queue.get_job_by_id(job.id)
+    assert job.done() and job.computation_time == 1234.0
+    queue.delete_job_by_id(job.id)
+    queue._log.close()
+
+
+def test_changes_during_a_compaction_survive_a_restart(monkeypatch, tmp_path):
+    monkeypatch.setattr(SETTINGS, "tile_target_length", 40)
+    # Every record makes the log due for a compaction, which takes many steps
+    monkeypatch.setattr(SETTINGS, "job_log_compaction_bytes", 1)
+    monkeypatch.setattr(job_log, "_STORED_RESULTS_PER_RECORD", 1)
+    monkeypatch.setattr(job_log, "_UNITS_PER_STEP", 2)
+    queue = JobQueue()
+    monkeypatch.setattr(queue, "_jobs", {})
+    monkeypatch.setattr(queue, "_log", None)
+    queue.recover(str(tmp_path))
+
+    async def run() -> None:
+        jobs = [queue.add_job_to_queue(_request()) for _ in range(2)]
+        # The last unit is left out, so the jobs stay unfinished
+        for index, unit in enumerate(range(len(jobs[0].units) - 1)):
+            for job in queue.unfinished_jobs():
+                # Scores differ, so which results are in the top k does not depend on the order they arrive in
+                if job.add_result(unit, _alignment(unit + 1)):
+                    queue.record_results(job, [(unit, _alignment(unit + 1))])
+            if index == 8:
+                queue.delete_job_by_id(jobs[1].id)
+                jobs.append(queue.add_job_to_queue(_request()))
+            await asyncio.sleep(0)
+            assert queue._compaction is not None
+        await queue._compaction
+
+    asyncio.run(run())
+    before = _state(queue)
+    assert len(before) == 2
+    _restart(queue, monkeypatch)
+    queue.recover(str(tmp_path))
+    # Tiles of pairs that were merged during the compaction are computed again, nothing else is lost
+    for job_id, (completed, _) in before.items():
+        job = queue.get_job_by_id(job_id)
+        for unit in completed:
+            if job.pool.is_pending(unit):
+                assert job.units.tile_of(unit) is not None
+                job.add_result(unit, _alignment(unit + 1))
+    assert _state(queue) == before
+    for job in queue.unfinished_jobs():
+        queue.delete_job_by_id(job.id)
+    queue._log.close()
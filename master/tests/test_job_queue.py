@@ -0,0 +1,65 @@
+from uuid import uuid4
+
+from master.api_models import CrossProduct, JobRequest, WorkAlignment
+from master.job_queue.job_queue import JobQueue
+from master.tests.data import JOB_REQUEST
+
+
+def test_jobs_are_served_by_weighted_fair_share():
+    queue = JobQueue()
+    big = queue.add_job_to_queue(JOB_REQUEST)
+    small = queue.add_job_to_queue(JOB_REQUEST.model_copy(update={"weight": 4}))
+
+    # On a tie the oldest job goes first
+    assert queue.next_job_to_schedule() is big
+    big.assigned_cells = 100
+    assert queue.next_job_to_schedule() is small
+
+    # The small job may receive four times the work before it is the big job's turn again
+    small.assigned_cells = 300
+    assert queue.next_job_to_schedule() is small
+    small.assigned_cells = 500
+    assert queue.next_job_to_schedule() is big
+
+    # A new job starts at the current virtual time instead of claiming all the work done so far
+    late = queue.add_job_to_queue(JOB_REQUEST)
+    assert late.virtual_start == big.virtual_time
+
+    for job in (big, small, late):
+        queue.delete_job_by_id(job.id)
+
+
+def test_ranked_results_follow_new_and_reset_results(monkeypatch):
+    queue = JobQueue()
+    monkeypatch.setattr(queue, "_jobs", {})
+    monkeypatch.setattr(queue, "_log", None)
+    query, targets = uuid4(), [uuid4() for _ in range(3)]
+    request = JobRequest(
+        match_score=1,
+        mismatch_penalty=1,
+        gap_penalty=1,
+        sequences={sequence_id: "ACGT" for sequence_id in [query, *targets]},
+        cross_product=CrossProduct(queries=[query], targets=targets),
+    )
+    job = queue.add_job_to_queue(request)
+
+    def add_result(unit: int, score: int) -> None:
+        alignment = WorkAlignment(query_alignment="A", target_alignment="A", length=1, score=score, maxX=0, maxY=0)
+        job.add_result(unit, alignment)
+
+    def scores(offset: int = 0) -> list[int]:
+        return [combination.alignments[0].score for _, _, combination in job.ranked_results(0, offset)]
+
+    add_result(0, 1)
+    add_result(1, 3)
+    assert scores() == [3, 1]
+    # The next page continues in the order of the first one
+    assert scores(1) == [1]
+    assert list(job._ranked_groups) == [0]
+
+    add_result(2, 2)
+    assert scores() == [3, 2, 1]
+    job.reset_results()
+    assert scores() == []
+
+    queue.delete_job_by_id(job.id)
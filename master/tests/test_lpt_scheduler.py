@@ -0,0 +1,54 @@
+import math
+from uuid import uuid4
+
+from master.api_models import CrossProduct, JobRequest, WorkerResources
+from master.job_queue.job_queue import JobQueue
+from master.work_package._scheduler.lpt_work_scheduler import _get_longest_pairs
+from master.worker.worker import Worker
+
+
+def test_lpt_packages_take_the_longest_pairs_by_the_share_of_the_worker():
+    queue = JobQueue()
+    queries, targets = [uuid4() for _ in range(2)], [uuid4() for _ in range(12)]
+    sequences = {query: "A" * length for query, length in zip(queries, [2, 3])}
+    sequences.update({target: "C" * length for target, length in zip(targets, range(1, 13))})
+    job = queue.add_job_to_queue(
+        JobRequest(
+            match_score=1,
+            mismatch_penalty=1,
+            gap_penalty=1,
+            sequences=sequences,
+            cross_product=CrossProduct(queries=queries, targets=targets),
+        )
+    )
+
+    def worker(benchmark_result: int) -> Worker:
+        resources = WorkerResources(ram_mb=100, cpu_resources=1, gpu_resources=0, benchmark_result=benchmark_result)
+        return Worker(worker_id=uuid4(), resources=resources, last_seen_alive=0, status="IDLE")
+
+    fast, slow = worker(30), worker(10)
+    pending = set(range(len(job.pool)))
+    sizes = []
+    while job.has_unassigned_pairs():
+        for requesting in (fast, slow):
+            pending_cells = sum(job.pair_cost(pair) for pair in pending)
+            pairs = _get_longest_pairs(job, requesting, [fast, slow])
+            if not pairs:
+                continue
+            pending -= set(pairs)
+            costs = [job.pair_cost(pair) for pair in pairs]
+            sizes.append(sum(costs))
+
+            # Largest first: no pair that is left costs more than a pair of the package
+            assert all(job.pair_cost(pair) <= min(costs) for pair in pending)
+            # The package is the share of the worker of the pending cells, unless a single pair is larger
+            bound = math.ceil(pending_cells * requesting.cups / (fast.cups + slow.cups))
+            assert sum(costs) <= bound or len(costs) == 1
+            if pending:
+                assert sum(costs) + max(job.pair_cost(pair) for pair in pending) > bound
+
+    assert not pending
+    # The fast worker starts with about three quarters of the job, the slow one with a share of the rest
+    assert sum(sizes) == (2 + 3) * sum(range(1, 13))
+    assert sizes[0] > 0.7 * sum(sizes) and sizes[1] < sizes[0] / 3
+    queue.delete_job_by_id(job.id)
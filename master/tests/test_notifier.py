@@ -0,0 +1,20 @@
+import asyncio
+
+from master.utils.notifier import Notifier
+
+
+def test_waiters_are_woken_up_and_do_not_miss_notifications():
+    async def scenario():
+        notifier = Notifier()
+        version = notifier.version
+
+        waiter = asyncio.create_task(notifier.wait(version, timeout=5))
+        await asyncio.sleep(0)
+        notifier.notify()
+        assert await waiter
+
+        # A notification that happened before the wait is not missed
+        assert await notifier.wait(version, timeout=5)
+        assert not await notifier.wait(notifier.version, timeout=0.01)
+
+    asyncio.run(scenario())
@@ -0,0 +1,58 @@
+from master.job_queue.pair_pool import PairPool
+
+
+def test_take_complete_and_requeue():
+    pool = PairPool(5)
+
+    taken = pool.take(3)
+    assert taken == [0, 1, 2]
+    assert (pool.pending_count, pool.in_progress_count, pool.completed_count) == (2, 3, 0)
+
+    assert pool.complete(1)
+    assert not pool.complete(1)
+
+    # Only the unfinished pairs of the aborted package are re-queued, and they are handed out first
+    pool.requeue(taken)
+    assert (pool.pending_count, pool.in_progress_count, pool.completed_count) == (4, 0, 1)
+    assert list(pool.iter_pending()) == [2, 0, 3, 4]
+    assert pool.take(10) == [2, 0, 3, 4]
+    assert pool.pending_count == 0
+
+
+def test_take_specific_pairs_is_not_handed_out_twice():
+    pool = PairPool(4)
+
+    assert pool.take_pairs([3, 1]) == [3, 1]
+    assert pool.take_pairs([1]) == []
+    assert pool.take(4) == [0, 2]
+
+    for pair in range(4):
+        pool.complete(pair)
+    pool.requeue_completed()
+    assert pool.pending_count == 4
+    assert sorted(pool.take(4)) == [0, 1, 2, 3]
+
+
+def test_held_pairs_are_only_requeued_by_their_last_holder():
+    pool = PairPool(3)
+    original = pool.take(3)
+    assert pool.hold(original) == [0, 1, 2]
+
+    pool.complete(0)
+    pool.requeue(original)
+    assert (pool.pending_count, pool.in_progress_count, pool.completed_count) == (0, 2, 1)
+
+    pool.requeue(original)
+    assert (pool.pending_count, pool.in_progress_count, pool.completed_count) == (2, 0, 1)
+
+
+def test_snapshot_only_leaves_out_completed_pairs():
+    pool = PairPool(4)
+    pool.take(2)
+    pool.complete(1)
+    snapshot = pool.snapshot()
+
+    assert sorted(snapshot.take(4)) == [0, 2, 3]
+    assert (snapshot.pending_count, snapshot.completed_count) == (0, 1)
+    # The pool itself is not changed by the snapshot
+    assert (pool.pending_count, pool.in_progress_count, pool.completed_count) == (2, 1, 1)
@@ -0,0 +1,35 @@
+from uuid import uuid4
+
+from master.api_models import TargetQueryCombination
+from master.job_queue.pair_space import CrossProductPairs, ExplicitPairs
+
+
+def test_cross_product_pairs_are_enumerated_lazily():
+    queries, targets = [uuid4(), uuid4()], [uuid4(), uuid4(), uuid4()]
+    pairs = CrossProductPairs(queries, targets)
+
+    assert len(pairs) == 6
+    assert pairs[4] == TargetQueryCombination(query=queries[1], target=targets[1])
+    for pair in range(len(pairs)):
+        assert pairs.index_of(pairs[pair]) == pair
+    assert pairs.index_of(TargetQueryCombination(query=targets[0], target=targets[0])) is None
+
+
+def test_explicit_pairs_keep_submission_order():
+    combinations = [TargetQueryCombination(query=uuid4(), target=uuid4()) for _ in range(3)]
+    pairs = ExplicitPairs(combinations)
+
+    assert [pairs[pair] for pair in range(len(pairs))] == combinations
+    assert pairs.index_of(combinations[2]) == 2
+
+
+def test_pairs_can_be_looked_up_by_target():
+    queries, targets = [uuid4(), uuid4()], [uuid4(), uuid4(), uuid4()]
+    cross_product = CrossProductPairs(queries, targets)
+    assert [cross_product[pair].target for pair in cross_product.target_group(targets[1])] == [targets[1]] * 2
+    assert not cross_product.target_group(queries[0])
+
+    combinations = [TargetQueryCombination(query=query, target=targets[0]) for query in queries]
+    explicit = ExplicitPairs(combinations)
+    assert list(explicit.target_group(targets[0])) == [0, 1]
+    assert not explicit.target_group(targets[1])
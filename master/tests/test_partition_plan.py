@@ -0,0 +1,106 @@
+import asyncio
+import threading
+from uuid import uuid4
+
+from master.api_models import WorkerResources
+from master.job_queue.job_queue import JobQueue
+from master.job_queue.pair_pool import PairPool
+from master.job_queue.pair_space import CrossProductPairs
+from master.job_queue.partition_plan import PartitionPlan
+from master.tests.data import JOB_REQUEST
+from master.work_package._scheduler.planned_work_scheduler import PlannedWorkScheduler
+from master.worker.worker import Worker
+from master.worker.worker_collector import WorkerCollector
+
+
+def test_plan_hands_out_chunks_by_cells():
+    lengths = {}
+    queries = [uuid4() for _ in range(4)]
+    targets = [uuid4() for _ in range(5)]
+    lengths.update(zip(queries, [1, 2, 3, 4]))
+    lengths.update(zip(targets, [10, 10, 10, 10, 100]))
+    pairs = CrossProductPairs(queries, targets)
+    plan = PartitionPlan.build(pairs, lengths.__getitem__, chunk_cells=80)
+
+    def cells(taken: list[int]) -> int:
+        return sum(lengths[pairs[pair].query] * lengths[pairs[pair].target] for pair in taken)
+
+    # The four pairs with the long target are chunks of their own, the rest is cut into chunks of up to 80 cells
+    pool = PairPool(len(pairs))
+    assert cells(plan.take(pool, 1)) == 400
+    assert cells(plan.take(pool, 600)) == 300 + 200 + 100
+    first_small = plan.take(pool, 80)
+    assert 0 < cells(first_small) <= 80
+
+    # Aborted work comes back first, completed pairs are skipped
+    pool.requeue(first_small)
+    pool.complete(first_small[0])
+    plan.give_back(pool, first_small)
+    assert plan.take(pool, 1000) == first_small[1:]
+
+    rest = plan.take(pool, 1000)
+    assert cells(rest) == 4 * 10 * 10 - cells(first_small)
+    assert pool.pending_count == 0
+    assert plan.take(pool, 1000) == []
+
+
+def test_plan_of_a_snapshot_leaves_out_completed_pairs():
+    lengths = {}
+    queries = [uuid4() for _ in range(2)]
+    targets = [uuid4() for _ in range(3)]
+    lengths.update(zip(queries + targets, [1, 2, 10, 20, 30]))
+    pairs = CrossProductPairs(queries, targets)
+    pool = PairPool(len(pairs))
+    taken = pool.take(3)
+    pool.complete(taken[0])
+
+    plan = PartitionPlan.build(pairs, lengths.__getitem__, chunk_cells=10**6, pool=pool.snapshot())
+    # Pairs that were in progress while planning are still part of the plan, they may be aborted before it is ready
+    pool.requeue(taken[1:])
+    assert sorted(plan.take(pool, 10**6)) == sorted(set(range(len(pairs))) - {taken[0]})
+
+
+def test_jobs_whose_plan_failed_are_served_in_cost_order(monkeypatch):
+    def fail(*args):
+        raise RuntimeError("no plan")
+
+    monkeypatch.setattr(PartitionPlan, "build", fail)
+    queue = JobQueue()
+    monkeypatch.setattr(queue, "_jobs", {})
+    scheduler = PlannedWorkScheduler(WorkerCollector(), queue)
+    resources = WorkerResources(ram_mb=100, cpu_resources=1, gpu_resources=0, benchmark_result=1)
+    worker = Worker(worker_id=uuid4(), resources=resources, last_seen_alive=0, status="IDLE")
+    job = queue.add_job_to_queue(JOB_REQUEST)
+
+    # The first request starts building the plan, which fails right away (the request may or may not see that)
+    first = scheduler.schedule_work_for(worker)
+    assert isinstance(job.partition_plan.exception(), RuntimeError)
+
+    packages = [package for package in (first, scheduler.schedule_work_for(worker)) if package is not None]
+    assert packages and all(package.package.job is job for package in packages)
+    for package in packages:
+        job.requeue(package.package.pairs)
+    queue.delete_job_by_id(job.id)
+
+
+def test_plan_is_reported_on_the_event_loop(monkeypatch):
+    queue = JobQueue()
+    monkeypatch.setattr(queue, "_jobs", {})
+    scheduler = PlannedWorkScheduler(WorkerCollector(), queue)
+    threads = []
+    monkeypatch.setattr(scheduler, "_plan_done", lambda job, plan: threads.append(threading.current_thread()))
+    resources = WorkerResources(ram_mb=100, cpu_resources=1, gpu_resources=0, benchmark_result=1)
+    worker = Worker(worker_id=uuid4(), resources=resources, last_seen_alive=0, status="IDLE")
+    job = queue.add_job_to_queue(JOB_REQUEST)
+
+    async def request_work():
+        package = scheduler.schedule_work_for(worker)
+        job.partition_plan.result()
+        await asyncio.sleep(0)
+        return package
+
+    package = asyncio.run(request_work())
+    assert threads == [threading.current_thread()]
+    if package is not None:
+        job.requeue(package.package.pairs)
+    queue.delete_job_by_id(job.id)
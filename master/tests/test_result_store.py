@@ -0,0 +1,73 @@
+from uuid import uuid4
+
+from master.api_models import Alignment
+from master.job_queue.result_store import ResultMemory, ResultStore, SEGMENT_SIZE
+from master.job_queue.top_k import TopKTracker
+
+
+def test_results_are_stored_by_pair_number():
+    store = ResultStore()
+    store.put(SEGMENT_SIZE + 3, alignment="AC-GT", length=5, score=3)
+    store.put(1, alignment="ACGT", length=4, score=4)
+
+    assert len(store) == 2
+    assert store.get(1) == Alignment(alignment="ACGT", length=4, score=4)
+    assert store.get(2) is None
+    assert [pair for pair, _ in store.items()] == [1, SEGMENT_SIZE + 3]
+
+    store.clear()
+    assert len(store) == 0
+    assert store.get(1) is None
+
+
+def test_discarded_results_are_compacted_away():
+    store = ResultStore()
+    for pair in range(4):
+        store.put(pair, alignment="A" * 10, length=10, score=pair)
+
+    store.discard(0)
+    store.discard(2)
+    store.discard(3)
+    assert len(store) == 1
+    assert store.get(1) == Alignment(alignment="A" * 10, length=10, score=1)
+    assert [pair for pair, _ in store.items()] == [1]
+
+
+def test_cold_segments_are_spilled_and_mapped_back():
+    # Room for about two segments, the results of four are stored
+    memory = ResultMemory(budget=2 * 20 * SEGMENT_SIZE + 4000)
+    store = ResultStore(memory)
+    expected = {}
+    for segment in range(4):
+        for slot in range(0, SEGMENT_SIZE, 8):
+            pair = segment * SEGMENT_SIZE + slot
+            expected[pair] = Alignment(alignment="AC-GT" * (slot % 3 + 1), length=slot, score=pair % 97)
+            store.put(pair, alignment=expected[pair].alignment, length=slot, score=pair % 97)
+
+    assert store.spilled_segment_count >= 2
+    assert memory.used_bytes <= memory.budget
+    assert dict(store.items()) == expected
+    assert store.score(8) == expected[8].score and not store.has(9)
+    assert memory.used_bytes <= memory.budget
+
+    # Spilled segments are read back into memory to change them
+    store.discard(0)
+    store.put(1, alignment="A", length=1, score=1)
+    expected.pop(0)
+    expected[1] = Alignment(alignment="A", length=1, score=1)
+    assert dict(store.items()) == expected
+    assert len(store) == len(expected)
+
+    store.clear()
+    assert memory.used_bytes == 0 and len(store) == 0
+
+
+def test_top_k_keeps_the_best_pairs_per_query():
+    tracker = TopKTracker(2)
+    query_a, query_b = uuid4(), uuid4()
+
+    assert tracker.offer(query_a, 0, score=5) == (True, None)
+    assert tracker.offer(query_a, 1, score=3) == (True, None)
+    assert tracker.offer(query_b, 2, score=1) == (True, None)
+    assert tracker.offer(query_a, 3, score=2) == (False, None)
+    assert tracker.offer(query_a, 4, score=9) == (True, 1)
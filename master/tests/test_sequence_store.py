@@ -0,0 +1,26 @@
+from uuid import uuid4
+
+from master.sequence_store.sequence_store import SequenceStore
+
+
+def test_sequences_are_deduplicated_and_released_with_their_last_job():
+    store = SequenceStore()
+    stored_sequences, stored_bytes = len(store), store.stored_bytes
+    first_id, second_id = uuid4(), uuid4()
+
+    job_1 = store.add_all({first_id: "ACGTACGTTT", second_id: "GGGGACGTTT"})
+    job_2 = store.add_all({uuid4(): "ACGTACGTTT"})
+    assert len(store) == stored_sequences + 2
+    assert store.stored_bytes == stored_bytes + 20
+
+    package = job_1.subset([first_id])
+    assert dict(package) == {first_id: "ACGTACGTTT"}
+    assert second_id not in package
+
+    job_1.release()
+    assert len(store) == stored_sequences + 1
+    assert [*job_2.values()] == ["ACGTACGTTT"]
+
+    job_2.release()
+    assert len(store) == stored_sequences
+    assert store.stored_bytes == stored_bytes
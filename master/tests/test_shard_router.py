@@ -0,0 +1,192 @@
+import asyncio
+from uuid import UUID, uuid4
+
+import httpx
+from fastapi import FastAPI, HTTPException
+
+from master.api_models import ShardStatus, WorkerId
+from master.settings import SETTINGS
+from master.sharding.router import create_router_app
+from master.utils.shard import new_shard_id, shard_of
+
+RESOURCES = {"ram_mb": 100, "cpu_resources": 1, "gpu_resources": 0, "benchmark_result": 100}
+
+
+class _Transport(httpx.ASGITransport):
+    def __init__(self, shard: "FakeShard"):
+        super().__init__(app=shard.app)
+        self.shard = shard
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.shard.reachable:
+            raise httpx.ConnectError("shard is down", request=request)
+        return await super().handle_async_request(request)
+
+
+class FakeShard:
+    """A shard that answers the requests of the router from a few fields instead of a master"""
+
+    def __init__(self, index: int, count: int):
+        self.index = index
+        self.count = count
+        self.packages: list[dict] = []
+        # packages that are being computed, handed out again as speculative copies
+        self.in_flight: list[dict] = []
+        self.registered: list[str] = []
+        self.busy: list[str] = []
+        self.idle: list[str] = []
+        self.reachable = True
+        self.app = FastAPI()
+
+        @self.app.get("/shard/status")
+        async def status() -> ShardStatus:
+            return ShardStatus(
+                shard_index=self.index,
+                shard_count=self.count,
+                pending_units=len(self.packages),
+                unfinished_jobs=len(self.packages),
+                in_flight_packages=len(self.in_flight),
+                workers=len(self.registered),
+                idle_workers=0,
+            )
+
+        @self.app.post("/worker/register")
+        async def register(worker_id: UUID) -> dict:
+            if str(worker_id) in self.registered:
+                raise HTTPException(status_code=409)
+            self.registered.append(str(worker_id))
+            return {"id": str(worker_id)}
+
+        @self.app.post("/worker/pulse")
+        async def pulse(worker_id: WorkerId) -> None:
+            if str(worker_id.id) not in self.registered:
+                raise HTTPException(status_code=404, detail="Worker not found")
+
+        @self.app.post("/work/raw")
+        async def work(worker_id: WorkerId) -> dict | None:
+            if str(worker_id.id) not in self.registered:
+                raise HTTPException(status_code=404, detail="Worker not found")
+            if self.packages:
+                return self.packages.pop()
+            return self.in_flight[-1] if self.in_flight else None
+
+        @self.app.post("/shard/worker/{worker_id}/busy")
+        async def busy(worker_id: UUID) -> None:
+            self.busy.append(str(worker_id))
+
+        @self.app.post("/shard/worker/{worker_id}/idle")
+        async def idle(worker_id: UUID) -> None:
+            self.idle.append(str(worker_id))
+
+        @self.app.get("/job/{job_id}/status")
+        async def job_status(job_id: UUID) -> dict:
+            return {"shard": self.index}
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=_Transport(self), base_url=f"http://shard{self.index}")
+
+
+def _package(job_id: UUID) -> dict:
+    return {
+        "id": str(uuid4()),
+        "job_id": str(job_id),
+        "queries": [],
+        "match_score": 2,
+        "mismatch_penalty": 1,
+        "gap_penalty": 1,
+    }
+
+
+def test_ids_belong_to_their_shard(monkeypatch):
+    monkeypatch.setattr(SETTINGS, "shard_count", 3)
+    monkeypatch.setattr(SETTINGS, "shard_index", 2)
+    assert all(shard_of(new_shard_id(), 3) == 2 for _ in range(20))
+
+
+def test_router_dispatches_by_id_and_pulls_work_from_any_shard():
+    shards = [FakeShard(index, 3) for index in range(3)]
+
+    async def run() -> None:
+        app = create_router_app([shard.client() for shard in shards])
+        router = app.state.shard_router
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://router") as client:
+            # Requests for a job go to the shard that owns its id
+            for _ in range(10):
+                job_id = uuid4()
+                response = await client.get(f"/job/{job_id}/status")
+                assert response.json() == {"shard": shard_of(job_id, 3)}
+
+            # A worker is known to every shard under the same id
+            response = await client.post("/worker/register", json=RESOURCES)
+            worker_id = response.json()["id"]
+            assert all(shard.registered == [worker_id] for shard in shards)
+
+            # Work is taken from the shard that has some, the others see the worker as busy
+            job_id = uuid4()
+            shards[1].packages.append(_package(job_id))
+            await router.refresh_status()
+            assert router.shards_with_work() == [1]
+            response = await client.post("/work/raw", json={"id": worker_id})
+            assert response.json()["job_id"] == str(job_id)
+            await asyncio.gather(*router._background)
+            assert shards[0].busy == shards[2].busy == [worker_id]
+            assert shards[1].busy == []
+
+            # A waiting worker is woken up when work shows up at any shard
+            waiting = asyncio.create_task(client.post("/work/raw", params={"wait": 5}, json={"id": worker_id}))
+            await asyncio.sleep(0.05)
+            assert not waiting.done()
+            shards[2].packages.append(_package(job_id))
+            await router.refresh_status()
+            response = await asyncio.wait_for(waiting, 1)
+            assert response.json()["job_id"] == str(job_id)
+
+            # New jobs go to the shard with the least pending work
+            shards[0].packages.append(_package(job_id))
+            shards[2].packages.append(_package(job_id))
+            await router.refresh_status()
+            assert router.shard_for_new_job() == 1
+
+    asyncio.run(run())
+
+
+def test_router_works_around_unreachable_shards_and_hands_out_speculative_copies():
+    shards = [FakeShard(index, 3) for index in range(3)]
+
+    async def run() -> None:
+        app = create_router_app([shard.client() for shard in shards])
+        router = app.state.shard_router
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://router") as client:
+            # A shard that is down does not keep workers from registering and sending pulses
+            shards[2].reachable = False
+            response = await client.post("/worker/register", json=RESOURCES)
+            assert response.status_code == 200
+            worker_id = response.json()["id"]
+            assert shards[0].registered == shards[1].registered == [worker_id]
+            assert (await client.post("/worker/pulse", json={"id": worker_id})).status_code == 200
+
+            # Once it is back, it gets the worker with the next pulse
+            shards[2].reachable = True
+            assert (await client.post("/worker/pulse", json={"id": worker_id})).status_code == 200
+            assert shards[2].registered == [worker_id]
+            # Only a worker the router does not know either has to register again
+            assert (await client.post("/worker/pulse", json={"id": str(uuid4())})).status_code == 404
+
+            # In the tail of a job the shard with packages in flight is still asked for work
+            job_id = uuid4()
+            shards[1].in_flight.append(_package(job_id))
+            await router.refresh_status()
+            assert router.shards_with_work() == [1]
+            response = await client.post("/work/raw", json={"id": worker_id})
+            assert response.json()["job_id"] == str(job_id)
+
+            # The shards that were told the worker is busy see it idle again once it asks for work
+            await asyncio.gather(*router._background)
+            assert shards[0].busy == shards[2].busy == [worker_id]
+            shards[1].in_flight.clear()
+            await router.refresh_status()
+            assert (await client.post("/work/raw", json={"id": worker_id})).json() is None
+            await asyncio.gather(*router._background)
+            assert shards[0].idle == shards[2].idle == [worker_id]
+
+    asyncio.run(run())
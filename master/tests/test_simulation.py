@@ -0,0 +1,49 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from master.simulation.distribution import Distribution
+
+
+def test_distribution_parsing():
+    assert Distribution.parse("5e8") == Distribution("fixed", (5e8,))
+    assert Distribution.parse("uniform:1:2") == Distribution("uniform", (1, 2))
+    assert str(Distribution.parse("lognormal:1e+08:0.5")) == "lognormal:1e+08:0.5"
+    with pytest.raises(ValueError):
+        Distribution.parse("uniform:1")
+
+
+def test_simulation_completes_all_jobs():
+    # The simulation takes over the singletons of the master, so it runs in its own process
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "master.simulation",
+            "--scheduler",
+            "proportional",
+            "guided",
+            "--jobs",
+            "2",
+            "--queries",
+            "4",
+            "--targets",
+            "50",
+            "--failure-rate",
+            "0.1",
+            "--json",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    reports = [json.loads(line) for line in output.splitlines() if line.startswith("{")]
+
+    assert [report["scheduler"] for report in reports] == ["proportional", "guided"]
+    for report in reports:
+        assert report["completed_jobs"] == 2
+        assert 0 < report["efficiency"] <= 1
+        assert 0 < report["utilisation"] <= 1
+        assert report["job_latency_p50"] <= report["job_latency_max"] <= report["makespan"]
@@ -0,0 +1,143 @@
+import random
+from uuid import uuid4
+
+from master.api_models import CrossProduct, JobRequest, TargetQueryCombination, WorkAlignment
+from master.job_queue.job_queue import JobQueue
+from master.job_queue.pair_space import Tile
+from master.job_queue.tiling import TiledPairs, tile_overlap, tile_target
+from master.settings import SETTINGS
+
+
+def _local_alignment_score(query: str, target: str, match: int, mismatch: int, gap: int) -> int:
+    best = 0
+    previous = [0] * (len(target) + 1)
+    for query_char in query:
+        current = [0]
+        for column, target_char in enumerate(target, start=1):
+            diagonal = previous[column - 1] + (match if query_char == target_char else -mismatch)
+            current.append(max(0, diagonal, previous[column] - gap, current[column - 1] - gap))
+        best = max(best, max(current))
+        previous = current
+    return best
+
+
+def test_tiles_do_not_lose_alignments(monkeypatch):
+    monkeypatch.setattr(SETTINGS, "tile_target_length", 40)
+    rng = random.Random(7)
+    query = "".join(rng.choice("ACGT") for _ in range(8))
+    for _ in range(20):
+        target = "".join(rng.choice("ACGT") for _ in range(rng.randint(100, 300)))
+        target = target[:50] + query[:3] + "T" + query[3:] + target[50:]
+        overlap = tile_overlap(len(query), match_score=2, gap_penalty=1)
+        tiles = tile_target(uuid4(), len(target), overlap)
+
+        assert tiles[-1].end == len(target)
+        full_score = _local_alignment_score(query, target, 2, 1, 1)
+        tiled_score = max(_local_alignment_score(query, target[tile.start : tile.end], 2, 1, 1) for tile in tiles)
+        assert tiled_score == full_score
+
+
+def test_tile_results_are_merged_into_one_result_per_pair(monkeypatch):
+    monkeypatch.setattr(SETTINGS, "tile_target_length", 40)
+    query, target = uuid4(), uuid4()
+    request = JobRequest(
+        match_score=1,
+        mismatch_penalty=1,
+        gap_penalty=1,
+        sequences={query: "ACGT", target: "A" * 100},
+        cross_product=CrossProduct(queries=[query], targets=[target]),
+    )
+    queue = JobQueue()
+    job = queue.add_job_to_queue(request)
+    tiles = [job.units[unit] for unit in range(len(job.units))]
+    assert len(job.pairs) == 1 and len(tiles) > 1
+    assert all(job.sequences.length(tile.target) <= 40 for tile in tiles)
+
+    for number, tile in enumerate(tiles):
+        assert not job.done()
+        score = 3 if number == 1 else 1
+        alignment = WorkAlignment(query_alignment="A", target_alignment="A", length=1, score=score, maxX=0, maxY=0)
+        job.add_result(job.units.index_of(tile), alignment)
+
+    assert job.done()
+    [(_, _, result)] = job.ranked_results()
+    assert result.combination == TargetQueryCombination(query=query, target=target)
+    assert result.alignments[0].score == 3
+
+    queue.delete_job_by_id(job.id)
+
+
+def test_units_of_tiled_pairs_are_numbered_consistently(monkeypatch):
+    monkeypatch.setattr(SETTINGS, "tile_target_length", 40)
+    # Long targets, one of them too short to be split for the long query, and a long query that is never split
+    queries = {uuid4(): "ACGT", uuid4(): "ACGTACGTAC", uuid4(): "A" * 30, uuid4(): "C" * 200}
+    targets = {uuid4(): "A" * 100, uuid4(): "ACGT", uuid4(): "G" * 70, uuid4(): "T" * 300, uuid4(): "AC"}
+    cross_product = JobRequest(
+        match_score=1,
+        mismatch_penalty=1,
+        gap_penalty=1,
+        sequences=queries | targets,
+        cross_product=CrossProduct(queries=list(queries), targets=list(targets)),
+    )
+    combinations = [
+        TargetQueryCombination(query=query, target=target)
+        for index, (query, target) in enumerate((query, target) for target in targets for query in queries)
+        if index % 3
+    ]
+    explicit = JobRequest(
+        match_score=1, mismatch_penalty=1, gap_penalty=1, sequences=queries | targets, queries=combinations
+    )
+
+    queue = JobQueue()
+    for request in (cross_product, explicit):
+        job = queue.add_job_to_queue(request)
+        units, pairs, length_of = job.units, job.pairs, job.sequences.length
+        assert isinstance(units, TiledPairs)
+
+        units_of_pair: dict[int, list[int]] = {}
+        for unit in range(len(units)):
+            combination, pair = units[unit], units.pair_of(unit)
+            units_of_pair.setdefault(pair, []).append(unit)
+            assert units.index_of(combination) == unit
+            assert combination.query == pairs[pair].query
+            tile = units.tile_of(unit)
+            if tile is None:
+                assert combination == pairs[pair]
+            else:
+                assert tile.pair == pair and length_of(combination.target) < length_of(pairs[pair].target)
+        assert sorted(units_of_pair) == list(range(len(pairs)))
+        assert all(len(tiled) == (units.tile_of(tiled[0]) or Tile(0, 0, 1)).count for tiled in units_of_pair.values())
+
+        for target in units.targets():
+            assert list(units.target_group(target)) == [u for u in range(len(units)) if units[u].target == target]
+        for group in range(units.query_group_count()):
+            assert sorted(units.query_group(group)) == sorted(
+                unit for pair in pairs.query_group(group) for unit in units_of_pair[pair]
+            )
+
+        rows = units.rows_by_target_length(length_of)
+        ordered = [row.offset + unit for row in rows for unit in row.pairs]
+        assert sorted(ordered) == list(range(len(units)))
+        for row in rows:
+            assert list(row.target_lengths) == sorted(row.target_lengths, reverse=True)
+            assert row.total_target_length == sum(row.target_lengths)
+            for target_length, unit in zip(row.target_lengths, row.pairs):
+                assert target_length == length_of(units[row.offset + unit].target)
+                assert row.query_length == length_of(units[row.offset + unit].query)
+        queue.delete_job_by_id(job.id)
+
+
+def test_only_long_targets_are_tiled(monkeypatch):
+    monkeypatch.setattr(SETTINGS, "tile_target_length", 40)
+    query, target = uuid4(), uuid4()
+    request = JobRequest(
+        match_score=1,
+        mismatch_penalty=1,
+        gap_penalty=1,
+        sequences={query: "A" * 100, target: "ACGT"},
+        cross_product=CrossProduct(queries=[query], targets=[target]),
+    )
+    queue = JobQueue()
+    job = queue.add_job_to_queue(request)
+    assert job.units is job.pairs
+    queue.delete_job_by_id(job.id)
@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+from uuid import uuid4
+
+from master.work_package.work_package_registry import WorkPackageRegistry
+
+
+def _package(worker_id, job_id):
+    return SimpleNamespace(
+        package=SimpleNamespace(id=uuid4(), job=SimpleNamespace(id=job_id)),
+        worker=SimpleNamespace(worker_id=worker_id),
+    )
+
+
+def test_registry_indexes_by_worker_and_job():
+    registry = WorkPackageRegistry()
+    worker_a, worker_b, job_a, job_b = uuid4(), uuid4(), uuid4(), uuid4()
+    package_1 = _package(worker_a, job_a)
+    package_2 = _package(worker_a, job_b)
+    package_3 = _package(worker_b, job_b)
+    for package in (package_1, package_2, package_3):
+        registry.add(package)
+
+    assert registry.get(package_2.package.id) is package_2
+    assert {p.package.id for p in registry.for_worker(worker_a)} == {package_1.package.id, package_2.package.id}
+    assert {p.package.id for p in registry.for_job(job_b)} == {package_2.package.id, package_3.package.id}
+
+    removed = registry.remove_job(job_b)
+    assert {p.package.id for p in removed} == {package_2.package.id, package_3.package.id}
+    assert registry.worker_ids() == [worker_a]
+    assert len(registry) == 1
+
+    assert registry.remove_worker(worker_a) == [package_1]
+    assert registry.get(package_1.package.id) is None
+    assert registry.remove(package_1.package.id) is None
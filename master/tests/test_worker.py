@@ -1,11 +1,24 @@
-from time import sleep
+from threading import Thread
+from time import sleep, time
 from uuid import UUID
 
 from fastapi.testclient import TestClient
 
-from master.api_models import WorkerId, WorkerResources, WorkPackage, JobId, JobResult, TargetQueryCombination
+from master.api_models import (
+    WorkerId,
+    WorkerResources,
+    WorkPackage,
+    JobId,
+    JobResult,
+    TargetQueryCombination,
+    JobResultCombination,
+    JobResultPage,
+    JobStatus,
+    RawWorkPackage,
+)
 from master.settings import SETTINGS
 from master.tests.data import (
+    JOB_REQUEST,
     WORK_RESULT_COMPLETE,
     WORK_RESULT_PART_1,
     WORK_RESULT_PART_2,
@@ -30,7 +43,7 @@ def test_register_worker(f_client: TestClient):
     response = f_client.post("/worker/pulse", json=worker_id.model_dump(mode="json"))
     assert response.status_code == 200
 
-    sleep(SETTINGS.worker_cleaning_interval * 3)
+    sleep(SETTINGS.worker_timeout * 1.5)
 
     # Send a pulse to the master -> worker should be gone
     response = f_client.post("/worker/pulse", json=worker_id.model_dump(mode="json"))
@@ -49,7 +62,7 @@ def test_work_package_gets_returned(
     f_worker_node[1].stop()
 
     # Wait for the worker to be removed from the worker list
-    sleep(SETTINGS.worker_cleaning_interval * 2 + SETTINGS.work_package_cleaning_interval * 2)
+    sleep(SETTINGS.worker_timeout * 2)
 
     # Check if there is work available -> there should be work available again
     # However, we first need to register the worker again
@@ -104,7 +117,7 @@ def test_work_package_partially_returned_and_picked_up_by_other_worker(
     f_worker_node[1].stop()
 
     # Wait for the worker to be removed from the worker list
-    sleep(SETTINGS.worker_cleaning_interval * 2.5 + SETTINGS.work_package_cleaning_interval * 2.5)
+    sleep(SETTINGS.worker_timeout * 2.5)
 
     # Register a new worker
     response = f_client.post(
@@ -131,3 +144,114 @@ def test_work_package_partially_returned_and_picked_up_by_other_worker(
     # Check if the result is correct
     job_result = JobResult(**response.json())
     assert job_result.alignments == JOB_RESULT_COMPLETE.alignments
+
+
+def test_job_result_can_be_streamed_and_paginated(
+    f_client: TestClient, f_job: JobId, f_worker_node: tuple[WorkerId, StoppableThread], f_work_package: WorkPackage
+):
+    response = f_client.post(f"/work/{f_work_package.id}/result", json=WORK_RESULT_COMPLETE.model_dump(mode="json"))
+    assert response.status_code == 200
+
+    # Every query has a single target, so the ranked order is the order of the job
+    response = f_client.get(f"/job/{f_job.id}/result/stream")
+    assert response.status_code == 200
+    streamed = [JobResultCombination.model_validate_json(line) for line in response.text.splitlines()]
+    assert streamed == JOB_RESULT_COMPLETE.alignments
+
+    paged = []
+    cursor = None
+    while True:
+        params = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+        response = f_client.get(f"/job/{f_job.id}/result/page", params=params)
+        assert response.status_code == 200
+        page = JobResultPage(**response.json())
+        paged += page.alignments
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert paged == JOB_RESULT_COMPLETE.alignments
+
+
+def test_status_stream_ends_with_done_event(
+    f_client: TestClient, f_job: JobId, f_worker_node: tuple[WorkerId, StoppableThread], f_work_package: WorkPackage
+):
+    response = f_client.post(f"/work/{f_work_package.id}/result", json=WORK_RESULT_COMPLETE.model_dump(mode="json"))
+    assert response.status_code == 200
+
+    response = f_client.get(f"/job/{f_job.id}/status/stream")
+    assert response.status_code == 200
+    events = [line[len("data:") :] for line in response.text.splitlines() if line.startswith("data:")]
+    assert [JobStatus.model_validate_json(event).state for event in events] == ["DONE"]
+
+
+def test_waiting_worker_is_woken_up_by_new_job(f_client: TestClient, f_worker_node: tuple[WorkerId, StoppableThread]):
+    worker_id, _ = f_worker_node
+    responses = []
+    request = Thread(
+        target=lambda: responses.append(
+            f_client.post("/work/raw", params={"wait": 10}, json=worker_id.model_dump(mode="json"))
+        )
+    )
+    started = time()
+    request.start()
+    sleep(0.5)
+
+    response = f_client.post("/job/format/json", json=JOB_REQUEST.model_dump(mode="json"))
+    job_id = JobId(**response.json())
+    request.join()
+
+    assert time() - started < 5
+    assert responses[0].status_code == 200
+    assert RawWorkPackage(**responses[0].json()).job_id == job_id.id
+    f_client.delete(f"/job/{job_id.id}")
+
+
+def test_idle_fast_worker_gets_a_copy_of_an_unfinished_package(
+    f_client: TestClient, f_job: JobId, f_worker_node: tuple[WorkerId, StoppableThread], f_work_package: WorkPackage
+):
+    response = f_client.post(
+        "/worker/register",
+        json=WorkerResources(ram_mb=100, cpu_resources=1, gpu_resources=0, benchmark_result=10**9).model_dump(
+            mode="json"
+        ),
+    )
+    fast_worker = WorkerId(**response.json())
+
+    # The job has no pending pairs left, so the fast worker gets a copy of the package of the slow one
+    response = f_client.post("/work/", json=fast_worker.model_dump(mode="json"))
+    assert response.status_code == 200
+    copy = WorkPackage(**response.json())
+    assert copy.id != f_work_package.id
+    assert copy.queries == f_work_package.queries
+
+    response = f_client.post(f"/work/{copy.id}/result", json=WORK_RESULT_COMPLETE.model_dump(mode="json"))
+    assert response.status_code == 200
+
+    # The late result of the original package is dropped
+    response = f_client.post(
+        f"/work/{f_work_package.id}/result", json=WORK_RESULT_PART_2_DIFFERENT_ALIGNMENT.model_dump(mode="json")
+    )
+    assert response.status_code == 200
+    response = f_client.get(f"/job/{f_job.id}/result")
+    assert JobResult(**response.json()).alignments == JOB_RESULT_COMPLETE.alignments
+
+
+def test_straggler_result_after_the_job_is_done_keeps_its_computation_time(
+    f_client: TestClient, f_job: JobId, f_worker_node: tuple[WorkerId, StoppableThread], f_work_package: WorkPackage
+):
+    response = f_client.post(
+        "/worker/register",
+        json=WorkerResources(ram_mb=100, cpu_resources=1, gpu_resources=0, benchmark_result=10**9).model_dump(
+            mode="json"
+        ),
+    )
+    response = f_client.post("/work/", json=response.json())
+    copy = WorkPackage(**response.json())
+    response = f_client.post(f"/work/{copy.id}/result", json=WORK_RESULT_COMPLETE.model_dump(mode="json"))
+    assert response.status_code == 200
+    computation_time = JobResult(**f_client.get(f"/job/{f_job.id}/result").json()).computation_time
+
+    # The straggler finishes its package after the copy completed the job
+    response = f_client.post(f"/work/{f_work_package.id}/result", json=WORK_RESULT_COMPLETE.model_dump(mode="json"))
+    assert response.status_code == 200
+    assert JobResult(**f_client.get(f"/job/{f_job.id}/result").json()).computation_time == computation_time
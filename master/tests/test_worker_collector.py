@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from master.api_models import WorkerResources
+from master.settings import SETTINGS
+from master.utils.time import set_clock
+from master.worker.worker_collector import WorkerAlreadyRegisteredException, WorkerCollector
+
+RESOURCES = WorkerResources(ram_mb=100, cpu_resources=1, gpu_resources=0, benchmark_result=100)
+
+
+def test_workers_expire_at_their_deadline():
+    now = 1000.0
+    set_clock(lambda: now)
+    try:
+        collector = WorkerCollector()
+        quiet = collector.register(RESOURCES)
+        pulsing = collector.register(RESOURCES)
+
+        now += SETTINGS.worker_timeout - 1
+        collector.add_life_pulse(pulsing)
+        collector.expire_workers()
+        assert collector.is_alive(quiet) and collector.is_alive(pulsing)
+
+        now += 1
+        assert collector.next_expiry() == now * 1000
+        collector.expire_workers()
+        assert [worker.worker_id for worker in collector.workers] == [pulsing]
+
+        now += SETTINGS.worker_timeout
+        collector.expire_workers()
+        assert collector.workers == []
+        assert collector.next_expiry() is None
+    finally:
+        set_clock(None)
+
+
+def test_expiry_timer_fires_on_the_event_loop(monkeypatch):
+    monkeypatch.setattr(SETTINGS, "worker_timeout", 0.05)
+
+    async def register_and_go_dark() -> None:
+        collector = WorkerCollector()
+        worker_id = collector.register(RESOURCES)
+        await asyncio.sleep(0.02)
+        collector.add_life_pulse(worker_id)
+        await asyncio.sleep(0.04)
+        assert collector.is_alive(worker_id)
+        await asyncio.sleep(0.05)
+        assert not collector.is_alive(worker_id)
+        assert collector.workers == []
+
+    asyncio.run(register_and_go_dark())
+
+
+def test_a_registered_id_cannot_be_taken_over():
+    collector = WorkerCollector()
+    worker_id = collector.register(RESOURCES)
+    worker = collector.get_worker_by_id(worker_id)
+
+    with pytest.raises(WorkerAlreadyRegisteredException):
+        collector.register(RESOURCES, worker_id)
+    assert collector.get_worker_by_id(worker_id) is worker
+
+    collector.remove_worker(worker)
+    assert collector.register(RESOURCES, worker_id) == worker_id
+    collector.remove_worker(collector.get_worker_by_id(worker_id))
@@ -0,0 +1,29 @@
+from uuid import uuid4
+
+from master.api_models import WorkerResources
+from master.settings import SETTINGS
+from master.worker.worker import Worker
+
+
+def test_observed_throughput_replaces_the_benchmark():
+    resources = WorkerResources(ram_mb=100, cpu_resources=1, gpu_resources=0, benchmark_result=1000)
+    worker = Worker(worker_id=uuid4(), resources=resources, last_seen_alive=0, status="IDLE")
+    assert worker.cups == 1000
+
+    worker.record_throughput(cells=500, seconds=1)
+    assert worker.cups == 500
+
+    worker.record_throughput(cells=3000, seconds=2)
+    assert worker.cups == 500 + SETTINGS.throughput_smoothing * (1500 - 500)
+
+
+def test_worker_remembers_its_most_recent_sequences():
+    resources = WorkerResources(ram_mb=100, cpu_resources=1, gpu_resources=0, benchmark_result=1000)
+    worker = Worker(worker_id=uuid4(), resources=resources, last_seen_alive=0, status="IDLE")
+    sequences = [uuid4() for _ in range(SETTINGS.worker_sequence_cache_size + 1)]
+
+    worker.remember_sequences(sequences)
+    worker.remember_sequences(sequences[1:2])
+    assert len(worker.recent_sequences) == SETTINGS.worker_sequence_cache_size
+    assert sequences[0] not in worker.recent_sequences
+    assert next(reversed(worker.recent_sequences)) == sequences[1]
@@ -0,0 +1,67 @@
+import codecs
+from typing import AsyncIterator
+
+from fastapi import HTTPException, UploadFile
+
+from master.api_models import Sequence
+
+FASTA_CHUNK_SIZE = 1 << 20
+
+FastaRecord = tuple[str, Sequence]
+
+
+class FastaParser:
+    """Incremental FASTA parser, text can be fed in arbitrary chunks and complete records are returned"""
+
+    def __init__(self):
+        self._name: str | None = None
+        self._parts: list[str] = []
+        self._remainder = ""
+
+    def feed(self, text: str) -> list[FastaRecord]:
+        lines = (self._remainder + text).split("\n")
+        self._remainder = lines.pop()
+        return [record for line in lines if (record := self._parse_line(line))]
+
+    def finish(self) -> list[FastaRecord]:
+        record = self._parse_line(self._remainder)
+        self._remainder = ""
+        records = [record] if record else []
+        if self._name is not None:
+            records.append(self._complete_record())
+        return records
+
+    def _parse_line(self, line: str) -> FastaRecord | None:
+        line = line.strip()
+        if not line.startswith(">"):
+            # Everything before the first header is ignored
+            if line and self._name is not None:
+                self._parts.append(line)
+            return None
+
+        header = line[1:].split()
+        if not header:
+            raise ValueError("FASTA record without a name")
+
+        record = self._complete_record() if self._name is not None else None
+        self._name = header[0]
+        return record
+
+    def _complete_record(self) -> FastaRecord:
+        record = (self._name, "".join(self._parts))
+        self._name = None
+        self._parts = []
+        return record
+
+
+async def parse_fasta_upload(file: UploadFile) -> AsyncIterator[FastaRecord]:
+    parser = FastaParser()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        while chunk := await file.read(FASTA_CHUNK_SIZE):
+            for record in parser.feed(decoder.decode(chunk)):
+                yield record
+        for record in parser.feed(decoder.decode(b"", final=True)) + parser.finish():
+            yield record
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid FASTA file {file.filename}: {e}")
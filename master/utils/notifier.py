@@ -0,0 +1,42 @@
+import asyncio
+
+
+class Notifier:
+    """
+    Wakes up coroutines waiting for a change. Every notification bumps a version, so a waiter that passes the version
+    it last saw cannot miss a notification that happened in between. notify() may be called from any thread.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._waiters: set[asyncio.Future] = set()
+
+    async def wait(self, since_version: int, timeout: float) -> bool:
+        """Waits until the version differs from since_version, returns False if the timeout expired first"""
+        if self.version != since_version:
+            return True
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.add(future)
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return self.version != since_version
+        finally:
+            self._waiters.discard(future)
+
+    def notify(self) -> None:
+        self.version += 1
+        waiters, self._waiters = self._waiters, set()
+        for future in waiters:
+            try:
+                future.get_loop().call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # The loop of the waiter is already closed
+                pass
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,16 @@
+from uuid import UUID, uuid4
+
+from master.settings import SETTINGS
+
+
+def shard_of(id_: UUID, shard_count: int) -> int:
+    """The shard that owns a job or work package id"""
+    return id_.int % shard_count
+
+
+def new_shard_id() -> UUID:
+    """A random id owned by this shard of the master, so a router can send requests for it here"""
+    while True:
+        id_ = uuid4()
+        if shard_of(id_, SETTINGS.shard_count) == SETTINGS.shard_index:
+            return id_
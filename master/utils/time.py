@@ -1,9 +1,23 @@
 import time
+from typing import Callable
+
+# Seconds since the epoch, replaced by the virtual clock of a simulation
+_clock: Callable[[], float] = time.time
+
+
+def set_clock(clock: Callable[[], float] | None) -> None:
+    """Replaces the clock behind the functions below, None restores the wall clock"""
+    global _clock
+    _clock = clock or time.time
+
+
+def current_ns() -> int:
+    return int(round(_clock() * 1_000_000_000))
 
 
 def current_ms() -> int:
-    return int(round(time.time() * 1000))
+    return int(round(_clock() * 1000))
 
 
 def current_sec() -> int:
-    return int(round(time.time()))
+    return int(round(_clock()))
@@ -0,0 +1,44 @@
+import logging
+import math
+
+from master.settings import SETTINGS
+from master.worker.worker import Worker
+from .scheduled_work_package import ScheduledWorkPackage
+from .utils import work_packages_from_queries
+from .work_scheduler import WorkPackageScheduler
+from ...job_queue.pair_pool import PairIndex
+from ...job_queue.queued_job import QueuedJob
+
+logger = logging.getLogger(__name__)
+
+
+class GuidedWorkScheduler(WorkPackageScheduler):
+    """
+    Guided self-scheduling: a package is a fraction of the worker's share of the remaining work, so packages are large
+    at the start of a job (little overhead) and shrink towards the end (little imbalance), down to a minimum size.
+    Within a package the most expensive pairs go first, like in the LPT scheduler.
+    """
+
+    def schedule_work_for(self, worker: Worker) -> None | ScheduledWorkPackage:
+        job = self._job_queue.next_job_to_schedule()
+        if job is None:
+            return None
+
+        live_workers = [other for other in self._worker_collector.workers if other.status != "DEAD"]
+        pairs = _get_guided_pairs(job, worker, live_workers)
+
+        return work_packages_from_queries(job, pairs, worker)
+
+
+def _get_guided_pairs(job: QueuedJob, worker: Worker, live_workers: list[Worker]) -> list[PairIndex]:
+    order = job.cost_order()
+
+    # Weighted by processing power, for equal workers this is the remaining work divided by the worker count
+    total_processing_power = sum(live_worker.cups for live_worker in live_workers)
+    share = worker.cups / max(total_processing_power, worker.cups)
+
+    cells = max(
+        SETTINGS.guided_fraction * share * order.pending_cells,
+        SETTINGS.guided_min_package_seconds * worker.cups,
+    )
+    return order.take(job.pool, math.ceil(cells))
@@ -0,0 +1,39 @@
+import logging
+import math
+
+from master.worker.worker import Worker
+from .scheduled_work_package import ScheduledWorkPackage
+from .utils import work_packages_from_queries
+from .work_scheduler import WorkPackageScheduler
+from ...job_queue.pair_pool import PairIndex
+from ...job_queue.queued_job import QueuedJob
+
+logger = logging.getLogger(__name__)
+
+
+class LptWorkScheduler(WorkPackageScheduler):
+    """
+    Longest processing time first: the most expensive pairs are handed out first and every worker gets its share of
+    the remaining cells, proportional to its processing power, so all workers finish at about the same time.
+    """
+
+    def schedule_work_for(self, worker: Worker) -> None | ScheduledWorkPackage:
+        job = self._job_queue.next_job_to_schedule()
+        if job is None:
+            return None
+
+        pairs = _get_longest_pairs(job, worker, self._worker_collector.idle_workers())
+
+        return work_packages_from_queries(job, pairs, worker)
+
+
+def _get_longest_pairs(job: QueuedJob, worker: Worker, idle_workers: list[Worker]) -> list[PairIndex]:
+    order = job.cost_order()
+
+    # The requesting worker is idle as well, but better safe than sorry
+    total_processing_power = sum(idle_worker.cups for idle_worker in idle_workers)
+    worker_processing_power = worker.cups
+    share = worker_processing_power / max(total_processing_power, worker_processing_power)
+
+    cells = math.ceil(order.pending_cells * share)
+    return order.take(job.pool, cells)
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from master.job_queue.partition_plan import PartitionPlan
+from master.job_queue.queued_job import QueuedJob
+from master.settings import SETTINGS
+from master.worker.worker import Worker
+from .scheduled_work_package import ScheduledWorkPackage
+from .utils import work_packages_from_queries
+from .work_scheduler import WorkPackageScheduler
+
+logger = logging.getLogger(__name__)
+
+# Plans are built one at a time, next to the request handling
+_planner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="partition-planner")
+
+
+class PlannedWorkScheduler(WorkPackageScheduler):
+    """
+    Hands out chunks of a partition plan that is built in the background as soon as the scheduler sees a job, so a
+    request for work only has to pick the amount of chunks that matches the speed of the worker.
+    Jobs are not scheduled until their plan is ready, waiting workers are woken up once it is.
+    """
+
+    def schedule_work_for(self, worker: Worker) -> None | ScheduledWorkPackage:
+        job = self._job_queue.next_job_to_schedule(eligible=self._has_plan)
+        if job is None:
+            return None
+
+        cells = worker.cups * SETTINGS.work_package_time_split_in_seconds
+        if job.partition_plan.exception() is None:
+            pairs = job.partition_plan.result().take(job.pool, cells)
+        else:
+            # Building the plan failed (and would fail again), the job is served in cost order instead
+            pairs = job.cost_order().take(job.pool, cells)
+        return work_packages_from_queries(job, pairs, worker)
+
+    def _has_plan(self, job: QueuedJob) -> bool:
+        """Returns whether the plan of the job is ready, and starts building it if that did not happen yet"""
+        if job.partition_plan is None:
+            logger.info(f"Building partition plan for job {job.id}")
+            job.partition_plan = _planner.submit(
+                PartitionPlan.build,
+                job.units,
+                job.sequences.length,
+                SETTINGS.plan_chunk_cells,
+                job.pool.snapshot(),
+            )
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # Without an event loop (e.g. in a simulation) the owner of the master waits for the plan itself
+                job.partition_plan.add_done_callback(lambda plan: self._plan_done(job, plan))
+            else:
+                job.partition_plan.add_done_callback(lambda plan: _call_soon(loop, self._plan_done, job, plan))
+        return job.partition_plan.done()
+
+    def _plan_done(self, job: QueuedJob, plan: Future[PartitionPlan]) -> None:
+        if plan.exception() is not None:
+            logger.error(f"Building the partition plan of job {job.id} failed: {plan.exception()!r}")
+        self._job_queue.work_available.notify()
+
+
+def _call_soon(loop: asyncio.AbstractEventLoop, callback: Callable[..., None], *args) -> None:
+    """Runs the callback on the loop that owns the master, unless the loop was closed in the meantime"""
+    try:
+        loop.call_soon_threadsafe(callback, *args)
+    except RuntimeError:
+        logger.warning("The event loop was closed before a partition plan was built")
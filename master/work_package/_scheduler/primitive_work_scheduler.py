@@ -10,9 +10,8 @@ logger = logging.getLogger(__name__)
 
 class PrimitiveWorkPackageScheduler(WorkPackageScheduler):
     def schedule_work_for(self, worker: Worker) -> None | ScheduledWorkPackage:
-        unfinished_jobs = self._job_queue.jobs_with_unassigned_sequences()
-        if not unfinished_jobs:
+        job = self._job_queue.next_job_to_schedule()
+        if job is None:
             return None
-        job = unfinished_jobs.pop(0)
-        queries = job.missing_sequences()
-        return work_packages_from_queries(job, queries, worker)
+        pairs = job.pool.take(job.pool.pending_count)
+        return work_packages_from_queries(job, pairs, worker)
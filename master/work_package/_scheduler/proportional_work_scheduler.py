@@ -6,7 +6,7 @@ from master.worker.worker import Worker
 from .scheduled_work_package import ScheduledWorkPackage
 from .utils import work_packages_from_queries
 from .work_scheduler import WorkPackageScheduler
-from ...api_models import TargetQueryCombination
+from ...job_queue.pair_pool import PairIndex
 from ...job_queue.queued_job import QueuedJob
 
 logger = logging.getLogger(__name__)
@@ -16,40 +16,37 @@ class ProportionalWorkScheduler(WorkPackageScheduler):
     MIN_SEQUENCES_PER_WORKER = 20
 
     def schedule_work_for(self, worker: Worker) -> None | ScheduledWorkPackage:
-        unfinished_jobs = self._job_queue.jobs_with_unassigned_sequences()
-        if not unfinished_jobs:
+        job = self._job_queue.next_job_to_schedule()
+        if job is None:
             return None
 
-        # Get the first unfinished job
-        job = unfinished_jobs.pop(0)
-        queries = _get_proportional_work_packages(job, worker, self._worker_collector.idle_workers())
+        pairs = _get_proportional_work_packages(job, worker, self._worker_collector.idle_workers())
 
-        return work_packages_from_queries(job, queries, worker)
+        return work_packages_from_queries(job, pairs, worker)
 
 
-def _get_proportional_work_packages(
-    job: QueuedJob, worker: Worker, idle_workers: list[Worker]
-) -> set[TargetQueryCombination]:
-    # Get all missing sequences for the job
-    queries = job.missing_sequences()
-    if len(queries) == 0:
+def _get_proportional_work_packages(job: QueuedJob, worker: Worker, idle_workers: list[Worker]) -> list[PairIndex]:
+    pending_pairs = job.pool.pending_count
+    if pending_pairs == 0:
         logger.error(f"Job {job.id} has no sequences to schedule")
-        return set()
+        return []
 
     # Get all workers that are currently NOT working on a job (this includes the worker requesting work)
-    total_processing_power = sum([worker.resources.benchmark_result for worker in idle_workers])
+    total_processing_power = sum([worker.cups for worker in idle_workers])
 
     # Calculate the processing power of the current worker compared to all other workers
-    worker_processing_power = worker.resources.benchmark_result
+    worker_processing_power = worker.cups
     # Just in case something went wrong and the worker itself is not in the list of available workers
     # (should not happen), but better safe than sorry
     proportional_processing_power = worker_processing_power / max(total_processing_power, worker_processing_power)
 
     # Calculate the number of queries that should be assigned to the current worker
     # (at least one query should be assigned)
-    amount_of_sequences = math.ceil(proportional_processing_power * len(queries))
+    amount_of_sequences = math.ceil(proportional_processing_power * pending_pairs)
     amount_of_sequences = max(amount_of_sequences, ProportionalWorkScheduler.MIN_SEQUENCES_PER_WORKER)
-    amount_of_sequences = min(amount_of_sequences, len(queries))
+    amount_of_sequences = min(amount_of_sequences, pending_pairs)
 
-    # Assign the queries to the current worker
-    return set(itertools.islice(queries, amount_of_sequences))
+    # Assign the queries to the current worker, starting with pairs whose target the worker already holds
+    cached_targets = reversed(worker.recent_sequences)
+    pairs = job.pool.take_pairs(itertools.islice(job.pending_pairs_with_targets(cached_targets), amount_of_sequences))
+    return pairs + job.pool.take(amount_of_sequences - len(pairs))
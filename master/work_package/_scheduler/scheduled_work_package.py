@@ -1,11 +1,12 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from uuid import UUID
 
-from master.api_models import TargetQueryCombination, Sequence, SequenceId
+from master.api_models import TargetQueryCombination
+from master.job_queue.pair_pool import PairIndex
 from master.job_queue.queued_job import QueuedJob
+from master.sequence_store.sequence_store import SequenceHandles
 from master.utils.log_time import log_time
 from master.utils.time import current_ms
-from master.utils.try_until_succeeds import try_until_succeeds
 from master.worker.worker import Worker
 
 
@@ -14,12 +15,20 @@ class InternalWorkPackage:
     # work package id
     id: UUID
     job: QueuedJob
-    sequences: dict[SequenceId, Sequence]
-    queries: set[TargetQueryCombination]
+    sequences: SequenceHandles
+    pairs: list[PairIndex]
     match_score: int
     mismatch_penalty: int
     gap_penalty: int
 
+    @property
+    def queries(self) -> list[TargetQueryCombination]:
+        return [self.job.units[pair] for pair in self.pairs]
+
+
+# Results that arrive in quick succession are measured together, short intervals say little about throughput
+MIN_THROUGHPUT_SAMPLE_MS = 1000
+
 
 @dataclass
 class ScheduledWorkPackage:
@@ -27,19 +36,36 @@ class ScheduledWorkPackage:
     worker: Worker
     start_time: int
     expected_ms: int
+    # Cells computed by the worker that have not been fed into its throughput yet, and since when
+    unmeasured_cells: int = field(default=0, repr=False)
+    measured_since: int | None = field(default=None, repr=False)
+    # Copies are handed out for unfinished packages at the end of a job, a copy is never copied itself
+    speculative: bool = False
+    copies: int = 0
 
     @property
     @log_time
     def percentage_done(self) -> float:
-        # Get the length of the sequences that should be done in the work package
-        sequence_length = len(self.package.queries)
-        completed_sequences_set = self.package.job.completed_sequences.keys()
-        completed_sequences = try_until_succeeds(lambda: len(self.package.queries & completed_sequences_set))
-        return completed_sequences / sequence_length
+        pool = self.package.job.pool
+        completed_pairs = sum(1 for pair in self.package.pairs if pool.is_completed(pair))
+        return completed_pairs / len(self.package.pairs)
 
     def done(self) -> bool:
         return self.percentage_done == 1
 
+    def record_computed_cells(self, cells: int, final: bool) -> None:
+        """Updates the observed throughput of the worker with the cells of newly arrived results"""
+        now = current_ms()
+        since = self.start_time if self.measured_since is None else self.measured_since
+        self.unmeasured_cells += cells
+        if now - since < MIN_THROUGHPUT_SAMPLE_MS and not final:
+            return
+
+        if now > since and self.unmeasured_cells:
+            self.worker.record_throughput(self.unmeasured_cells, (now - since) / 1000)
+        self.unmeasured_cells = 0
+        self.measured_since = now
+
     def is_too_slow(self) -> bool:
         # return True if worker is 60 seconds slower than 10x as slow as expected
         return self.start_time + self.percentage_done * self.expected_ms * 10 + 60000 < current_ms()
@@ -0,0 +1,41 @@
+from typing import Iterable
+
+from master.settings import SETTINGS
+from master.utils.time import current_ms
+from master.worker.worker import Worker
+from .scheduled_work_package import ScheduledWorkPackage
+from .utils import work_packages_from_queries
+
+
+def speculative_copy_for(worker: Worker, packages: Iterable[ScheduledWorkPackage]) -> ScheduledWorkPackage | None:
+    """
+    Copies the unfinished pairs of the oldest package of a job that has nothing left to schedule, so that a slow
+    worker does not hold up the whole job. Whichever package delivers a pair first wins, later results are dropped.
+    """
+    now = current_ms()
+    for package in packages:
+        job = package.package.job
+        if (
+            package.speculative
+            or package.copies >= SETTINGS.max_speculative_copies
+            or package.worker.worker_id == worker.worker_id
+            or job.has_unassigned_pairs()
+        ):
+            continue
+
+        pairs = [pair for pair in package.package.pairs if job.pool.is_in_progress(pair)]
+        if not pairs:
+            continue
+
+        # Not worth it if the original is on schedule and expected to finish before the copy would
+        expected_end = package.start_time + package.expected_ms
+        copy_ms = sum(job.pair_cost(pair) for pair in pairs) / worker.cups * 1000
+        if now < expected_end <= now + copy_ms:
+            continue
+
+        copy = work_packages_from_queries(job, job.pool.hold(pairs), worker)
+        copy.speculative = True
+        package.copies += 1
+        return copy
+
+    return None
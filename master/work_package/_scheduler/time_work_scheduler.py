@@ -1,59 +1,47 @@
 import logging
-import random
+from itertools import islice
 
 from master.worker.worker import Worker
 from .scheduled_work_package import ScheduledWorkPackage
-from .utils import estimate_work_in_seconds, work_packages_from_queries
+from .utils import work_packages_from_queries
 from .work_scheduler import WorkPackageScheduler
-from ...api_models import TargetQueryCombination
+from ...job_queue.pair_pool import PairIndex
 from ...job_queue.queued_job import QueuedJob
 from ...settings import SETTINGS
 
 logger = logging.getLogger(__name__)
 
-WorkForWorker = tuple[QueuedJob, list[TargetQueryCombination]]
+# How many pending pairs with a target the worker holds are considered, the rest of the budget is filled by cost
+AFFINITY_CANDIDATES = 1024
 
 
 class TimeWorkScheduler(WorkPackageScheduler):
     def schedule_work_for(self, worker: Worker) -> None | ScheduledWorkPackage:
-        unfinished_jobs = self._job_queue.jobs_with_unassigned_sequences()
-        if not unfinished_jobs:
+        job = self._job_queue.next_job_to_schedule()
+        if job is None:
             return None
 
-        # Get the first unfinished job
-        job = unfinished_jobs.pop(0)
-
-        queries = _get_n_seconds_of_work(job, SETTINGS.work_package_time_split_in_seconds, worker)
-        return work_packages_from_queries(job, queries, worker)
+        pairs = _get_n_seconds_of_work(job, SETTINGS.work_package_time_split_in_seconds, worker)
+        return work_packages_from_queries(job, pairs, worker)
 
 
 def _get_n_seconds_of_work(
     job: QueuedJob,
     seconds: int,
     worker: Worker,
-) -> set[TargetQueryCombination]:
-    unfinished_queries = [*job.missing_sequences()]
-    # Shuffle the unfinished queries to get a more even distribution
-    random.shuffle(unfinished_queries)
-
-    total_time = 0
-    queries: list[TargetQueryCombination] = []
-
-    for query in unfinished_queries:
-        query_time = estimate_work_in_seconds(
-            target=job.request.sequences[query.target],
-            query=job.request.sequences[query.query],
-            cups=worker.resources.benchmark_result,
-        )
-
-        if total_time + query_time > seconds:
-            continue
-
-        total_time += query_time
-        queries.append(query)
-
-        # If we are in 10% of the time limit, we can stop
-        if total_time > seconds * 0.9:
-            break
-
-    return set(queries)
+) -> list[PairIndex]:
+    cells = seconds * worker.cups
+    pairs: list[PairIndex] = []
+
+    # Pairs whose target the worker already holds come first, so the target does not have to be sent again
+    candidates = job.pending_pairs_with_targets(reversed(worker.recent_sequences))
+    for pair in islice(candidates, AFFINITY_CANDIDATES):
+        cost = job.pair_cost(pair)
+        if cost <= cells:
+            cells -= cost
+            pairs.append(pair)
+
+    pairs = job.pool.take_pairs(pairs)
+    # The rest is filled with the pairs that fit best, a single pair that takes longer than the time limit still has
+    # to be scheduled at some point
+    return pairs + job.cost_index().take(job.pool, cells, at_least_one=not pairs)
@@ -1,47 +1,38 @@
-from uuid import uuid4
-
-from master.api_models import Sequence, TargetQueryCombination
+from master.job_queue.pair_pool import PairIndex
 from master.job_queue.queued_job import QueuedJob
+from master.utils.shard import new_shard_id
 from master.utils.time import current_ms
 from master.work_package._scheduler.scheduled_work_package import InternalWorkPackage, ScheduledWorkPackage
 from master.worker.worker import Worker
 
 
-def estimate_work_in_seconds(target: Sequence, query: Sequence, cups: int) -> float:
-    target_length = len(target)
-    query_length = len(query)
-
-    return target_length * query_length / cups
+def estimate_work_in_seconds(cells: int, cups: float) -> float:
+    return cells / cups
 
 
-def work_packages_from_queries(
-    job: QueuedJob, queries: set[TargetQueryCombination], worker: Worker
-) -> ScheduledWorkPackage | None:
-    if not queries:
+def work_packages_from_queries(job: QueuedJob, pairs: list[PairIndex], worker: Worker) -> ScheduledWorkPackage | None:
+    """Creates a work package out of pairs that have already been taken from the pool of the job"""
+    if not pairs:
         return None
 
-    total_cups = 0
-    for comb in queries:
-        total_cups += len(job.request.sequences[comb.query]) * len(job.request.sequences[comb.target])
-    total_ms = total_cups / worker.resources.benchmark_result * 1000
+    queries = [job.units[pair] for pair in pairs]
+    total_cups = sum(job.pair_cost(pair) for pair in pairs)
+    total_ms = total_cups / worker.cups * 1000
+    job.assigned_cells += total_cups
 
     package = InternalWorkPackage(
-        id=uuid4(),
+        id=new_shard_id(),
         job=job,
-        queries=queries,
-        sequences={
-            # Query
-            **{sequence.query: job.request.sequences[sequence.query] for sequence in queries},
-            # Target
-            **{sequence.target: job.request.sequences[sequence.target] for sequence in queries},
-        },
-        match_score=job.request.match_score,
-        mismatch_penalty=job.request.mismatch_penalty,
-        gap_penalty=job.request.gap_penalty,
+        pairs=pairs,
+        # Handles into the sequence store, the sequences themselves are not copied
+        sequences=job.sequences.subset(
+            {*(comb.query for comb in queries), *(comb.target for comb in queries)},
+        ),
+        match_score=job.match_score,
+        mismatch_penalty=job.mismatch_penalty,
+        gap_penalty=job.gap_penalty,
     )
 
-    job.sequences_in_progress.update(package.queries)
-
     return ScheduledWorkPackage(
         package=package,
         worker=worker,
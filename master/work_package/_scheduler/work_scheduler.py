@@ -21,6 +21,9 @@ class WorkPackageScheduler(ABC):
         from .primitive_work_scheduler import PrimitiveWorkPackageScheduler
         from .proportional_work_scheduler import ProportionalWorkScheduler
         from .time_work_scheduler import TimeWorkScheduler
+        from .lpt_work_scheduler import LptWorkScheduler
+        from .guided_work_scheduler import GuidedWorkScheduler
+        from .planned_work_scheduler import PlannedWorkScheduler
 
         # Return the already created _scheduler if it exists
         if WorkPackageScheduler._created_scheduler:
@@ -36,6 +39,12 @@ class WorkPackageScheduler(ABC):
                 WorkPackageScheduler._created_scheduler = ProportionalWorkScheduler(worker_collector, job_queue)
             case "time":
                 WorkPackageScheduler._created_scheduler = TimeWorkScheduler(worker_collector, job_queue)
+            case "lpt":
+                WorkPackageScheduler._created_scheduler = LptWorkScheduler(worker_collector, job_queue)
+            case "guided":
+                WorkPackageScheduler._created_scheduler = GuidedWorkScheduler(worker_collector, job_queue)
+            case "planned":
+                WorkPackageScheduler._created_scheduler = PlannedWorkScheduler(worker_collector, job_queue)
             case _:
                 raise NotImplementedError()
 
@@ -45,10 +54,6 @@ class WorkPackageScheduler(ABC):
     def schedule_work_for(self, worker: Worker) -> None | ScheduledWorkPackage:
         """Schedules work for a worker if possible and return the work package"""
 
-    # noinspection PyMethodMayBeStatic
     def abort_work_package(self, work_package: ScheduledWorkPackage) -> None:
-        job = work_package.package.job
-
-        for in_progress_sequence in [*job.sequences_in_progress]:
-            if in_progress_sequence in work_package.package.queries:
-                job.sequences_in_progress.remove(in_progress_sequence)
+        work_package.package.job.requeue(work_package.package.pairs)
+        self._job_queue.work_available.notify()
@@ -4,13 +4,18 @@ from uuid import UUID
 
 from fastapi import HTTPException
 
-from master.api_models import WorkResult, WorkerId, WorkPackage, RawWorkPackage, Alignment
+from master.api_models import WorkResult, WorkerId, WorkPackage, RawWorkPackage, WorkAlignment
 from master.settings import SETTINGS
-from master.utils.cleaner import Cleaner
+from master.job_queue.job_queue import JobQueue
+from master.job_queue.pair_pool import PairIndex
 from master.utils.singleton import Singleton
+from master.utils.time import current_ns
 from master.utils.verify import verify_result
+from master.worker.worker import Worker
 from master.worker.worker_collector import WorkerCollector
+from ._scheduler.speculation import speculative_copy_for
 from ._scheduler.work_scheduler import WorkPackageScheduler, ScheduledWorkPackage
+from .work_package_registry import WorkPackageRegistry
 from ..utils.log_time import log_time
 import time
 
@@ -22,60 +27,78 @@ class WorkPackageNotFoundException(HTTPException):
         super().__init__(status_code=404, detail=f"Work package with id {work_package_id} not found")
 
 
-class WorkPackageCollector(Cleaner, Singleton):
+class WorkPackageCollector(Singleton):
     def __init__(self):
         self._worker_collector = WorkerCollector()
         self._work_scheduler = WorkPackageScheduler.create()
-        self._work_packages: list[ScheduledWorkPackage] = []
+        self._job_queue = JobQueue()
+        self._work_packages = WorkPackageRegistry()
         self._verify_work = SETTINGS.verify_work
-        super().__init__(interval=SETTINGS.work_package_cleaning_interval)
+        # The packages of a worker are handed to other workers as soon as it is removed
+        self._worker_collector.on_worker_removed(self._abort_packages_of)
 
     def get_package_by_id(self, work_package_id: UUID) -> ScheduledWorkPackage:
-        for package in self._work_packages:
-            if package.package.id == work_package_id:
-                return package
+        package = self._work_packages.get(work_package_id)
+        if not package:
+            raise WorkPackageNotFoundException(work_package_id)
+
+        return package
+
+    def packages_of_worker(self, worker_id: UUID) -> list[ScheduledWorkPackage]:
+        return self._work_packages.for_worker(worker_id)
 
-        raise WorkPackageNotFoundException(work_package_id)
+    def in_flight_count(self) -> int:
+        return len(self._work_packages)
+
+    def remove_packages_of_job(self, job_id: UUID) -> None:
+        removed = self._work_packages.remove_job(job_id)
+        logger.info(f"Removed {len(removed)} work packages of deleted job")
 
     def update_work_result(self, work_id: UUID, result: WorkResult) -> None:
         work_package = self.get_package_by_id(work_id)
-        completed_sequences = work_package.package.job.completed_sequences
+        job = work_package.package.job
 
         if self._verify_work and not self._worker_collector.is_alive(work_package.worker):  # malicious deleted worker is marked dead
             return
 
+        computed_cells = 0
+        added: list[tuple[PairIndex, WorkAlignment]] = []
         for res in result.alignments:
             if self._verify_work and not verify_result(work_package.package, res):
-                work_package.package.job.sequences_in_progress.update(work_package.package.job.completed_sequences.keys())
-                work_package.package.job.completed_sequences.clear()
+                # The results of the job can no longer be trusted, so everything has to be computed again
+                job.reset_results()
+                self._job_queue.record_reset(job)
+                job.progress.notify()
+                self._job_queue.work_available.notify()
                 self._worker_collector.remove_worker(work_package.worker)
                 return
 
-            if res.combination not in completed_sequences:
-                completed_sequences[res.combination] = []
+            unit = job.units.index_of(res.combination)
+            if unit is None:
+                logger.warning(f"Received result for a combination that is not part of job {job.id}")
+                continue
+
+            if job.add_result(unit, res.alignment):
+                added.append((unit, res.alignment))
+            computed_cells += job.pair_cost(unit)
 
-            completed_sequences[res.combination].append(Alignment(
-                alignment=res.alignment.query_alignment,
-                length=res.alignment.length,
-                score=res.alignment.score)
-            )
-            # Remove the sequence from the in progress list if it is in there
-            try:
-                work_package.package.job.sequences_in_progress.remove(res.combination)
-            except ValueError:
-                pass
+        job.progress.notify()
+
+        package_done = work_package.done()
+        work_package.record_computed_cells(computed_cells, final=package_done)
 
         # Check if the work package is done
-        if work_package.done():
+        if package_done:
             logger.info(f"Work package {work_package.package.id} is done")
             work_package.worker.status = "IDLE"
+            self._work_packages.remove(work_id)
 
-        # See if the job is done
-        if work_package.package.job.done():
-            t = ( time.time_ns() - work_package.package.job.start_time)
-            print('computation time: ', t)
-            work_package.package.job.computation_time = t
+        # See if the job is done, a late copy of a package of a done job must not count it again
+        if job.done() and job.computation_time is None:
+            job.computation_time = current_ns() - job.start_time
+            logger.info(f"Job {job.id} is done, computation time: {job.computation_time} ns")
             logger.info(f"Work package {work_package.package.id} is done")
+        self._job_queue.record_results(job, added)
 
         # Remove worker if it is far slower than expected
         if work_package.is_too_slow():
@@ -94,12 +117,20 @@ class WorkPackageCollector(Cleaner, Singleton):
     @log_time
     def get_new_raw_work_package(self, worker_id: WorkerId) -> None | Tuple[RawWorkPackage, ScheduledWorkPackage]:
         worker = self._worker_collector.get_worker_by_id(worker_id.id)
+        if worker.status == "WORKING" and not self._work_packages.for_worker(worker.worker_id):
+            # A worker that asks for work is done with its packages elsewhere (or they were dropped)
+            worker.status = "IDLE"
         scheduled_package = self._work_scheduler.schedule_work_for(worker)
+        if not scheduled_package and SETTINGS.max_speculative_copies:
+            # Nothing left to schedule, help out with the stragglers instead
+            scheduled_package = speculative_copy_for(worker, self._work_packages)
 
         if not scheduled_package:
             return None
 
-        self._work_packages.append(scheduled_package)
+        self._work_packages.add(scheduled_package)
+        # The worker keeps the sequences of its recent packages, later packages preferably reuse them
+        worker.remember_sequences(scheduled_package.package.sequences)
 
         package = RawWorkPackage(
             id=scheduled_package.package.id,
@@ -113,10 +144,24 @@ class WorkPackageCollector(Cleaner, Singleton):
         worker.status = "WORKING"
         return package, scheduled_package
 
-    def execute_clean(self) -> None:
-        for package in self._work_packages:
-            if package.worker.status == "DEAD":
-                logger.info(f"Aborting work package because worker is dead")
-                logger.info("Preparing to assign it to a different worker")
-                self._work_scheduler.abort_work_package(package)
-                self._work_packages.remove(package)
+    async def wait_for_new_raw_work_package(
+        self, worker_id: WorkerId, timeout: float
+    ) -> None | Tuple[RawWorkPackage, ScheduledWorkPackage]:
+        """Like get_new_raw_work_package, but waits up to timeout seconds for work to become available"""
+        deadline = time.monotonic() + min(timeout, SETTINGS.max_work_wait_in_seconds)
+        while True:
+            # Read the version before scheduling, so work that arrives in between is not missed
+            version = self._job_queue.work_available.version
+            package = self.get_new_raw_work_package(worker_id)
+            remaining = deadline - time.monotonic()
+            if package or remaining <= 0:
+                return package
+
+            if not await self._job_queue.work_available.wait(version, remaining):
+                return None
+
+    def _abort_packages_of(self, worker: Worker) -> None:
+        for package in self._work_packages.remove_worker(worker.worker_id):
+            logger.info(f"Aborting work package because worker is gone")
+            logger.info("Preparing to assign it to a different worker")
+            self._work_scheduler.abort_work_package(package)
@@ -0,0 +1,69 @@
+from typing import Iterator
+from uuid import UUID
+
+from ._scheduler.scheduled_work_package import ScheduledWorkPackage
+
+
+class WorkPackageRegistry:
+    """
+    Keeps the live work packages keyed by their id, together with secondary indexes by worker and by job.
+    Lookups by id are O(1), lookups and removals by worker or job are O(packages affected).
+    """
+
+    def __init__(self):
+        self._packages: dict[UUID, ScheduledWorkPackage] = {}
+        self._by_worker: dict[UUID, set[UUID]] = {}
+        self._by_job: dict[UUID, set[UUID]] = {}
+
+    def __len__(self) -> int:
+        return len(self._packages)
+
+    def __contains__(self, package_id: UUID) -> bool:
+        return package_id in self._packages
+
+    def __iter__(self) -> Iterator[ScheduledWorkPackage]:
+        """Iterates over a snapshot of the packages, oldest first"""
+        return iter(list(self._packages.values()))
+
+    def add(self, package: ScheduledWorkPackage) -> None:
+        package_id = package.package.id
+        self._packages[package_id] = package
+        self._by_worker.setdefault(package.worker.worker_id, set()).add(package_id)
+        self._by_job.setdefault(package.package.job.id, set()).add(package_id)
+
+    def get(self, package_id: UUID) -> ScheduledWorkPackage | None:
+        return self._packages.get(package_id)
+
+    def remove(self, package_id: UUID) -> ScheduledWorkPackage | None:
+        package = self._packages.pop(package_id, None)
+        if not package:
+            return None
+
+        _discard_from_index(self._by_worker, package.worker.worker_id, package_id)
+        _discard_from_index(self._by_job, package.package.job.id, package_id)
+        return package
+
+    def worker_ids(self) -> list[UUID]:
+        return list(self._by_worker.keys())
+
+    def for_worker(self, worker_id: UUID) -> list[ScheduledWorkPackage]:
+        return [self._packages[package_id] for package_id in self._by_worker.get(worker_id, ())]
+
+    def for_job(self, job_id: UUID) -> list[ScheduledWorkPackage]:
+        return [self._packages[package_id] for package_id in self._by_job.get(job_id, ())]
+
+    def remove_worker(self, worker_id: UUID) -> list[ScheduledWorkPackage]:
+        return [self.remove(package_id) for package_id in [*self._by_worker.get(worker_id, ())]]
+
+    def remove_job(self, job_id: UUID) -> list[ScheduledWorkPackage]:
+        return [self.remove(package_id) for package_id in [*self._by_job.get(job_id, ())]]
+
+
+def _discard_from_index(index: dict[UUID, set[UUID]], key: UUID, package_id: UUID) -> None:
+    package_ids = index.get(key)
+    if package_ids is None:
+        return
+
+    package_ids.discard(package_id)
+    if not package_ids:
+        del index[key]
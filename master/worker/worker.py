@@ -1,7 +1,10 @@
-from dataclasses import dataclass
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Iterable
 from uuid import UUID
 
-from master.api_models import WorkerResources, WorkerStatus
+from master.api_models import SequenceId, WorkerResources, WorkerStatus
+from master.settings import SETTINGS
 
 
 @dataclass
@@ -10,3 +13,28 @@ class Worker:
     resources: WorkerResources
     last_seen_alive: int
     status: WorkerStatus
+    # Exponentially weighted moving average of the cells per second measured from the results of the worker
+    observed_cups: float | None = None
+    # The sequences the worker received most recently (least recently used first), which it keeps cached
+    recent_sequences: OrderedDict[SequenceId, None] = field(default_factory=OrderedDict, repr=False)
+
+    @property
+    def cups(self) -> float:
+        """The processing power of the worker, the self-reported benchmark is used until results have been measured"""
+        if self.observed_cups is None:
+            return self.resources.benchmark_result
+        return self.observed_cups
+
+    def remember_sequences(self, sequence_ids: Iterable[SequenceId]) -> None:
+        for sequence_id in sequence_ids:
+            self.recent_sequences[sequence_id] = None
+            self.recent_sequences.move_to_end(sequence_id)
+        while len(self.recent_sequences) > SETTINGS.worker_sequence_cache_size:
+            self.recent_sequences.popitem(last=False)
+
+    def record_throughput(self, cells: int, seconds: float) -> None:
+        cups = cells / seconds
+        if self.observed_cups is None:
+            self.observed_cups = cups
+        else:
+            self.observed_cups += SETTINGS.throughput_smoothing * (cups - self.observed_cups)
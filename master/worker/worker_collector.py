@@ -1,13 +1,15 @@
+import asyncio
+import heapq
 import logging
+from typing import Callable
 from uuid import uuid4, UUID
 
 from fastapi import HTTPException
 
 from master.api_models import WorkerResources
 from master.settings import SETTINGS
-from master.utils.cleaner import Cleaner
 from master.utils.singleton import Singleton
-from master.utils.time import current_sec
+from master.utils.time import current_ms, current_sec
 from .worker import Worker
 
 logger = logging.getLogger(__name__)
@@ -18,21 +20,54 @@ class WorkerNotFoundException(HTTPException):
         super().__init__(status_code=404, detail=f"Worker with id {worker_id} not found")
 
 
-class WorkerCollector(Cleaner, Singleton):
+class WorkerAlreadyRegisteredException(HTTPException):
+    def __init__(self, worker_id: UUID):
+        super().__init__(status_code=409, detail=f"Worker with id {worker_id} is already registered")
+
+
+class WorkerCollector(Singleton):
+    """
+    Keeps the registered workers and when each of them expires. Expiry times are kept in a heap with one entry per
+    worker: a pulse only moves the expiry time of the worker, its entry is pushed back once it comes due and turns
+    out to be outdated. A timer on the event loop fires when the earliest entry comes due, so a worker that went dark
+    is removed right when its timeout passes, and removing it costs O(log workers).
+    """
+
     def __init__(self):
         self._workers: dict[UUID, Worker] = {}
-        super().__init__(interval=SETTINGS.worker_cleaning_interval)
+        # Expiry time (ms) of every registered worker, and the heap of (expiry time, worker id) entries
+        self._expiry: dict[UUID, int] = {}
+        self._expiry_heap: list[tuple[int, UUID]] = []
+        # Singletons run __init__ again when they are looked up, the listeners and the timer are kept
+        self._removal_listeners: list[Callable[[Worker], None]] = getattr(self, "_removal_listeners", [])
+        self._expiry_timer: asyncio.TimerHandle | None = getattr(self, "_expiry_timer", None)
+        self._expiry_timer_loop: asyncio.AbstractEventLoop | None = getattr(self, "_expiry_timer_loop", None)
 
     @property
     def workers(self) -> list[Worker]:
         return list(self._workers.values())
 
-    def register(self, resources: WorkerResources) -> UUID:
-        worker_id = uuid4()
+    def on_worker_removed(self, listener: Callable[[Worker], None]) -> None:
+        """Registers a function that is called with every worker that is removed, whether it expired or not"""
+        if listener not in self._removal_listeners:
+            self._removal_listeners.append(listener)
+
+    def register(self, resources: WorkerResources, worker_id: UUID | None = None) -> UUID:
+        """
+        Registers a worker under a new id, or under the given one (a router registers a worker with all shards).
+        A given id must not belong to a registered worker, that worker would be replaced without giving up its work.
+        """
+        if worker_id in self._workers:
+            raise WorkerAlreadyRegisteredException(worker_id)
+        worker_id = worker_id or uuid4()
         logger.info(f"Registering worker with resources {resources.benchmark_result // 1_000_000} MCUPS")
         self._workers[worker_id] = Worker(
             worker_id=worker_id, resources=resources, last_seen_alive=current_sec(), status="IDLE"
         )
+        if worker_id not in self._expiry:
+            heapq.heappush(self._expiry_heap, (current_ms() + SETTINGS.worker_timeout * 1000, worker_id))
+        self._expiry[worker_id] = current_ms() + SETTINGS.worker_timeout * 1000
+        self._arm_expiry_timer()
         logger.info(f"Number of registered workers: {len(self._workers)}")
         return worker_id
 
@@ -47,6 +82,8 @@ class WorkerCollector(Cleaner, Singleton):
         logger.debug(f"Adding life pulse for worker {worker_id}")
         worker = self.get_worker_by_id(worker_id)
         worker.last_seen_alive = current_sec()
+        self._expiry[worker_id] = current_ms() + SETTINGS.worker_timeout * 1000
+        self._arm_expiry_timer()
 
     def idle_workers(self) -> list[Worker]:
         return [worker for worker in self._workers.values() if worker.status == "IDLE"]
@@ -57,14 +94,53 @@ class WorkerCollector(Cleaner, Singleton):
                 worker = self.get_worker_by_id(worker)
             except WorkerNotFoundException:
                 return False
-        return worker.last_seen_alive > current_sec() - SETTINGS.worker_timeout and worker.status != "DEAD"
-
-    def execute_clean(self) -> None:
-        for worker in [*self._workers.values()]:
-            if not self.is_alive(worker):
-                self.remove_worker(worker)
+        return self._expiry.get(worker.worker_id, 0) > current_ms() and worker.status != "DEAD"
+
+    def next_expiry(self) -> int | None:
+        """The earliest time (ms) a worker may expire, None if there are no workers"""
+        return self._expiry_heap[0][0] if self._expiry_heap else None
+
+    def expire_workers(self) -> None:
+        """Removes the workers whose timeout passed"""
+        now = current_ms()
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            _, worker_id = self._expiry_heap[0]
+            expiry = self._expiry.get(worker_id)
+            if expiry is None:
+                # Removed in the meantime
+                heapq.heappop(self._expiry_heap)
+            elif expiry > now:
+                # Pulsed in the meantime
+                heapq.heapreplace(self._expiry_heap, (expiry, worker_id))
+            else:
+                heapq.heappop(self._expiry_heap)
+                self.remove_worker(self._workers[worker_id])
 
     def remove_worker(self, worker):
         logger.info(f"Removing dead or malicious worker {worker.worker_id}")
         worker.status = "DEAD"
         del self._workers[worker.worker_id]
+        del self._expiry[worker.worker_id]
+        for listener in self._removal_listeners:
+            listener(worker)
+
+    def _arm_expiry_timer(self) -> None:
+        """Makes sure a timer on the running event loop fires when the earliest worker may expire"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Without an event loop (e.g. in a simulation) the owner calls expire_workers itself
+            return
+
+        if not self._expiry_heap or (self._expiry_timer is not None and self._expiry_timer_loop is loop):
+            return
+        delay = max(0.0, (self._expiry_heap[0][0] - current_ms()) / 1000)
+        self._expiry_timer = loop.call_later(delay, self._on_expiry_timer)
+        self._expiry_timer_loop = loop
+
+    def _on_expiry_timer(self) -> None:
+        self._expiry_timer = None
+        try:
+            self.expire_workers()
+        finally:
+            self._arm_expiry_timer()